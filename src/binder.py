@@ -0,0 +1,155 @@
+from errors import ErrorHandler, CompilerError
+from comptypes import *
+
+
+class Binder(ErrorHandler):
+    """
+    resolves every variable to a slot before typechecking,
+    a slot is the index of the variable in the stack of live variables,
+    the TypeChecker and the Generator keep their variables in lists indexed by these slots,
+    slots of a scope are reused after the scope ends
+    """
+    def __init__(self, program: NodeProgram | FlatTree, file_content: str) -> None:
+        super().__init__(file_content)
+        self.main_program = program
+        # name -> slots of the live variables with that name, innermost last
+        self.symbols: dict[str, list[int]] = {}
+        # names declared in each open scope in order, so they can be removed when it ends
+        self.scope_names: list[list[str]] = [[]]
+        self.scope_starts: list[int] = [0]
+        self.live_count: int = 0
+
+    def declare(self, decl_stmt: NodeStmtDeclare) -> None:
+        """
+        gives the declared variable the next slot,
+        redeclaring a variable of the same scope is an error, the new one is bound anyway to avoid follow up errors
+        """
+        name = decl_stmt.ident.value
+        assert isinstance(name, str), "a variable has to have a name"
+        slots = self.symbols.setdefault(name, [])
+        if slots and slots[-1] >= self.scope_starts[-1]:
+            try:
+                self.compiler_error("Value", f"variable has been already declared in this scope: {name}", decl_stmt.ident)
+            except CompilerError as error:
+                self.recover(error)
+        decl_stmt.slot = self.live_count
+        slots.append(self.live_count)
+        self.scope_names[-1].append(name)
+        self.live_count += 1
+
+    def undeclare_last(self) -> None:
+        """
+        removes the last declared variable of the current scope
+        """
+        name = self.scope_names[-1].pop()
+        self.symbols[name].pop()
+        self.live_count -= 1
+
+    def begin_scope(self) -> None:
+        self.scope_names.append([])
+        self.scope_starts.append(self.live_count)
+
+    def end_scope(self) -> None:
+        while self.scope_names[-1]:
+            self.undeclare_last()
+        self.scope_names.pop()
+        self.scope_starts.pop()
+
+    def bind_ident(self, ident: NodeTermIdent) -> None:
+        """
+        undeclared variables keep the slot -1, the TypeChecker reports them
+        """
+        slots = self.symbols.get(ident.ident.value) # type: ignore (identifiers always have a name)
+        ident.slot = slots[-1] if slots else -1
+
+    def bind_term(self, term: NodeTerm) -> None:
+        self.bind_expression(NodeExpr(term))
+
+    def bind_expression(self, expr: NodeExpr) -> None:
+        """
+        binds every identifier in the expression
+        """
+        stack: list[NodeExpr | NodeTerm] = [expr]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, NodeExpr):
+                if isinstance(node.var, NodeBinExpr):
+                    stack.append(node.var.rhs)
+                    stack.append(node.var.lhs)
+                else:
+                    stack.append(node.var)
+                continue
+            term = node
+            if isinstance(term.var, NodeTermIdent):
+                self.bind_ident(term.var)
+            elif isinstance(term.var, (NodeTermParen, NodeTermCast)):
+                stack.append(term.var.expr)
+            elif isinstance(term.var, (NodeTermNot, NodeTermBNot)):
+                stack.append(term.var.term)
+            elif isinstance(term.var, NodeTermSlice):
+                stack.append(term.var.end)
+                stack.append(term.var.start)
+                stack.append(term.var.term)
+            if term.index is not None:
+                stack.append(term.index)
+
+    def bind_decl(self, decl_stmt: NodeStmtDeclare) -> None:
+        self.bind_expression(decl_stmt.expr) # the value can still refer to a shadowed variable of the same name
+        self.declare(decl_stmt)
+
+    def bind_reassign(self, reassign_stmt: NodeStmtReassign) -> None:
+        if isinstance(reassign_stmt.var, NodeStmtReassignEq):
+            self.bind_expression(reassign_stmt.var.rvalue)
+        self.bind_term(reassign_stmt.var.ident)
+
+    def bind_scope(self, scope: NodeScope) -> None:
+        self.begin_scope()
+        for stmt in scope.stmts:
+            self.bind_statement(stmt)
+        self.end_scope()
+
+    def bind_if_predicate(self, ifpred: NodeIfPred | None) -> None:
+        while ifpred is not None:
+            if isinstance(ifpred.var, NodeIfPredElif):
+                self.bind_expression(ifpred.var.expr)
+                self.bind_scope(ifpred.var.scope)
+                ifpred = ifpred.var.pred
+            else:
+                self.bind_scope(ifpred.var.scope)
+                ifpred = None
+
+    def bind_statement(self, stmt: NodeStmt) -> None:
+        var = stmt.stmt_var
+        if isinstance(var, NodeStmtDeclare):
+            self.bind_decl(var)
+        elif isinstance(var, NodeStmtReassign):
+            self.bind_reassign(var)
+        elif isinstance(var, (NodeStmtExit, NodeStmtPrint)):
+            self.bind_expression(var.expr if isinstance(var, NodeStmtExit) else var.content)
+        elif isinstance(var, NodeScope):
+            self.bind_scope(var)
+        elif isinstance(var, NodeStmtIf):
+            self.bind_expression(var.expr)
+            self.bind_scope(var.scope)
+            self.bind_if_predicate(var.ifpred)
+        elif isinstance(var, NodeStmtWhile):
+            self.bind_expression(var.expr)
+            self.bind_scope(var.scope)
+        elif isinstance(var, NodeStmtDoWhile):
+            self.bind_scope(var.scope)
+            self.bind_expression(var.expr)
+        elif isinstance(var, NodeStmtFor):
+            # the loop variable lives in the enclosing scope until the loop ends
+            self.bind_decl(var.ident_def)
+            self.bind_expression(var.condition)
+            self.bind_scope(var.scope)
+            self.bind_reassign(var.ident_assign)
+            self.undeclare_last()
+        elif isinstance(var, (NodeStmtBreak, NodeStmtEmpty)):
+            pass
+        else:
+            raise ValueError(f"Unreachable {var}")
+
+    def bind_program(self) -> None:
+        for stmt in self.main_program.stmts:
+            self.bind_statement(stmt)
@@ -0,0 +1,66 @@
+import hashlib
+import marshal
+import os
+
+from comptypes import FlatTree
+
+# bumped when the layout of the cached data changes
+CACHE_FORMAT = 1
+
+# the modules that decide what the parse tree of a source looks like
+TREE_MODULES: tuple[str, ...] = ("lexer.py", "tokentypes.py", "parser.py", "comptypes.py", "cache.py")
+
+
+def compiler_version() -> str:
+    """
+    hash of the source code of the modules that make the parse tree,
+    so any change to them makes the old cache entries miss
+    """
+    digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in TREE_MODULES:
+        with open(os.path.join(src_dir, module), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def default_cache_dir() -> str:
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "hadzik")
+
+
+class ParseCache:
+    """
+    on-disk cache of parse trees, an entry is named after the hash of the source code and the compiler version,
+    entries are stored with marshal (not pickle) so loading one can't run any code,
+    a missing, unreadable or corrupted entry is just a miss
+    """
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        self.version = compiler_version()
+
+    def entry_path(self, hdz_src: str) -> str:
+        key = hashlib.sha256(self.version.encode() + hdz_src.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.tree")
+
+    def load(self, hdz_src: str) -> FlatTree | None:
+        try:
+            with open(self.entry_path(hdz_src), "rb") as f:
+                return FlatTree.deserialize(marshal.load(f))
+        except (OSError, EOFError, ValueError, TypeError, IndexError):
+            return None
+
+    def store(self, hdz_src: str, tree: FlatTree) -> None:
+        """
+        writes the entry into a temporary file first so a half written entry never gets loaded,
+        failing to write is ignored, the cache is only an optimization
+        """
+        path = self.entry_path(hdz_src)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                marshal.dump(tree.serialize(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,340 @@
+import os
+import time
+from collections.abc import Iterator
+from typing import Callable, TextIO, TypeVar
+from dataclasses import dataclass, field
+
+from lexer import Tokenizer
+from parser import Parser
+from binder import Binder
+from folder import Folder
+from eliminator import Eliminator
+from peephole import Peephole
+from typechecker import TypeChecker
+from generator import Generator
+from errors import ErrorHandler, CompilerError, Diagnostic
+from comptypes import Token, TokenTable, FlatTree, NodeStmt, NodeProgram, BoundsReport
+from loops import loop_statements, statement_expressions, expression_token
+from cache import ParseCache
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class CompilationResult:
+    """
+    everything a single compilation produced,
+    the artifacts of the phases that didn't run are left as None,
+    timings maps the name of the phase to the seconds it took,
+    parse_tree is only made when it's cached or dumped for debugging,
+    cache_hit means the tokens and the parse tree were loaded from the parse cache,
+    streamed means the assembly was written out during the compilation instead of being kept in asm,
+    stats counts the instructions the peephole optimizations removed by the name of their rule,
+    dead_code counts the statements the dead code elimination removed by the name of its rule,
+    bounds_reports has the bounds checks of every loop when they're turned on
+    """
+    tokens: TokenTable | None = None
+    parse_tree: FlatTree | None = None
+    asm: list[str] | None = None
+    diagnostics: list[Diagnostic] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+    cache_hit: bool = False
+    streamed: bool = False
+    stats: dict[str, int] = field(default_factory=dict)
+    dead_code: dict[str, int] = field(default_factory=dict)
+    bounds_reports: list[BoundsReport] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.diagnostics and (self.asm is not None or self.streamed)
+
+
+class Compiler:
+    """
+    a compilation session, every phase object is made per compilation so no state leaks between them,
+    errors are returned as diagnostics instead of ending the process,
+    with all_errors every error of the failing phase is reported instead of just the first one,
+    the later phases don't run after it, so lexing errors hide parsing errors and those hide the binding and type errors,
+    so any number of sources can be compiled one after another in the same process,
+    with a cache the lexing and parsing is skipped for sources that were parsed before,
+    without optimize the statements are generated as they were written, for debugging and comparing,
+    with bounds_checks the program ends with an error when an index or a slice is out of the string,
+    code that is nested deeper than a phase can walk within the recursion limit is reported as an error too
+    """
+    def __init__(self, all_errors: bool = False, cache: ParseCache | None = None, optimize: bool = True,
+                 bounds_checks: bool = False) -> None:
+        self.all_errors = all_errors
+        self.cache = cache
+        self.optimize = optimize
+        self.bounds_checks = bounds_checks
+
+    def run_phase(self, phase: ErrorHandler, result: CompilationResult, run: Callable[[], T]) -> T | None:
+        """
+        runs the phase, collecting its diagnostics into the result,
+        returns None if the phase had to stop at an error
+        """
+        phase.all_errors = self.all_errors
+        try:
+            output = run()
+        except CompilerError as error:
+            phase.diagnostics.append(error.diagnostic)
+            output = None
+        except RecursionError:
+            phase.diagnostics.append(self.too_deep(phase, phase.current_token if isinstance(phase, Parser) else None))
+            output = None
+        result.diagnostics.extend(phase.diagnostics)
+        return output
+
+    @staticmethod
+    def too_deep(phase: ErrorHandler, loc: Token | NodeStmt | None) -> Diagnostic:
+        """
+        returns the error for code that is nested deeper than the phase can walk within the recursion limit,
+        it points to loc or to the first expression of loc if it's a statement
+        """
+        if isinstance(loc, NodeStmt):
+            exprs = (expr for stmt in loop_statements([loc]) for expr in statement_expressions(stmt))
+            loc = next(map(expression_token, exprs), None)
+        try:
+            phase.compiler_error("Syntax", "the code is nested too deeply to be compiled", loc)
+        except CompilerError as error:
+            return error.diagnostic
+
+    def compile(self, hdz_src: str) -> CompilationResult:
+        """
+        tokenizes, parses, typechecks and generates assembly for the given source code,
+        stops after the first phase that reported an error
+        """
+        result = CompilationResult()
+
+        if self.cache is not None:
+            start = time.perf_counter()
+            if (cached_tree := self.cache.load(hdz_src)) is not None:
+                result.cache_hit = True
+                result.tokens = cached_tree.tokens
+                result.parse_tree = cached_tree
+                result.timings["Lexing"] = 0.0 # the tokens came with the tree
+                result.timings["Parsing"] = time.perf_counter() - start
+                result.asm = self.check_and_generate(cached_tree, hdz_src, result)
+                return result
+
+        start = time.perf_counter()
+        tokenizer = Tokenizer(hdz_src)
+        tokens = self.run_phase(tokenizer, result, tokenizer.scan)
+        if tokens is None or result.diagnostics:
+            return result
+        result.tokens = tokens
+        result.timings["Lexing"] = time.perf_counter() - start
+
+        parser = Parser(tokens, hdz_src)
+        parser.all_errors = self.all_errors
+        # the flat tree is only made for the cache and the debug dump, the phases work on the parsed statements
+        parse_tree = FlatTree(tokens) if self.cache is not None or ErrorHandler.debug_mode else None
+        parse_errors: list[Diagnostic] = []
+        stmts = self.parse_statements(parser, parse_tree, result, parse_errors)
+
+        output: list[str] = []
+        if not self.generate_statements(stmts, hdz_src, result, (), output.extend, tokens):
+            try:
+                for _ in stmts: # parsing errors hide the others, even ones in the statements before them
+                    pass
+            except CompilerError:
+                pass
+            if parse_errors:
+                result.diagnostics = parse_errors
+            return result
+        result.parse_tree = parse_tree
+        if self.cache is not None and parse_tree is not None:
+            self.cache.store(hdz_src, parse_tree)
+        result.asm = output
+        return result
+
+    def parse_statements(self, parser: Parser, parse_tree: FlatTree | None, result: CompilationResult,
+                         parse_errors: list[Diagnostic]) -> Iterator[NodeStmt]:
+        """
+        yields the top level statements of the parser, its errors go into the result and into parse_errors,
+        every statement is flattened into parse_tree if there's one before the later phases change it
+        """
+        stmts = parser.parse_top_level()
+        while True:
+            try:
+                stmt = next(stmts, None)
+            except CompilerError as error:
+                parse_errors.append(error.diagnostic)
+                raise
+            except RecursionError:
+                diagnostic = self.too_deep(parser, parser.current_token)
+                parse_errors.append(diagnostic)
+                raise CompilerError(diagnostic)
+            parse_errors.extend(parser.diagnostics)
+            result.diagnostics.extend(parser.diagnostics)
+            parser.diagnostics.clear()
+            if stmt is None:
+                return
+            if parse_tree is not None:
+                parse_tree.add_statement(stmt)
+            yield stmt
+
+    def check_and_generate(self, parse_tree: FlatTree, hdz_src: str, result: CompilationResult) -> list[str] | None:
+        """
+        binds, typechecks and generates the cached parse tree one top level statement at a time,
+        each statement is made back into a dataclass tree only while it's being worked on
+        """
+        output: list[str] = []
+        if not self.generate_statements(map(parse_tree.statement, parse_tree.roots), hdz_src, result, (), output.extend,
+                                        parse_tree.tokens):
+            return None
+        return output
+
+    def generate_statements(self, stmts: Iterator[NodeStmt], hdz_src: str, result: CompilationResult,
+                            sources: tuple[ErrorHandler, ...], flush: Callable[[list[str]], object],
+                            tokens: TokenTable | None = None) -> bool:
+        """
+        binds, typechecks and generates the statements one at a time, the assembly of each one is flushed right after,
+        sources are the phases that make the statements, their errors are collected with the rest,
+        tokens are the whole program if it's known ahead, they let the dead code elimination see the later statements,
+        the generating stops at the first error but the binding and typechecking go on if all errors are reported,
+        returns if the whole program was generated
+        """
+        binder = Binder(NodeProgram([]), hdz_src) # the statements are fed in one by one
+        typechecker = TypeChecker(NodeProgram([]), hdz_src)
+        folder = Folder(NodeProgram([]), hdz_src)
+        eliminator = Eliminator(tokens if self.optimize else None, hdz_src)
+        peephole = Peephole()
+        generator = Generator(NodeProgram([]), hdz_src)
+        generator.optimize = self.optimize
+        generator.bounds_checks = self.bounds_checks
+        phases: tuple[ErrorHandler, ...] = (*sources, binder, typechecker, eliminator, generator)
+        for phase in phases:
+            phase.all_errors = self.all_errors
+        parse_time = check_time = opt_time = gen_time = 0.0
+
+        generator.gen_prologue()
+        while True:
+            start = time.perf_counter()
+            try:
+                stmt = next(stmts, None)
+            except CompilerError as error:
+                result.diagnostics.append(error.diagnostic)
+                break
+            except RecursionError:
+                parser = sources[-1] if sources else binder
+                result.diagnostics.append(self.too_deep(parser, parser.current_token if isinstance(parser, Parser) else None))
+                break
+            parse_time += time.perf_counter() - start
+            if stmt is None:
+                break
+
+            start = time.perf_counter()
+            try:
+                binder.bind_statement(stmt)
+                typechecker.check_statement_or_recover(stmt)
+            except CompilerError as error:
+                result.diagnostics.append(error.diagnostic)
+                break
+            except RecursionError:
+                result.diagnostics.append(self.too_deep(typechecker, stmt))
+                break
+            check_time += time.perf_counter() - start
+
+            if not result.diagnostics and not any(phase.diagnostics for phase in phases):
+                live = True
+                if self.optimize:
+                    start = time.perf_counter()
+                    try:
+                        folder.fold_statement(stmt)
+                        live = eliminator.eliminate_statement(stmt)
+                    except CompilerError as error:
+                        eliminator.diagnostics.append(error.diagnostic)
+                        live = False
+                    except RecursionError:
+                        eliminator.diagnostics.append(self.too_deep(eliminator, stmt))
+                        live = False
+                    opt_time += time.perf_counter() - start
+                start = time.perf_counter()
+                try:
+                    if live:
+                        generator.gen_statement(stmt)
+                except CompilerError as error:
+                    generator.diagnostics.append(error.diagnostic)
+                except RecursionError:
+                    generator.diagnostics.append(self.too_deep(generator, stmt))
+                gen_time += time.perf_counter() - start
+                lines = generator.output
+                if self.optimize:
+                    start = time.perf_counter()
+                    lines = peephole.feed(generator.output)
+                    opt_time += time.perf_counter() - start
+                start = time.perf_counter()
+                flush(list(map(str, lines)))
+                generator.output.clear()
+                gen_time += time.perf_counter() - start
+
+            for phase in phases: # keeps the diagnostics in the order of the statements
+                result.diagnostics.extend(phase.diagnostics)
+                phase.diagnostics.clear()
+            if result.diagnostics and not self.all_errors:
+                break
+        for phase in sources: # errors found after the last statement, like in trailing comments
+            result.diagnostics.extend(phase.diagnostics)
+
+        if result.diagnostics:
+            return False
+        result.timings["Parsing"] = result.timings.get("Parsing", 0.0) + parse_time
+        result.timings["Typechecking"] = check_time
+        if self.optimize:
+            result.timings["Optimizing"] = opt_time
+            result.stats.update(peephole.stats)
+            result.dead_code.update(eliminator.stats)
+        result.timings["Generating"] = gen_time
+        flush(list(map(str, peephole.drain() + generator.gen_epilogue())))
+        result.bounds_reports = generator.bounds_reports
+        return True
+
+    def compile_stream(self, hdz_src: str, out: TextIO) -> CompilationResult:
+        """
+        compiles the source without ever having all of its tokens, its parse tree or its assembly in memory,
+        tokens are lexed as the parser needs them, every top level statement is typechecked and generated
+        as soon as it's parsed and its assembly is written into out right away,
+        so the peak memory is set by the biggest top level statement instead of the whole program,
+        the parse cache isn't used since there's no parse tree to store,
+        out is left with a part of the program if the compilation fails
+        """
+        result = CompilationResult()
+        tokenizer = Tokenizer(hdz_src)
+        tokenizer.all_errors = self.all_errors
+        try:
+            parser = Parser(tokenizer.stream(), hdz_src) # lexes the first line to get the first token
+        except CompilerError as error:
+            result.diagnostics.append(error.diagnostic)
+            return result
+        parser.all_errors = self.all_errors
+
+        result.streamed = self.generate_statements(parser.parse_top_level(), hdz_src, result, (tokenizer, parser), out.writelines)
+        return result
+
+    def compile_file(self, file_path: str) -> CompilationResult:
+        """
+        reads the file and compiles it,
+        raises FileNotFoundError if the file path isn't valid
+        """
+        with open(file_path, "r") as f:
+            return self.compile(f.read())
+
+    def stream_file(self, file_path: str, asm_path: str) -> CompilationResult:
+        """
+        reads the file and compiles it with compile_stream() into the assembly file at asm_path,
+        the assembly file is only made if the compilation succeeds,
+        raises FileNotFoundError if the file path isn't valid
+        """
+        with open(file_path, "r") as f:
+            hdz_src = f.read()
+        tmp_path = f"{asm_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as out:
+                result = self.compile_stream(hdz_src, out)
+            if result.ok:
+                os.replace(tmp_path, asm_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return result
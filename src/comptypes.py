@@ -1,4 +1,6 @@
-from dataclasses import dataclass
+from array import array
+from collections.abc import Iterator
+from dataclasses import dataclass, field
 from typing import Union, Optional
 from tokentypes import *
 
@@ -13,7 +15,171 @@ class Token:
     type: token_type
     line: int
     col: int
-    value: Optional[str] = None
+    value: Optional[str | bytes] = None # string literals carry their raw bytes
+    index: int = field(default=-1, compare=False, repr=False) # position in the TokenTable, -1 for made up tokens
+
+
+class TokenTable:
+    """
+    packed storage of the lexed tokens, one array per token field,
+    kinds are the integer codes from tokentypes.KIND,
+    values are interned into a pool and stored as an index into it (-1 means no value),
+    Token objects are only made when the parser asks for them
+    """
+    __slots__ = ("kinds", "lines", "cols", "values", "pool", "pool_index")
+
+    def __init__(self) -> None:
+        self.kinds: array[int] = array("i")
+        self.lines: array[int] = array("i")
+        self.cols: array[int] = array("i")
+        self.values: array[int] = array("i")
+        self.pool: list[str | bytes] = []
+        self.pool_index: dict[str | bytes, int] = {}
+
+    def add(self, type_: token_type, line: int, col: int, value: Optional[str | bytes] = None) -> None:
+        """
+        appends a token to the table, interning its value
+        """
+        self.kinds.append(KIND[type_])
+        self.lines.append(line)
+        self.cols.append(col)
+        if value is None:
+            self.values.append(-1)
+        elif (idx := self.pool_index.get(value)) is not None:
+            self.values.append(idx)
+        else:
+            self.pool_index[value] = len(self.pool)
+            self.values.append(len(self.pool))
+            self.pool.append(value)
+
+    def kind_at(self, idx: int) -> int:
+        """
+        returns the kind of the token at idx (negative idx counts from the end), -1 if idx is out of range
+        """
+        return self.kinds[idx] if -len(self.kinds) <= idx < len(self.kinds) else -1
+
+    def token_at(self, idx: int) -> Token | None:
+        """
+        makes a Token out of the columns at idx (negative idx counts from the end), None if idx is out of range
+        """
+        if not -len(self.kinds) <= idx < len(self.kinds):
+            return None
+        if idx < 0:
+            idx += len(self.kinds)
+        value_idx = self.values[idx]
+        return Token(
+            TOKEN_TYPES[self.kinds[idx]], self.lines[idx], self.cols[idx], 
+            self.pool[value_idx] if value_idx != -1 else None, idx
+        )
+
+    def drop_front(self, count: int) -> None:
+        """
+        removes the first count tokens,
+        once the pool is much bigger than the table it's rebuilt out of the values that are still used
+        """
+        for column in (self.kinds, self.lines, self.cols, self.values):
+            del column[:count]
+        if len(self.pool) <= max(POOL_REBUILD_SIZE, 2 * len(self.values)):
+            return
+        old_pool = self.pool
+        self.pool = []
+        self.pool_index = {}
+        for idx, value_idx in enumerate(self.values):
+            if value_idx == -1:
+                continue
+            value = old_pool[value_idx]
+            if (new_idx := self.pool_index.get(value)) is None:
+                new_idx = self.pool_index[value] = len(self.pool)
+                self.pool.append(value)
+            self.values[idx] = new_idx
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __iter__(self) -> Iterator[Token]:
+        for idx in range(len(self.kinds)):
+            yield self.token_at(idx) # type: ignore (idx is always in range)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TokenTable):
+            return NotImplemented
+        return self.kinds == other.kinds and self.lines == other.lines and self.cols == other.cols \
+            and self.values == other.values and self.pool == other.pool
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def serialize(self) -> tuple:
+        """
+        returns the table as a tuple of bytes and strings that marshal can store
+        """
+        return (self.kinds.tobytes(), self.lines.tobytes(), self.cols.tobytes(), self.values.tobytes(), tuple(self.pool))
+
+    @classmethod
+    def deserialize(cls, data: tuple) -> "TokenTable":
+        table = cls()
+        for column, raw in zip((table.kinds, table.lines, table.cols, table.values), data[:4]):
+            column.frombytes(raw)
+        table.pool = list(data[4])
+        table.pool_index = {value: idx for idx, value in enumerate(table.pool)}
+        return table
+
+
+# the pool of a TokenTable is never rebuilt while it's smaller than this
+POOL_REBUILD_SIZE = 4096
+
+
+class TokenStream:
+    """
+    tokens that are lexed only when the parser reads them, used instead of a TokenTable when streaming,
+    the tokens of the already parsed statements are released so only a window of the tokens is ever kept,
+    indices are counted from the start of the file like in a TokenTable
+    """
+    __slots__ = ("table", "lines", "base")
+
+    def __init__(self, table: TokenTable, lines: Iterator[None]) -> None:
+        self.table = table # the window, the tokenizer keeps appending into it
+        self.lines = lines # every step lexes another line into the table
+        self.base: int = 0 # the index of the first token in the window
+
+    def fill(self, idx: int) -> bool:
+        """
+        lexes until the token at idx is in the window, returns False if the file ends before it
+        """
+        while idx - self.base >= len(self.table):
+            try:
+                next(self.lines)
+            except StopIteration: # the last line doesn't end with a newline
+                return idx - self.base < len(self.table)
+        return True
+
+    def kind_at(self, idx: int) -> int:
+        """
+        returns the kind of the token at idx, -1 if it's out of range or released
+        """
+        if idx < self.base or not self.fill(idx):
+            return -1
+        return self.table.kinds[idx - self.base]
+
+    def token_at(self, idx: int) -> Token | None:
+        """
+        makes a Token out of the token at idx, None if it's out of range or released
+        """
+        if idx < self.base or not self.fill(idx):
+            return None
+        token = self.table.token_at(idx - self.base)
+        assert token is not None, "fill() made sure it's in the window"
+        token.index = idx
+        return token
+
+    def release(self, idx: int) -> None:
+        """
+        drops the tokens before idx, the last lexed token stays since the tokenizer looks at it
+        """
+        count = min(idx - self.base, len(self.table) - 1)
+        if count > 0:
+            self.table.drop_front(count)
+            self.base += count
 
 
 ##################
@@ -36,12 +202,17 @@ class NodeTermChar:
 @dataclass(slots=True)
 class NodeTermStr:
     string: Token
-    length: str
+    data: bytes # the same buffer as string.value
+
+    @property
+    def length(self) -> int:
+        return len(self.data)
 
 @dataclass(slots=True)
 class NodeTermIdent:
     ident: Token
     negative: bool = False
+    slot: int = -1 # index of the variable among the live variables, set by the Binder, -1 if it's undeclared
 
 
 @dataclass(slots=True)
@@ -69,14 +240,21 @@ class NodeTermCast:
     expr: NodeExpr
     type: Token
 
+@dataclass(slots=True)
+class NodeTermSlice: # type: ignore (has to be predeclared)
+    pass
+
 @dataclass(slots=True)
 class NodeTerm:
     var: Union[
         NodeTermIdent, NodeTermInt, NodeTermChar, NodeTermStr, 
         NodeTermParen, NodeTermNot, NodeTermBool, NodeTermCast,
-        NodeTermBNot
+        NodeTermBNot, NodeTermSlice
     ]
     index: Optional[NodeExpr] = None
+    # the type and byte size of the value, set by the TypeChecker
+    value_type: token_type = INFER_DEF
+    value_size: int = 0
 
 
 @dataclass(slots=True)
@@ -87,15 +265,36 @@ class NodeTermNot:
 class NodeTermBNot:
     term: NodeTerm
 
+@dataclass(slots=True)
+class NodeTermSlice:
+    """
+    the string term from start up to end, it points into the bytes of the term instead of copying them
+    """
+    term: NodeTerm
+    start: NodeExpr
+    end: NodeExpr
+    colon: Token
+
 @dataclass(slots=True)
 class NodeBinExpr:
     lhs: NodeExpr
     rhs: NodeExpr
     op: Token
+    # the type and byte size of the value, set by the TypeChecker
+    value_type: token_type = INFER_DEF
+    value_size: int = 0
 
 @dataclass(slots=True)
 class NodeExpr:
-    var: Union[NodeTerm, NodeBinExpr, None]
+    var: Union[NodeTerm, NodeBinExpr]
+
+    @property
+    def value_type(self) -> token_type:
+        return self.var.value_type
+
+    @property
+    def value_size(self) -> int:
+        return self.var.value_size
 
 
 @dataclass(slots=True)
@@ -109,6 +308,9 @@ class NodeStmtDeclare:
     expr: NodeExpr
     type_: Token
     is_const: bool = False
+    slot: int = -1 # index of the variable among the live variables, set by the Binder
+    inlined: bool = False # a `furt` whose value the Folder put in place of every use, it takes no stack slot
+    unused: bool = False # never read, the Eliminator removed every store to it, it takes no stack slot either
 
 
 class NodeScope: # type: ignore (has to be predeclared)
@@ -218,6 +420,335 @@ class NodeScope:
 class NodeProgram:
     stmts: list[NodeStmt]
 
+
+# node kinds of the flat tree, a node of the dataclass tree gets flattened into the kind of its class,
+# the wrapper classes (NodeStmt, NodeExpr, NodeIfPred, NodeStmtReassign and NodeTerm without an index) don't get a node,
+# NodeTerm with an index becomes an index node and the type token of a declaration gets its own node
+FLAT_EXIT = 0
+FLAT_DECLARE = 1
+FLAT_SCOPE = 2
+FLAT_IF = 3
+FLAT_ELIF = 4
+FLAT_ELSE = 5
+FLAT_REASSIGN_EQ = 6
+FLAT_REASSIGN_INC = 7
+FLAT_REASSIGN_DEC = 8
+FLAT_WHILE = 9
+FLAT_DO_WHILE = 10
+FLAT_FOR = 11
+FLAT_PRINT = 12
+FLAT_BREAK = 13
+FLAT_EMPTY = 14
+FLAT_BIN_EXPR = 15
+FLAT_INT = 16
+FLAT_IDENT = 17
+FLAT_CHAR = 18
+FLAT_STR = 19
+FLAT_BOOL = 20
+FLAT_PAREN = 21
+FLAT_NOT = 22
+FLAT_BNOT = 23
+FLAT_CAST = 24
+FLAT_INDEX = 25
+FLAT_TYPE = 26
+FLAT_SLICE = 27
+
+FLAT_KIND_OF: dict[type, int] = {
+    NodeStmtExit: FLAT_EXIT, NodeStmtDeclare: FLAT_DECLARE, NodeScope: FLAT_SCOPE,
+    NodeStmtIf: FLAT_IF, NodeIfPredElif: FLAT_ELIF, NodeIfPredElse: FLAT_ELSE,
+    NodeStmtReassignEq: FLAT_REASSIGN_EQ, NodeStmtReassignInc: FLAT_REASSIGN_INC, NodeStmtReassignDec: FLAT_REASSIGN_DEC,
+    NodeStmtWhile: FLAT_WHILE, NodeStmtDoWhile: FLAT_DO_WHILE, NodeStmtFor: FLAT_FOR,
+    NodeStmtPrint: FLAT_PRINT, NodeStmtBreak: FLAT_BREAK, NodeStmtEmpty: FLAT_EMPTY,
+    NodeBinExpr: FLAT_BIN_EXPR, NodeTermInt: FLAT_INT, NodeTermIdent: FLAT_IDENT,
+    NodeTermChar: FLAT_CHAR, NodeTermStr: FLAT_STR, NodeTermBool: FLAT_BOOL,
+    NodeTermParen: FLAT_PAREN, NodeTermNot: FLAT_NOT, NodeTermBNot: FLAT_BNOT,
+    NodeTermCast: FLAT_CAST, NodeTerm: FLAT_INDEX, Token: FLAT_TYPE, NodeTermSlice: FLAT_SLICE,
+}
+
+FLAG_NEGATIVE = 1
+FLAG_CONST = 2
+
+NodeAny = Union[
+    NodeStmt, NodeStmtDeclare, NodeStmtExit, NodeScope, NodeStmtIf, NodeIfPred, NodeIfPredElif, NodeIfPredElse,
+    NodeStmtReassign, NodeStmtReassignEq, NodeStmtReassignInc, NodeStmtReassignDec,
+    NodeStmtWhile, NodeStmtDoWhile, NodeStmtFor, NodeStmtPrint, NodeStmtBreak, NodeStmtEmpty,
+    NodeExpr, NodeBinExpr, NodeTerm, NodeTermInt, NodeTermIdent, NodeTermChar, NodeTermStr,
+    NodeTermBool, NodeTermParen, NodeTermNot, NodeTermBNot, NodeTermCast, NodeTermSlice, Token
+]
+
+
+class FlatTree:
+    """
+    the parse tree packed into arrays, a node is an integer handle into them,
+    every node has a kind (FLAT_*), the index of its token in the TokenTable (-1 if it has none),
+    flags (FLAG_*), the handle of its first child and of its next sibling (-1 if there is none),
+    roots holds the handles of the top level statements,
+    both directions work without recursion so nesting is only limited by memory
+    """
+    __slots__ = ("tokens", "kinds", "token_idxs", "flags", "first_child", "next_sibling", "roots")
+
+    def __init__(self, tokens: TokenTable) -> None:
+        self.tokens: TokenTable = tokens
+        self.kinds: array[int] = array("B")
+        self.token_idxs: array[int] = array("i")
+        self.flags: array[int] = array("B")
+        self.first_child: array[int] = array("i")
+        self.next_sibling: array[int] = array("i")
+        self.roots: array[int] = array("i")
+
+    def add_node(self, kind: int, token_idx: int, flags: int, children: list[int]) -> int:
+        """
+        appends a node whose children are already in the tree, returns its handle
+        """
+        handle = len(self.kinds)
+        self.kinds.append(kind)
+        self.token_idxs.append(token_idx)
+        self.flags.append(flags)
+        self.first_child.append(children[0] if children else -1)
+        self.next_sibling.append(-1)
+        for prev, next_ in zip(children, children[1:]):
+            self.next_sibling[prev] = next_
+        return handle
+
+    def children(self, handle: int) -> list[int]:
+        children: list[int] = []
+        child = self.first_child[handle]
+        while child != -1:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    @staticmethod
+    def unwrap(node: NodeAny) -> NodeAny:
+        """
+        returns the node that gets flattened in place of a wrapper node
+        """
+        while True:
+            cls = node.__class__
+            if cls is NodeExpr or cls is NodeIfPred or cls is NodeStmtReassign or (cls is NodeTerm and node.index is None): # type: ignore
+                node = node.var # type: ignore (every one of these has a var)
+            elif cls is NodeStmt:
+                node = node.stmt_var # type: ignore
+            else:
+                return node
+
+    @staticmethod
+    def parts(node: NodeAny) -> tuple[Optional[Token], int, list[NodeAny]]:
+        """
+        splits an unwrapped node into its token, flags and children
+        """
+        cls = node.__class__
+        if cls is NodeBinExpr:
+            return node.op, 0, [node.lhs, node.rhs]
+        elif cls is NodeTermInt or cls is NodeTermIdent:
+            return node.int_lit if cls is NodeTermInt else node.ident, FLAG_NEGATIVE * node.negative, []
+        elif cls is NodeTermChar:
+            return node.char, 0, []
+        elif cls is NodeTermStr:
+            return node.string, 0, []
+        elif cls is NodeTermBool:
+            return node.bool, 0, []
+        elif cls is NodeTermParen:
+            return None, FLAG_NEGATIVE * node.negative, [node.expr]
+        elif cls is NodeTermNot or cls is NodeTermBNot:
+            return None, 0, [node.term]
+        elif cls is NodeTermCast:
+            return node.type, 0, [node.expr]
+        elif cls is NodeTermSlice:
+            return node.colon, 0, [node.term, node.start, node.end]
+        elif cls is NodeTerm:
+            assert node.index is not None, "terms without an index get unwrapped"
+            return None, 0, [node.var, node.index]
+        elif cls is Token:
+            return node, 0, []
+        elif cls is NodeStmtExit:
+            return None, 0, [node.expr]
+        elif cls is NodeStmtDeclare:
+            return node.ident, FLAG_CONST * node.is_const, [node.type_, node.expr]
+        elif cls is NodeScope:
+            return None, 0, list(node.stmts)
+        elif cls is NodeStmtIf:
+            return None, 0, [node.expr, node.scope] + ([node.ifpred] if node.ifpred is not None else [])
+        elif cls is NodeIfPredElif:
+            return None, 0, [node.expr, node.scope] + ([node.pred] if node.pred is not None else [])
+        elif cls is NodeIfPredElse:
+            return None, 0, [node.scope]
+        elif cls is NodeStmtReassignEq:
+            return None, 0, [node.ident, node.rvalue]
+        elif cls is NodeStmtReassignInc or cls is NodeStmtReassignDec:
+            return None, 0, [node.ident]
+        elif cls is NodeStmtWhile:
+            return None, 0, [node.expr, node.scope]
+        elif cls is NodeStmtDoWhile:
+            return None, 0, [node.scope, node.expr]
+        elif cls is NodeStmtFor:
+            return None, 0, [node.ident_def, node.condition, node.ident_assign, node.scope]
+        elif cls is NodeStmtPrint:
+            return None, 0, [node.content]
+        elif cls is NodeStmtBreak:
+            return node.break_tkn, 0, []
+        elif cls is NodeStmtEmpty:
+            return None, 0, []
+        else:
+            raise ValueError(f"Unreachable {node}")
+
+    def add_statement(self, stmt: NodeStmt) -> int:
+        """
+        flattens the statement into the tree as a new top level statement, returns its handle
+        """
+        work: list = [stmt] # nodes to visit and (kind, token index, flags, child count) of the ones to add once their children are in
+        handles: list[int] = []
+        while work:
+            node = work.pop()
+            if node.__class__ is tuple:
+                kind, token_idx, flags, child_count = node
+                child_handles = handles[len(handles) - child_count:]
+                del handles[len(handles) - child_count:]
+                handles.append(self.add_node(kind, token_idx, flags, child_handles))
+                continue
+
+            node = self.unwrap(node)
+            token, flags, children = self.parts(node)
+            work.append((FLAT_KIND_OF[node.__class__], token.index if token is not None else -1, flags, len(children)))
+            work.extend(reversed(children))
+
+        self.roots.append(handles[0])
+        return handles[0]
+
+    def build(self, handle: int, children: list) -> NodeAny:
+        """
+        makes the dataclass node of the handle out of its already made children,
+        statements are made without the NodeStmt wrapper
+        """
+        kind = self.kinds[handle]
+        token = self.tokens.token_at(self.token_idxs[handle]) if self.token_idxs[handle] != -1 else None
+        negative = bool(self.flags[handle] & FLAG_NEGATIVE)
+
+        if kind == FLAT_BIN_EXPR:
+            assert token is not None, "binary expressions have their operator"
+            return NodeBinExpr(NodeExpr(children[0]), NodeExpr(children[1]), token)
+        elif kind == FLAT_INT:
+            return NodeTerm(NodeTermInt(token, negative)) # type: ignore (terms always have a token)
+        elif kind == FLAT_IDENT:
+            return NodeTerm(NodeTermIdent(token, negative)) # type: ignore
+        elif kind == FLAT_CHAR:
+            return NodeTerm(NodeTermChar(token)) # type: ignore
+        elif kind == FLAT_STR:
+            assert token is not None and isinstance(token.value, bytes), "string literals carry bytes"
+            return NodeTerm(NodeTermStr(token, token.value))
+        elif kind == FLAT_BOOL:
+            assert token is not None, "bool literals have their token"
+            token.value = "1" if token.type == TRUE else "0"
+            return NodeTerm(NodeTermBool(token))
+        elif kind == FLAT_PAREN:
+            return NodeTerm(NodeTermParen(NodeExpr(children[0]), negative))
+        elif kind == FLAT_NOT:
+            return NodeTerm(NodeTermNot(children[0]))
+        elif kind == FLAT_BNOT:
+            return NodeTerm(NodeTermBNot(children[0]))
+        elif kind == FLAT_CAST:
+            return NodeTerm(NodeTermCast(NodeExpr(children[0]), token)) # type: ignore
+        elif kind == FLAT_INDEX:
+            return NodeTerm(children[0].var, NodeExpr(children[1]))
+        elif kind == FLAT_SLICE:
+            assert token is not None, "slices have their colon"
+            return NodeTerm(NodeTermSlice(children[0], NodeExpr(children[1]), NodeExpr(children[2]), token))
+        elif kind == FLAT_TYPE:
+            return token # type: ignore (None for inferred `furt` declarations, fixed by the declaration)
+        elif kind == FLAT_EXIT:
+            return NodeStmtExit(NodeExpr(children[0]))
+        elif kind == FLAT_DECLARE:
+            assert token is not None, "declarations have their identifier"
+            type_ = children[0] if children[0] is not None else Token(INFER_DEF, token.line, token.col)
+            return NodeStmtDeclare(token, NodeExpr(children[1]), type_, bool(self.flags[handle] & FLAG_CONST))
+        elif kind == FLAT_SCOPE:
+            return NodeScope([NodeStmt(stmt) for stmt in children])
+        elif kind == FLAT_IF:
+            return NodeStmtIf(NodeExpr(children[0]), children[1], children[2] if len(children) > 2 else None)
+        elif kind == FLAT_ELIF:
+            return NodeIfPred(NodeIfPredElif(NodeExpr(children[0]), children[1], children[2] if len(children) > 2 else None))
+        elif kind == FLAT_ELSE:
+            return NodeIfPred(NodeIfPredElse(children[0]))
+        elif kind == FLAT_REASSIGN_EQ:
+            return NodeStmtReassign(NodeStmtReassignEq(children[0], NodeExpr(children[1])))
+        elif kind == FLAT_REASSIGN_INC:
+            return NodeStmtReassign(NodeStmtReassignInc(children[0]))
+        elif kind == FLAT_REASSIGN_DEC:
+            return NodeStmtReassign(NodeStmtReassignDec(children[0]))
+        elif kind == FLAT_WHILE:
+            return NodeStmtWhile(NodeExpr(children[0]), children[1])
+        elif kind == FLAT_DO_WHILE:
+            return NodeStmtDoWhile(children[0], NodeExpr(children[1]))
+        elif kind == FLAT_FOR:
+            return NodeStmtFor(children[0], NodeExpr(children[1]), children[2], children[3])
+        elif kind == FLAT_PRINT:
+            return NodeStmtPrint(NodeExpr(children[0]), cont_type=INFER_DEF)
+        elif kind == FLAT_BREAK:
+            return NodeStmtBreak(token) # type: ignore (break always has its token)
+        elif kind == FLAT_EMPTY:
+            return NodeStmtEmpty()
+        else:
+            raise ValueError(f"Unreachable {kind}")
+
+    def statement(self, handle: int) -> NodeStmt:
+        """
+        makes the dataclass tree of the statement at handle,
+        the tree is new every time so the typechecker can annotate it freely
+        """
+        work: list[tuple[int, int]] = [(handle, -1)] # child count is -1 until the children are pushed
+        nodes: list = []
+        while work:
+            node, child_count = work.pop()
+            if child_count == -1:
+                children = self.children(node)
+                work.append((node, len(children)))
+                work.extend((child, -1) for child in reversed(children))
+                continue
+
+            children = nodes[len(nodes) - child_count:]
+            del nodes[len(nodes) - child_count:]
+            nodes.append(self.build(node, children))
+        return NodeStmt(nodes[0])
+
+    @property
+    def stmts(self) -> Iterator[NodeStmt]:
+        """
+        the top level statements made one at a time, so only one of them is in memory as a dataclass tree
+        """
+        return (self.statement(root) for root in self.roots)
+
+    def to_program(self) -> NodeProgram:
+        return NodeProgram(list(self.stmts))
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FlatTree):
+            return NotImplemented
+        return self.kinds == other.kinds and self.token_idxs == other.token_idxs and self.flags == other.flags \
+            and self.first_child == other.first_child and self.next_sibling == other.next_sibling \
+            and self.roots == other.roots and self.tokens == other.tokens
+
+    def __repr__(self) -> str:
+        return repr(self.to_program())
+
+    def serialize(self) -> tuple:
+        """
+        returns the tree and its tokens as a tuple of bytes and strings that marshal can store
+        """
+        return (
+            self.tokens.serialize(), self.kinds.tobytes(), self.token_idxs.tobytes(), self.flags.tobytes(),
+            self.first_child.tobytes(), self.next_sibling.tobytes(), self.roots.tobytes()
+        )
+
+    @classmethod
+    def deserialize(cls, data: tuple) -> "FlatTree":
+        tree = cls(TokenTable.deserialize(data[0]))
+        for column, raw in zip((tree.kinds, tree.token_idxs, tree.flags, tree.first_child, tree.next_sibling, tree.roots), data[1:]):
+            column.frombytes(raw)
+        return tree
+
 #######################
 ## Typechecker types ###################################################
 #######################
@@ -225,16 +756,33 @@ class NodeProgram:
 @dataclass(slots=True)
 class StackItem:
     """
-    class that stores the type name of the value,
+    class that stores the type of the value as its integer token kind,
     if its a constant variable (if it is one)
     and its location in the source code via Token (for error reporting)
     """
-    type: token_type
+    kind: int
     loc: tuple[int, int] | Token
-    sub_type: token_type | None = None
+    sub_kind: int | None = None
     name: str = ""
     is_const: bool = False
 
+    @property
+    def type(self) -> token_type:
+        """
+        the type name of the value, only used for error messages and annotations
+        """
+        return TOKEN_TYPES[self.kind]
+
+"""
+the size of a value of the type in bytes, a string value is its pointer and its length
+"""
+TYPE_SIZES: dict[token_type, int] = {
+    INT_DEF: 4,
+    BOOL_DEF: 1,
+    CHAR_DEF: 1,
+    STR_DEF: 12,
+}
+
 #####################
 ## Generator types ###################################################
 #####################
@@ -248,12 +796,178 @@ primitive type, contains a size of object in words (WORD, QWORD, etc.)
 """
 size_words = str
 
+@dataclass(slots=True)
+class BoundsReport:
+    """
+    the bounds checks of the indexes and slices in the body of a loop, not counting the ones of the loops in it,
+    removed are the ones that the ranges of the `sicke` variables proved to always pass
+    """
+    line: int
+    checks: int = 0
+    removed: int = 0
+
+@dataclass(slots=True)
+class DispatchTable:
+    """
+    the tables an `ikec` chain that only compares variables with literals is lowered to,
+    each variable in slots is looked up in its own table of codes, an int at its value minus its offset,
+    an int past the end of its table reads the 0 code at the end, 0 being the code of a value no branch compares with,
+    the codes add up to the index of keys which has the number of the branch that runs, 0 for the `inac` branch or none
+    """
+    slots: list[int]
+    sizes: list[size_bytes]
+    offsets: list[int]
+    codes: list[list[int]]
+    code_size: size_bytes
+    keys: list[int]
+    scopes: list[NodeScope]
+    default: NodeScope | None
+
 @dataclass(slots=True)
 class VariableContext:
     name: str
     loc: int
     size_w: size_words
     size_b: size_bytes
+    length: int | None = None # the length of a string that is the same whenever it's read, only known with bounds checks
     
     def __repr__(self) -> str:
         return f"VC('{self.name}' loc={self.loc} size={self.size_b})"
+
+
+"""
+names of the registers by their size in bytes, registers with the same index are parts of the same register
+"""
+REGISTERS: dict[size_bytes, tuple[str, ...]] = {
+    8: (
+        "rax", "rbx", "rcx", "rdx",
+        "rsi", "rdi", "rsp", "rbp",
+        "r8", "r9", "r10", "r11",
+        "r12", "r13", "r14", "r15"
+    ),
+    4: (
+        "eax", "ebx", "ecx", "edx",
+        "esi", "edi", "esp", "ebp",
+        "r8d", "r9d", "r10d", "r11d",
+        "r12d", "r13d", "r14d", "r15d"
+    ),
+    2: (
+        "ax", "bx", "cx", "dx",
+        "si", "di", "sp", "bp",
+        "r8w", "r9w", "r10w", "r11w",
+        "r12w", "r13w", "r14w", "r15w"
+    ),
+    1: (
+        "al", "bl", "cl", "dl",
+        "sil", "dil", "spl", "bpl",
+        "r8b", "r9b", "r10b", "r11b",
+        "r12b", "r13b", "r14b", "r15b"
+    ),
+}
+
+WORD_SIZES: dict[size_bytes, size_words] = {1: "BYTE", 2: "WORD", 4: "DWORD", 8: "QWORD"}
+
+"""
+the condition code of every comparison, it's used in setcc and jcc for a signed comparison
+"""
+CONDITION_CODES: dict[token_type, str] = {
+    IS_EQUAL: "e", IS_NOT_EQUAL: "ne",
+    LARGER_THAN: "g", LESS_THAN: "l",
+    LARGER_THAN_OR_EQ: "ge", LESS_THAN_OR_EQ: "le",
+}
+"""
+the condition code that is true when the other one is false
+"""
+INVERTED_CONDITIONS: dict[str, str] = {"e": "ne", "ne": "e", "g": "le", "le": "g", "l": "ge", "ge": "l", "z": "nz", "nz": "z"}
+"""
+the condition code that gives the same result when the operands of the cmp are swapped
+"""
+SWAPPED_CONDITIONS: dict[str, str] = {"e": "e", "ne": "ne", "g": "l", "l": "g", "ge": "le", "le": "ge"}
+
+JUMPS: tuple[str, ...] = ("jmp", *(f"j{cc}" for cc in INVERTED_CONDITIONS))
+
+@dataclass(slots=True, frozen=True)
+class Reg:
+    idx: int
+    size: size_bytes
+
+    def __str__(self) -> str:
+        return REGISTERS[self.size][self.idx]
+
+@dataclass(slots=True, frozen=True)
+class Sym:
+    """
+    a label or a function used as an operand
+    """
+    name: str
+
+    def __str__(self) -> str:
+        return self.name
+
+@dataclass(slots=True, frozen=True)
+class Mem:
+    """
+    a memory operand [base + index * scale + offset], the base is a register or the label of data,
+    size is None when the other operand already tells the assembler the size
+    """
+    base: Reg | Sym
+    offset: int = 0
+    index: Reg | None = None
+    scale: int = 1
+    size: size_bytes | None = None
+
+    def __str__(self) -> str:
+        address = str(self.base)
+        if self.index is not None:
+            address += f" + {self.index} * {self.scale}"
+        if self.offset:
+            address += f" - {-self.offset}" if self.offset < 0 else f" + {self.offset}"
+        return f"{WORD_SIZES[self.size]} [{address}]" if self.size is not None else f"[{address}]"
+
+@dataclass(slots=True, frozen=True)
+class Imm:
+    value: int
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+Operand = Reg | Mem | Imm | Sym
+
+@dataclass(slots=True)
+class Instr:
+    opcode: str
+    operands: tuple[Operand, ...] = ()
+    comment: str = ""
+
+    def __str__(self) -> str:
+        line = f"    {self.opcode} {", ".join(map(str, self.operands))}" if self.operands else f"    {self.opcode}"
+        return f"{line} ;{self.comment}\n" if self.comment else f"{line}\n"
+
+@dataclass(slots=True)
+class Label:
+    name: str
+
+    def __str__(self) -> str:
+        return f"{self.name}:\n"
+
+@dataclass(slots=True)
+class Comment:
+    text: str
+
+    def __str__(self) -> str:
+        return f"    {self.text}\n"
+
+@dataclass(slots=True)
+class Raw:
+    """
+    assembly that isn't an instruction, like the format header or the data section
+    """
+    text: str
+
+    def __str__(self) -> str:
+        return self.text
+
+"""
+a single line of the generated assembly, rendered into fasm text with str()
+"""
+AsmLine = Instr | Label | Comment | Raw
@@ -0,0 +1,133 @@
+from comptypes import *
+from eliminator import if_arms
+from folder import Folder
+from loops import unwrap_parens, same_value
+import tokentypes as tt
+
+
+# the least amount of `kec` and `ikec` branches that a chain needs to be lowered to tables,
+# a shorter one is about as fast with its comparisons
+MIN_ARMS = 4
+# the most keys the table of a chain can have, every combination of the codes of its variables is a key
+MAX_KEYS = 4096
+# the most codes the table of a variable can have, all of the values of a byte fit
+MAX_CODES = 256
+
+
+def equality_tests(expr: NodeExpr) -> list[tuple[int, size_bytes, int]] | None:
+    """
+    returns the slot and the size of every variable the condition compares with a literal and the value of the literal,
+    None if the condition is anything else than `==` comparisons of variables and literals joined by `aj`
+    """
+    var = unwrap_parens(expr).var
+    if not isinstance(var, NodeBinExpr):
+        return None
+    elif var.op.type == tt.AND:
+        lhs, rhs = equality_tests(var.lhs), equality_tests(var.rhs)
+        return lhs + rhs if lhs is not None and rhs is not None else None
+    elif var.op.type != tt.IS_EQUAL or var.lhs.value_type != var.rhs.value_type:
+        return None
+    for ident, literal in ((unwrap_parens(var.lhs), unwrap_parens(var.rhs)), (unwrap_parens(var.rhs), unwrap_parens(var.lhs))):
+        if not isinstance(ident.var, NodeTerm) or not isinstance(literal.var, NodeTerm) \
+                or ident.var.index is not None or literal.var.index is not None:
+            continue
+        if isinstance(ident.var.var, NodeTermIdent) and not ident.var.var.negative \
+                and (value := Folder.literal_value(literal.var)) is not None:
+            return [(ident.var.var.slot, ident.var.value_size, value)]
+    return None
+
+def dispatch_table(if_stmt: NodeStmtIf) -> DispatchTable | None:
+    """
+    makes the tables of an `ikec` chain whose conditions only compare variables with literals,
+    the values every variable is compared with get the codes from 1 up, multiplied so the codes of the variables
+    add up to a different key for every combination of them, the key picks the first branch whose comparisons all hold,
+    None if the chain is too short, compares something else or its tables would be too big
+    """
+    arms, default = if_arms(if_stmt)
+    if not MIN_ARMS <= len(arms) < 256: # the number of the branch is a byte
+        return None
+    tests: list[list[tuple[int, size_bytes, int]]] = []
+    for cond, _ in arms:
+        if (arm_tests := equality_tests(cond)) is None:
+            return None
+        tests.append(arm_tests)
+
+    values: dict[int, list[int]] = {} # slot -> the values it's compared with, in the order they're first seen
+    sizes: dict[int, size_bytes] = {}
+    for arm_tests in tests:
+        for slot, size, value in arm_tests:
+            sizes[slot] = size
+            if value not in values.setdefault(slot, []):
+                values[slot].append(value)
+    slots = list(values)
+    offsets = [min(values[slot]) if sizes[slot] != 1 else 0 for slot in slots]
+    key_count = 1
+    for slot in slots:
+        key_count *= len(values[slot]) + 1
+    if key_count > MAX_KEYS:
+        return None
+    code_size: size_bytes = 1 if key_count <= 256 else 2
+
+    codes: list[list[int]] = []
+    stride = key_count
+    for slot, offset in zip(slots, offsets):
+        stride //= len(values[slot]) + 1
+        # an int has an entry for each value from the smallest to the biggest one and the 0 code at the end
+        table_size = MAX_CODES if sizes[slot] == 1 else max(values[slot]) - offset + 2
+        if table_size > MAX_CODES: # checked before the table is made, values far apart would need a huge one
+            return None
+        table = [0] * table_size
+        for code, value in enumerate(values[slot], 1):
+            table[value - offset] = code * stride
+        codes.append(table)
+
+    keys = [0] * key_count
+    for key in range(key_count):
+        key_codes: dict[int, int] = {}
+        rest = key
+        for slot in reversed(slots):
+            rest, key_codes[slot] = divmod(rest, len(values[slot]) + 1)
+        for arm, arm_tests in enumerate(tests, 1):
+            if all(key_codes[slot] == values[slot].index(value) + 1 for slot, _, value in arm_tests):
+                keys[key] = arm
+                break
+    return DispatchTable(slots, [sizes[slot] for slot in slots], offsets, codes, code_size, keys,
+                         [scope for _, scope in arms], default)
+
+def constant_store(scope: NodeScope) -> tuple[NodeStmtReassignEq, int] | None:
+    """
+    returns the assignment and the value of the literal if all that the scope does is assigning a literal to a variable
+    """
+    stmts = [stmt for stmt in scope.stmts if not isinstance(stmt.stmt_var, NodeStmtEmpty)]
+    if len(stmts) != 1 or not isinstance(stmt := stmts[0].stmt_var, NodeStmtReassign) \
+            or not isinstance(stmt.var, NodeStmtReassignEq):
+        return None
+    rvalue = unwrap_parens(stmt.var.rvalue).var
+    if not isinstance(rvalue, NodeTerm) or rvalue.index is not None or (value := Folder.literal_value(rvalue)) is None:
+        return None
+    return stmt.var, value
+
+def lookup_values(table: DispatchTable) -> tuple[NodeStmtReassignEq, list[int]] | None:
+    """
+    returns the assignment that every branch of the chain makes and the values the branches assign by their numbers,
+    the first one being the value of the `inac` branch or 0 if there's none,
+    None unless every branch only assigns a literal to the same variable or to the same index of it
+    """
+    scopes = table.scopes if table.default is None else [table.default, *table.scopes]
+    stores = [constant_store(scope) for scope in scopes]
+    first = stores[0]
+    if first is None:
+        return None
+    target = first[0].ident
+    for store in stores:
+        if store is None:
+            return None
+        ident = store[0].ident
+        assert isinstance(ident.var, NodeTermIdent) and isinstance(target.var, NodeTermIdent), "only variables get assigned"
+        if ident.var.slot != target.var.slot or store[0].rvalue.value_type != first[0].rvalue.value_type \
+                or (ident.index is None) != (target.index is None):
+            return None
+        if ident.index is not None and target.index is not None and not same_value(ident.index, target.index):
+            return None
+    values = [value for _, value in stores] # type: ignore (the Nones returned above)
+    return first[0], values if table.default is not None else [0, *values]
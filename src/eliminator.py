@@ -0,0 +1,465 @@
+from collections.abc import Iterator
+from errors import ErrorHandler
+from comptypes import *
+from folder import Folder
+from loops import statement_expressions, may_trap
+import tokentypes as tt
+
+
+RULES: tuple[str, ...] = ("unreachable", "constant-branch", "dead-store", "unused-variable")
+
+
+# the kinds of the tokens a declared name comes right after and the ones an assigned name comes right before
+DECL_KINDS = frozenset(tt.KIND[kw] for kw in (tt.INFER_DEF, tt.INT_DEF, tt.BOOL_DEF, tt.CHAR_DEF, tt.STR_DEF, tt.CONST))
+ASSIGN_KINDS = frozenset(tt.KIND[op] for op in (tt.EQUALS, tt.INCREMENT, tt.DECREMENT))
+IDENT_KIND = tt.KIND[tt.IDENT]
+
+
+def read_names(tokens: TokenTable) -> tuple[set[str], set[str]]:
+    """
+    returns the names of the variables that some statement of the program reads and the ones that it assigns to,
+    they're picked out of the tokens so they're known before the first statement is parsed,
+    a name right after a type or `furt` is declared, one right before `=`, `++` or `--` is assigned and the rest are read,
+    changing a char of a string through an index counts as reading it since other variables can hold the same string
+    """
+    read: set[str] = set()
+    assigned: set[str] = set()
+    kinds, values, pool = tokens.kinds, tokens.values, tokens.pool
+    last = len(kinds) - 1
+    for idx, kind in enumerate(kinds):
+        if kind != IDENT_KIND or idx > 0 and kinds[idx - 1] in DECL_KINDS:
+            continue
+        name = pool[values[idx]]
+        assert isinstance(name, str), "identifiers are names"
+        (assigned if idx < last and kinds[idx + 1] in ASSIGN_KINDS else read).add(name)
+    return read, assigned
+
+# expressions are walked with explicit stacks here and in the binder, the typechecker and the folder,
+# so long operator chains and deep parentheses don't hit the recursion limit
+def expression_nodes(expr: NodeExpr) -> Iterator[NodeExpr | NodeTerm]:
+    """
+    yields the expression and every expression and term in it
+    """
+    stack: list[NodeExpr | NodeTerm] = [expr]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, NodeExpr):
+            stack.append(node.var.rhs if isinstance(node.var, NodeBinExpr) else node.var)
+            if isinstance(node.var, NodeBinExpr):
+                stack.append(node.var.lhs)
+            continue
+        var = node.var
+        if node.index is not None:
+            stack.append(node.index)
+        if isinstance(var, (NodeTermParen, NodeTermCast)):
+            stack.append(var.expr)
+        elif isinstance(var, (NodeTermNot, NodeTermBNot)):
+            stack.append(var.term)
+        elif isinstance(var, NodeTermSlice):
+            stack.extend((var.end, var.start, var.term))
+
+def expression_slots(expr: NodeExpr, slots: set[int]) -> None:
+    """
+    adds the slots of the variables that the expression reads into slots
+    """
+    for node in expression_nodes(expr):
+        if isinstance(node, NodeTerm) and isinstance(node.var, NodeTermIdent):
+            slots.add(node.var.slot)
+
+def term_slots(term: NodeTerm, slots: set[int]) -> None:
+    expression_slots(NodeExpr(term), slots)
+
+def is_pure(expr: NodeExpr) -> bool:
+    """
+    checks if computing the expression can't end the program, so it can be left out when its value isn't needed,
+    an index or a slice can be out of the string and a division can trap
+    """
+    for node in expression_nodes(expr):
+        if isinstance(node, NodeTerm):
+            if node.index is not None or isinstance(node.var, NodeTermSlice):
+                return False
+        elif isinstance(node.var, NodeBinExpr) and may_trap(node.var):
+            return False
+    return True
+
+def is_literal(expr: NodeExpr) -> bool:
+    return isinstance(expr.var, NodeTerm) and expr.var.index is None \
+        and isinstance(expr.var.var, (NodeTermInt, NodeTermBool, NodeTermChar, NodeTermStr))
+
+def literal_bool(expr: NodeExpr) -> bool | None:
+    """
+    returns the value of a condition that the Folder made into a literal, None if it isn't known at compile time
+    """
+    term = expr.var
+    if not isinstance(term, NodeTerm) or term.index is not None or not isinstance(term.var, NodeTermBool):
+        return None
+    return term.var.bool.type == tt.TRUE
+
+def if_arms(if_stmt: NodeStmtIf) -> tuple[list[tuple[NodeExpr, NodeScope]], NodeScope | None]:
+    """
+    returns the conditions of the `kec` and `ikec` branches with their scopes and the scope of the `inac` branch
+    """
+    arms: list[tuple[NodeExpr, NodeScope]] = [(if_stmt.expr, if_stmt.scope)]
+    pred = if_stmt.ifpred
+    while pred is not None:
+        if isinstance(pred.var, NodeIfPredElse):
+            return arms, pred.var.scope
+        arms.append((pred.var.expr, pred.var.scope))
+        pred = pred.var.pred
+    return arms, None
+
+def nested_scopes(stmt: NodeStmt) -> Iterator[NodeScope]:
+    """
+    yields the scopes right inside the statement
+    """
+    var = stmt.stmt_var
+    if isinstance(var, NodeScope):
+        yield var
+    elif isinstance(var, (NodeStmtWhile, NodeStmtDoWhile, NodeStmtFor)):
+        yield var.scope
+    elif isinstance(var, NodeStmtIf):
+        arms, else_scope = if_arms(var)
+        yield from (scope for _, scope in arms)
+        if else_scope is not None:
+            yield else_scope
+
+def count_statements(stmts: list[NodeStmt]) -> int:
+    """
+    counts the statements and the statements nested in them, empty lines are left out
+    """
+    return sum(1 + sum(count_statements(scope.stmts) for scope in nested_scopes(stmt))
+               for stmt in stmts if not isinstance(stmt.stmt_var, NodeStmtEmpty))
+
+def breaks_out(stmts: list[NodeStmt]) -> Iterator[NodeStmtBreak]:
+    """
+    yields the `konec` statements that jump out of the statements, the ones of the loops in them are left out
+    """
+    for stmt in stmts:
+        if isinstance(stmt.stmt_var, NodeStmtBreak):
+            yield stmt.stmt_var
+        elif isinstance(stmt.stmt_var, (NodeScope, NodeStmtIf)):
+            for scope in nested_scopes(stmt):
+                yield from breaks_out(scope.stmts)
+
+def ends(stmt: NodeStmt) -> bool:
+    """
+    checks if the program never gets to the statement after this one
+    """
+    var = stmt.stmt_var
+    if isinstance(var, (NodeStmtExit, NodeStmtBreak)):
+        return True
+    elif isinstance(var, NodeScope):
+        return any(map(ends, var.stmts))
+    elif isinstance(var, NodeStmtIf):
+        _, else_scope = if_arms(var)
+        return else_scope is not None and all(any(map(ends, scope.stmts)) for scope in nested_scopes(stmt))
+    elif isinstance(var, (NodeStmtWhile, NodeStmtFor)):
+        condition = var.expr if isinstance(var, NodeStmtWhile) else var.condition
+        return literal_bool(condition) is True and next(breaks_out(var.scope.stmts), None) is None
+    elif isinstance(var, NodeStmtDoWhile):
+        body_ends = literal_bool(var.expr) is True or any(map(ends, var.scope.stmts))
+        return body_ends and next(breaks_out(var.scope.stmts), None) is None
+    return False
+
+
+class Eliminator(ErrorHandler):
+    """
+    removes the code that never runs or whose work is never seen, runs on the folded statements right before
+    they're generated and like the Generator it gets them one top level statement at a time,
+    the statements after `vychod`, `konec` or a loop that never ends are unreachable,
+    a branch with a literal condition is put in place of its `kec` or removed,
+    a store is dead when its variable is assigned again or goes out of scope before anything reads it,
+    a variable that's never read takes no stack slot,
+    the top level variables live on after the statement so only the ones whose name no statement reads are dead,
+    without the tokens of the whole program, like when streaming, they're all kept,
+    stats counts how many statements every rule removed
+    """
+    def __init__(self, tokens: TokenTable | None, file_content: str) -> None:
+        super().__init__(file_content)
+        self.stats: dict[str, int] = dict.fromkeys(RULES, 0)
+        # the names read and assigned anywhere in the program, None if they aren't known
+        self.names: tuple[set[str], set[str]] | None = read_names(tokens) if tokens is not None else None
+        self.global_names: list[str] = [] # names of the top level variables by their slot
+        self.ended = False # the program never gets past the top level statements before
+        self.loop_depth = 0
+        self.break_lives: list[set[int]] = [] # the variables live after the loops around the statement
+        self.loop_heads: dict[int, set[int]] = {} # id of a loop -> the variables live at its condition when last seen
+        self.dead: dict[int, bool] = {} # id of a store -> if its variable isn't read before it's assigned again
+
+    def is_read(self, name: str) -> bool:
+        return self.names is None or name in self.names[0]
+
+    def is_assigned(self, name: str) -> bool:
+        return self.names is None or name in self.names[1]
+
+    def remove_statements(self, stmts: list[NodeStmt], rule: str) -> None:
+        """
+        counts the statements as removed by the rule, a `konec` outside of every loop is still an error
+        """
+        if self.loop_depth == 0 and (stray := next(breaks_out(stmts), None)) is not None:
+            self.compiler_error("Syntax", "cant break out of a loop when not inside one", stray.break_tkn)
+        self.stats[rule] += count_statements(stmts)
+
+    def simplify(self, stmts: list[NodeStmt]) -> None:
+        """
+        puts the taken branch in place of the branches with a literal condition
+        and removes the statements after the one that the program never gets past
+        """
+        for idx, stmt in enumerate(stmts):
+            self.simplify_statement(stmt)
+            if ends(stmt):
+                self.remove_statements(stmts[idx + 1:], "unreachable")
+                del stmts[idx + 1:]
+                return
+
+    def simplify_loop(self, stmts: list[NodeStmt]) -> None:
+        self.loop_depth += 1
+        self.simplify(stmts)
+        self.loop_depth -= 1
+
+    def simplify_statement(self, stmt: NodeStmt) -> None:
+        var = stmt.stmt_var
+        if isinstance(var, NodeScope):
+            self.simplify(var.stmts)
+        elif isinstance(var, NodeStmtIf):
+            self.simplify_if(stmt, var)
+        elif isinstance(var, (NodeStmtWhile, NodeStmtFor)):
+            condition = var.expr if isinstance(var, NodeStmtWhile) else var.condition
+            if literal_bool(condition) is False and (isinstance(var, NodeStmtWhile) or is_pure(var.ident_def.expr)):
+                self.loop_depth += 1 # its `konec` statements go with it
+                self.remove_statements([stmt], "constant-branch")
+                self.loop_depth -= 1
+                stmt.stmt_var = NodeStmtEmpty()
+            else:
+                self.simplify_loop(var.scope.stmts)
+        elif isinstance(var, NodeStmtDoWhile):
+            self.simplify_loop(var.scope.stmts)
+            if literal_bool(var.expr) is False and next(breaks_out(var.scope.stmts), None) is None:
+                self.stats["constant-branch"] += 1 # the body runs once
+                stmt.stmt_var = var.scope
+
+    def simplify_if(self, stmt: NodeStmt, if_stmt: NodeStmtIf) -> None:
+        arms, else_scope = if_arms(if_stmt)
+        written_else = else_scope
+        kept: list[tuple[NodeExpr, NodeScope]] = []
+        for idx, (expr, scope) in enumerate(arms):
+            value = literal_bool(expr)
+            if value is None:
+                kept.append((expr, scope))
+            elif not value:
+                self.remove_statements(scope.stmts, "constant-branch")
+            else: # the branch is always taken so it's the last one, like an `inac`
+                for _, later in arms[idx + 1:]:
+                    self.remove_statements(later.stmts, "constant-branch")
+                if else_scope is not None:
+                    self.remove_statements(else_scope.stmts, "constant-branch")
+                else_scope = scope
+                break
+
+        for _, scope in kept:
+            self.simplify(scope.stmts)
+        if else_scope is not None:
+            self.simplify(else_scope.stmts)
+        if not kept:
+            self.stats["constant-branch"] += 1
+            stmt.stmt_var = else_scope if else_scope is not None else NodeStmtEmpty()
+        elif len(kept) < len(arms) or else_scope is not written_else:
+            pred = NodeIfPred(NodeIfPredElse(else_scope)) if else_scope is not None else None
+            for expr, scope in reversed(kept[1:]):
+                pred = NodeIfPred(NodeIfPredElif(expr, scope, pred))
+            stmt.stmt_var = NodeStmtIf(kept[0][0], kept[0][1], pred)
+
+    def live_statements(self, stmts: list[NodeStmt], live: set[int]) -> set[int]:
+        """
+        goes backwards through the statements from the variables that are live after them,
+        marks the stores whose variable isn't read before it's assigned again or goes out of scope,
+        returns the variables that are live before the statements, live is changed in place
+        """
+        for stmt in reversed(stmts):
+            live = self.live_statement(stmt, live)
+        return live
+
+    def live_statement(self, stmt: NodeStmt, live: set[int]) -> set[int]:
+        var = stmt.stmt_var
+        if isinstance(var, NodeStmtDeclare):
+            if var.inlined:
+                return live
+            dead = var.slot not in live and is_pure(var.expr)
+            self.dead[id(stmt)] = dead
+            live.discard(var.slot)
+            if not dead:
+                expression_slots(var.expr, live)
+        elif isinstance(var, NodeStmtReassign):
+            target = var.var.ident
+            if target.index is not None: # the string might be read through another variable
+                term_slots(target, live)
+                if isinstance(var.var, NodeStmtReassignEq):
+                    expression_slots(var.var.rvalue, live)
+                return live
+            assert isinstance(target.var, NodeTermIdent), "only variables are assigned to"
+            slot = target.var.slot
+            if isinstance(var.var, NodeStmtReassignEq):
+                dead = slot not in live and is_pure(var.var.rvalue)
+                self.dead[id(stmt)] = dead
+                if not dead:
+                    live.discard(slot)
+                    expression_slots(var.var.rvalue, live)
+            else:
+                self.dead[id(stmt)] = slot not in live
+        elif isinstance(var, NodeStmtExit):
+            live = set()
+            expression_slots(var.expr, live)
+        elif isinstance(var, NodeStmtPrint):
+            expression_slots(var.content, live)
+        elif isinstance(var, NodeStmtBreak):
+            live = set(self.break_lives[-1])
+        elif isinstance(var, NodeScope):
+            live = self.live_statements(var.stmts, live)
+        elif isinstance(var, NodeStmtIf):
+            arms, else_scope = if_arms(var)
+            after = live
+            live = set() if else_scope is not None else set(after)
+            for scope in nested_scopes(stmt):
+                live |= self.live_statements(scope.stmts, set(after))
+            for expr, _ in arms:
+                expression_slots(expr, live)
+        elif isinstance(var, NodeStmtWhile):
+            live, _ = self.live_loop(var, var.expr, live)
+        elif isinstance(var, NodeStmtDoWhile):
+            _, live = self.live_loop(var, var.expr, live)
+        elif isinstance(var, NodeStmtFor):
+            live, _ = self.live_loop(var, var.condition, live)
+            live.discard(var.ident_def.slot)
+            expression_slots(var.ident_def.expr, live)
+        elif not isinstance(var, NodeStmtEmpty):
+            raise ValueError(f"Unreachable {var}")
+        return live
+
+    def live_loop(self, loop: NodeStmtWhile | NodeStmtDoWhile | NodeStmtFor, condition: NodeExpr,
+                  live: set[int]) -> tuple[set[int], set[int]]:
+        """
+        returns the variables live at the condition of the loop and at the start of its body,
+        the body is gone through until no more variables get live, starting from what was live the last time
+        """
+        head = set(self.loop_heads.get(id(loop), ()))
+        self.break_lives.append(live)
+        while True:
+            after_body = set(head)
+            if isinstance(loop, NodeStmtFor):
+                step = loop.ident_assign.var
+                if isinstance(step, NodeStmtReassignEq) and step.ident.index is None:
+                    assert isinstance(step.ident.var, NodeTermIdent), "only variables are assigned to"
+                    after_body.discard(step.ident.var.slot)
+                    expression_slots(step.rvalue, after_body)
+                else:
+                    term_slots(step.ident, after_body)
+            body = self.live_statements(loop.scope.stmts, after_body)
+
+            new_head = head | body
+            if literal_bool(condition) is not True:
+                new_head |= live
+            expression_slots(condition, new_head)
+            if new_head == head:
+                break
+            head = new_head
+        self.break_lives.pop()
+        self.loop_heads[id(loop)] = head
+        return set(head), body
+
+    def zero_initializer(self, decl_stmt: NodeStmtDeclare) -> None:
+        """
+        puts a zero in place of the value of the declaration when it's assigned again before it's read
+        """
+        if decl_stmt.type_.type == tt.STR_DEF or is_literal(decl_stmt.expr):
+            return
+        expr = decl_stmt.expr
+        expr.var = NodeTerm(Folder.make_literal(0, expr.value_type, decl_stmt.ident),
+                            value_type=expr.value_type, value_size=expr.value_size)
+
+    def remove_dead(self, stmts: list[NodeStmt]) -> set[int]:
+        """
+        removes the dead stores from the statements and marks the variables that are never read as unused,
+        returns the slots of the variables from outside of the statements that they still use
+        """
+        used: set[int] = set()
+        kept: list[NodeStmt] = []
+        for stmt in reversed(stmts):
+            var = stmt.stmt_var
+            dead = self.dead.get(id(stmt), False)
+            if isinstance(var, NodeStmtDeclare):
+                if dead and var.slot not in used:
+                    var.unused = True
+                    self.stats["unused-variable"] += 1
+                elif dead:
+                    self.zero_initializer(var)
+                used.discard(var.slot)
+                if not var.unused:
+                    expression_slots(var.expr, used)
+            elif isinstance(var, NodeStmtReassign) and dead:
+                self.stats["dead-store"] += 1
+                continue
+            else:
+                used |= self.statement_slots(stmt)
+            kept.append(stmt)
+        kept.reverse()
+        stmts[:] = kept
+        return used
+
+    def statement_slots(self, stmt: NodeStmt) -> set[int]:
+        """
+        removes the dead stores nested in the statement, returns the slots of the variables it uses
+        """
+        used: set[int] = set()
+        for scope in nested_scopes(stmt):
+            used |= self.remove_dead(scope.stmts)
+        for expr in statement_expressions(stmt):
+            expression_slots(expr, used)
+        var = stmt.stmt_var
+        if isinstance(var, NodeStmtReassign):
+            term_slots(var.var.ident, used)
+        elif isinstance(var, NodeStmtFor):
+            term_slots(var.ident_assign.var.ident, used)
+            if isinstance(var.ident_assign.var, NodeStmtReassignEq):
+                expression_slots(var.ident_assign.var.rvalue, used)
+            used.discard(var.ident_def.slot)
+            expression_slots(var.ident_def.expr, used)
+        return used
+
+    def eliminate_global(self, decl_stmt: NodeStmtDeclare) -> None:
+        """
+        a top level variable is unused if no statement reads or assigns it by its name,
+        its value is dead if it's only assigned
+        """
+        assert decl_stmt.ident.value is not None, "var name shouldn't be None here"
+        assert decl_stmt.slot == len(self.global_names), "the variable slots are out of sync with the Binder"
+        self.global_names.append(decl_stmt.ident.value)
+        if decl_stmt.inlined or self.is_read(decl_stmt.ident.value) or not is_pure(decl_stmt.expr):
+            return
+        elif not self.is_assigned(decl_stmt.ident.value):
+            decl_stmt.unused = True
+            self.stats["unused-variable"] += 1
+        else:
+            self.zero_initializer(decl_stmt)
+
+    def eliminate_statement(self, stmt: NodeStmt) -> bool:
+        """
+        removes the dead code of the top level statement,
+        returns False if the whole statement is dead so it's not generated
+        """
+        if self.ended:
+            self.remove_statements([stmt], "unreachable")
+            return False
+        elif isinstance(stmt.stmt_var, NodeStmtDeclare):
+            self.eliminate_global(stmt.stmt_var)
+            return True
+
+        self.simplify([stmt])
+        live = {slot for slot, name in enumerate(self.global_names) if self.is_read(name)}
+        self.live_statements([stmt], live)
+        stmts = [stmt]
+        self.remove_dead(stmts)
+        self.dead.clear()
+        self.loop_heads.clear()
+        self.ended = ends(stmt)
+        return bool(stmts)
@@ -1,5 +1,57 @@
+from array import array
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import NoReturn
 from comptypes import Token
 
+
+@dataclass(slots=True)
+class Diagnostic:
+    """
+    a single compiler error with everything needed to report it,
+    has_column is False when the error points to the whole line
+    """
+    type_: str
+    details: str
+    line_number: int
+    column_number: int
+    error_line: str
+    has_column: bool = True
+
+    def render(self, file_path: str, dialect_errors: bool = False) -> str:
+        """
+        returns the error report as it gets printed out to the user
+        """
+        lines: list[str] = [
+            f"Failed here: {file_path}:{self.line_number}:{self.column_number}",
+            self.error_line
+        ]
+        
+        if self.has_column:
+            lines.append("^".rjust(self.column_number))
+            col_report = \
+            f" column {self.column_number}" if not dialect_errors \
+            else f" stlupik {self.column_number}"
+        else:
+            lines.append("^" * len(self.error_line))
+            col_report = ""
+        
+        if not dialect_errors:
+            lines.append(f"{"\033[31m"}{self.type_}Error{"\033[0m"}: (line {self.line_number}{col_report}) {self.details}")
+        else:
+            lines.append(f"Joj bysťu {"\033[31m"}{ErrorHandler.translate[self.type_]}{"\033[0m"}: (lajna {self.line_number}{col_report}) {self.details}")
+        return "\n".join(lines)
+
+
+class CompilerError(Exception):
+    """
+    raised by ErrorHandler.compiler_error, carries the diagnostic up to whoever runs the compilation
+    """
+    def __init__(self, diagnostic: Diagnostic) -> None:
+        super().__init__(diagnostic.details)
+        self.diagnostic = diagnostic
+
+
 class ErrorHandler:
     file_path: str = "" 
     dialect_errors: bool = False
@@ -17,15 +69,39 @@ class ErrorHandler:
         self.file_content: str = file
         self.line_number: int = 1
         self.column_number: int = 0
+        
+        # when True the errors are collected into diagnostics at the recovery points of the phase instead of stopping it
+        self.all_errors: bool = False
+        self.diagnostics: list[Diagnostic] = []
+        self.line_starts: array[int] | None = None # offsets of the starts of every line, made on the first error
 
     def get_error_line(self) -> str:
         """
-        returns the line where the error happened based on the line number
+        returns the line where the error happened based on the line number,
+        the last line if the line number is past the end of the file
+        """
+        if self.line_starts is None:
+            self.line_starts = array("i", accumulate(map(lambda x: len(x) + 1, self.file_content.split("\n")), initial=0))
+        
+        line_count = len(self.line_starts) - 1
+        if self.file_content.endswith("\n") or not self.file_content:
+            line_count -= 1 # the empty string after the last newline isn't a line
+        if line_count == 0:
+            return ""
+        
+        idx = min(self.line_number, line_count) - 1
+        return self.file_content[self.line_starts[idx]:self.line_starts[idx + 1] - 1].rstrip("\r")
+
+    def recover(self, error: CompilerError) -> None:
+        """
+        called at a recovery point of a phase, collects the error so the phase can carry on with the next statement,
+        re-raises it if only the first error is reported
         """
-        file_content = self.file_content.splitlines()
-        return file_content[self.line_number - 1] if self.line_number - 1 < len(file_content) else file_content[-1]
+        if not self.all_errors:
+            raise error
+        self.diagnostics.append(error.diagnostic)
 
-    def compiler_error(self, type_: str, details: str, line_and_num: Token | tuple[int, int] | None = None) -> None:
+    def compiler_error(self, type_: str, details: str, line_and_num: Token | tuple[int, int] | None = None) -> NoReturn:
         """
         throws an error based on the given type, details and location passed in,
         if the location isn't given then it assumes the line and column
@@ -36,21 +112,6 @@ class ErrorHandler:
         elif line_and_num:
             self.line_number, self.column_number = line_and_num
         
-        error_line = self.get_error_line()
-        print(f"Failed here: {self.file_path}:{self.line_number}:{self.column_number}")
-        print(error_line)
-        
-        if line_and_num:
-            print("^".rjust(self.column_number))
-            col_report = \
-            f" column {self.column_number}" if not self.dialect_errors \
-            else f" stlupik {self.column_number}"
-        else:
-            print("^" * len(error_line))
-            col_report = ""
-        
-        if not self.dialect_errors:
-            print(f"{"\033[31m"}{type_}Error{"\033[0m"}: (line {self.line_number}{col_report}) {details}")
-        else:
-            print(f"Joj bysťu {"\033[31m"}{self.translate[type_]}{"\033[0m"}: (lajna {self.line_number}{col_report}) {details}")
-        exit(1)
+        raise CompilerError(Diagnostic(
+            type_, details, self.line_number, self.column_number, self.get_error_line(), line_and_num is not None
+        ))
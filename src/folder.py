@@ -0,0 +1,305 @@
+from collections.abc import Callable
+from functools import partial
+from errors import ErrorHandler
+from comptypes import *
+import tokentypes as tt
+
+
+INT_BITS = 32
+
+# nodes that are left to fold and the folds that wait for the values of their operands
+FoldWork = NodeExpr | NodeTerm | Callable[[], object]
+
+def wrap_int(value: int) -> int:
+    """
+    wraps the value around like a signed 32 bit register does
+    """
+    return (value + (1 << INT_BITS - 1)) % (1 << INT_BITS) - (1 << INT_BITS - 1)
+
+def signed_byte(value: int) -> int:
+    return value - 256 if value > 127 else value
+
+
+class Folder(ErrorHandler):
+    """
+    computes the expressions made only out of literals and `furt` variables at compile time,
+    runs on typechecked statements so every node already knows its type,
+    the folded values are bit for bit what the generated code would compute at runtime,
+    a `furt` variable with a folded value is put in place of every use and takes no stack slot
+    """
+    def __init__(self, program: NodeProgram | FlatTree, file_content: str) -> None:
+        super().__init__(file_content)
+        self.main_program = program
+        # slot -> value of the live `furt` variables that got inlined,
+        # slots are reused after a scope ends so a new declaration in the slot removes the old value
+        self.constants: dict[int, int] = {}
+
+    def term_token(self, term: NodeTerm) -> Token:
+        """
+        returns a token of the term for the location of the literal that replaces it
+        """
+        var = term.var
+        if isinstance(var, (NodeTermNot, NodeTermBNot)):
+            return self.term_token(var.term)
+        elif isinstance(var, NodeTermParen):
+            return var.expr.var.op if isinstance(var.expr.var, NodeBinExpr) else self.term_token(var.expr.var)
+        elif isinstance(var, NodeTermIdent):
+            return var.ident
+        elif isinstance(var, NodeTermInt):
+            return var.int_lit
+        elif isinstance(var, NodeTermBool):
+            return var.bool
+        elif isinstance(var, NodeTermChar):
+            return var.char
+        elif isinstance(var, NodeTermStr):
+            return var.string
+        elif isinstance(var, NodeTermCast):
+            return var.type
+        elif isinstance(var, NodeTermSlice):
+            return var.colon
+        raise ValueError("Unreachable")
+
+    @staticmethod
+    def make_literal(value: int, value_type: token_type, loc: Token) -> NodeTermInt | NodeTermBool | NodeTermChar:
+        if value_type == INT_DEF:
+            return NodeTermInt(Token(tt.INT_LIT, loc.line, loc.col, str(abs(value))), negative=value < 0)
+        elif value_type == BOOL_DEF:
+            #NOTE: a bool cast from a number keeps its lowest byte, so it doesn't have to be 0 or 1
+            return NodeTermBool(Token(tt.TRUE if value else tt.FALSE, loc.line, loc.col, str(value)))
+        elif value_type == CHAR_DEF:
+            return NodeTermChar(Token(tt.CHAR_LIT, loc.line, loc.col, str(value)))
+        raise ValueError(f"Unreachable {value_type}")
+
+    @staticmethod
+    def literal_value(term: NodeTerm) -> int | None:
+        """
+        returns the value of a literal term, None if the assembler would reject it as an immediate
+        """
+        var = term.var
+        if isinstance(var, NodeTermInt):
+            assert var.int_lit.value is not None, "int literals always have a value"
+            value = int(var.int_lit.value)
+            if not -(1 << INT_BITS - 1) <= value < 1 << INT_BITS:
+                return None
+            return wrap_int(-value if var.negative else value)
+        elif isinstance(var, (NodeTermBool, NodeTermChar)):
+            token = var.bool if isinstance(var, NodeTermBool) else var.char
+            assert token.value is not None, "bool and char literals always have a value"
+            value = int(token.value)
+            return value if value < 256 else None
+        return None
+
+    def fold_term(self, term: NodeTerm, work: list[FoldWork], values: list[int | None]) -> None:
+        """
+        folds the term into a literal if it can and pushes its value onto values, None if it's not known at compile time,
+        a term with operands is folded once they are, what's left of it waits under them on the work stack
+        """
+        var = term.var
+        def fold_into(value: int | None) -> None:
+            if value is not None:
+                term.var = self.make_literal(value, term.value_type, self.term_token(term))
+            values.append(value)
+
+        if term.index is not None:
+            work.append(lambda: values.append(None))
+            if isinstance(var, (NodeTermParen, NodeTermCast)):
+                work.extend((values.pop, var.expr))
+            elif isinstance(var, NodeTermSlice):
+                self.fold_slice(term, work, values)
+            work.extend((values.pop, term.index))
+        elif isinstance(var, (NodeTermInt, NodeTermBool, NodeTermChar)):
+            values.append(self.literal_value(term))
+        elif isinstance(var, NodeTermIdent):
+            value = self.constants.get(var.slot)
+            if value is not None and var.negative:
+                value = wrap_int(-value) if term.value_type == INT_DEF else -value & 0xFF
+            fold_into(value)
+        elif isinstance(var, NodeTermParen):
+            def fold_paren() -> None:
+                value = values.pop()
+                fold_into(wrap_int(-value) if value is not None and var.negative else value)
+            work.extend((fold_paren, var.expr))
+        elif isinstance(var, NodeTermNot):
+            def fold_not() -> None:
+                value = values.pop()
+                fold_into(int(value == 0) if value is not None else None)
+            work.extend((fold_not, var.term))
+        elif isinstance(var, NodeTermBNot):
+            def fold_bnot() -> None:
+                value = values.pop()
+                fold_into(wrap_int(~value) if value is not None else None)
+            work.extend((fold_bnot, var.term))
+        elif isinstance(var, NodeTermCast):
+            def fold_cast() -> None:
+                value = values.pop()
+                # a cast keeps the lowest bytes of the value and zero extends the rest
+                fold_into(value & 0xFF if value is not None and term.value_size == 1 else value)
+            work.extend((fold_cast, var.expr))
+        elif isinstance(var, NodeTermStr):
+            values.append(None)
+        elif isinstance(var, NodeTermSlice):
+            work.append(lambda: values.append(None))
+            self.fold_slice(term, work, values)
+        else:
+            raise ValueError("Unreachable")
+
+    def fold_slice(self, term: NodeTerm, work: list[FoldWork], values: list[int | None]) -> None:
+        """
+        folds the bounds of the slice, a slice of a string literal with known bounds becomes the shorter literal
+        """
+        assert isinstance(term.var, NodeTermSlice), "only called on slices"
+        slice_ = term.var
+        def fold_bounds() -> None:
+            end = values.pop()
+            start = values.pop()
+            values.pop() # the string has no value
+            sliced = slice_.term.var
+            while isinstance(sliced, NodeTermParen) and isinstance(sliced.expr.var, NodeTerm) and sliced.expr.var.index is None:
+                sliced = sliced.expr.var.var
+            if isinstance(sliced, NodeTermStr) and start is not None and end is not None and 0 <= start <= end <= sliced.length:
+                data = sliced.data[start:end]
+                term.var = NodeTermStr(Token(tt.STR_LIT, slice_.colon.line, slice_.colon.col, data), data)
+        work.extend((fold_bounds, slice_.end, slice_.start, slice_.term))
+
+    def fold_binary_expression(self, expr: NodeExpr, values: list[int | None]) -> None:
+        """
+        folds the binary expression once both of its sides are folded, their values are on top of values
+        """
+        assert isinstance(expr.var, NodeBinExpr), "only called on binary expressions"
+        b = values.pop()
+        a = values.pop()
+        value = self.fold_operation(expr.var, a, b) if a is not None and b is not None else None
+        if value is not None:
+            bin_expr = expr.var
+            expr.var = NodeTerm(
+                self.make_literal(value, bin_expr.value_type, bin_expr.op),
+                value_type=bin_expr.value_type, value_size=bin_expr.value_size
+            )
+        values.append(value)
+
+    def fold_operation(self, bin_expr: NodeBinExpr, a: int, b: int) -> int | None:
+        """
+        computes the operator on the values of both sides, None if it's left for the program to do
+        """
+        op = bin_expr.op.type
+        if op == tt.PLUS:
+            return wrap_int(a + b)
+        elif op == tt.MINUS:
+            return wrap_int(a - b)
+        elif op == tt.STAR:
+            return wrap_int(a * b)
+        elif op in (tt.SLASH, tt.PERCENT):
+            if b == 0 or (a == -(1 << INT_BITS - 1) and b == -1):
+                return None # traps at runtime, it's left for the program to do
+            quotient = abs(a) // abs(b) # idiv rounds towards zero
+            quotient = quotient if (a < 0) == (b < 0) else -quotient
+            return wrap_int(quotient if op == tt.SLASH else a - quotient * b)
+        elif op == tt.BOR:
+            return wrap_int(a | b)
+        elif op == tt.BAND:
+            return wrap_int(a & b)
+        elif op == tt.XOR:
+            return wrap_int(a ^ b)
+        elif op == tt.SHIFT_LEFT:
+            return wrap_int(a << (b & INT_BITS - 1)) # the cpu only uses the lowest 5 bits of the shift count
+        elif op == tt.SHIFT_RIGHT:
+            return a >> (b & INT_BITS - 1)
+        elif op in COMPARISONS:
+            if bin_expr.lhs.value_size == 1:
+                a = signed_byte(a)
+            if bin_expr.rhs.value_size == 1:
+                b = signed_byte(b)
+            if op == tt.IS_EQUAL:
+                return int(a == b)
+            elif op == tt.IS_NOT_EQUAL:
+                return int(a != b)
+            elif op == tt.LARGER_THAN:
+                return int(a > b)
+            elif op == tt.LESS_THAN:
+                return int(a < b)
+            elif op == tt.LARGER_THAN_OR_EQ:
+                return int(a >= b)
+            elif op == tt.LESS_THAN_OR_EQ:
+                return int(a <= b)
+        elif op == tt.AND:
+            return int(a != 0 and b != 0)
+        elif op == tt.OR:
+            return int(a != 0 or b != 0)
+        raise ValueError(f"Unreachable {op}")
+
+    def fold_expression(self, expr: NodeExpr) -> int | None:
+        """
+        folds the expression into a literal term if it can, returns its value or None if it's not known at compile time
+        """
+        values: list[int | None] = []
+        work: list[FoldWork] = [expr]
+        while work:
+            item = work.pop()
+            if isinstance(item, NodeTerm):
+                self.fold_term(item, work, values)
+            elif isinstance(item, NodeExpr) and isinstance(item.var, NodeTerm):
+                work.append(item.var)
+            elif isinstance(item, NodeExpr):
+                work.extend((partial(self.fold_binary_expression, item, values), item.var.rhs, item.var.lhs))
+            else:
+                item()
+        assert len(values) == 1, "every operand is used up by the node it belongs to"
+        return values[0]
+
+    def fold_decl(self, decl_stmt: NodeStmtDeclare) -> None:
+        value = self.fold_expression(decl_stmt.expr)
+        if decl_stmt.is_const and value is not None:
+            decl_stmt.inlined = True
+            self.constants[decl_stmt.slot] = value
+        else:
+            self.constants.pop(decl_stmt.slot, None)
+
+    def fold_reassign(self, reassign_stmt: NodeStmtReassign) -> None:
+        if isinstance(reassign_stmt.var, NodeStmtReassignEq):
+            self.fold_expression(reassign_stmt.var.rvalue)
+        if reassign_stmt.var.ident.index is not None:
+            self.fold_expression(reassign_stmt.var.ident.index)
+
+    def fold_scope(self, scope: NodeScope) -> None:
+        for stmt in scope.stmts:
+            self.fold_statement(stmt)
+
+    def fold_statement(self, stmt: NodeStmt) -> None:
+        var = stmt.stmt_var
+        if isinstance(var, NodeStmtDeclare):
+            self.fold_decl(var)
+        elif isinstance(var, NodeStmtReassign):
+            self.fold_reassign(var)
+        elif isinstance(var, NodeStmtExit):
+            self.fold_expression(var.expr)
+        elif isinstance(var, NodeStmtPrint):
+            self.fold_expression(var.content)
+        elif isinstance(var, NodeScope):
+            self.fold_scope(var)
+        elif isinstance(var, NodeStmtIf):
+            self.fold_expression(var.expr)
+            self.fold_scope(var.scope)
+            ifpred = var.ifpred
+            while ifpred is not None:
+                if isinstance(ifpred.var, NodeIfPredElif):
+                    self.fold_expression(ifpred.var.expr)
+                    self.fold_scope(ifpred.var.scope)
+                    ifpred = ifpred.var.pred
+                else:
+                    self.fold_scope(ifpred.var.scope)
+                    ifpred = None
+        elif isinstance(var, NodeStmtWhile):
+            self.fold_expression(var.expr)
+            self.fold_scope(var.scope)
+        elif isinstance(var, NodeStmtDoWhile):
+            self.fold_scope(var.scope)
+            self.fold_expression(var.expr)
+        elif isinstance(var, NodeStmtFor):
+            self.fold_decl(var.ident_def)
+            self.fold_expression(var.condition)
+            self.fold_scope(var.scope)
+            self.fold_reassign(var.ident_assign)
+        elif isinstance(var, (NodeStmtBreak, NodeStmtEmpty)):
+            pass
+        else:
+            raise ValueError(f"Unreachable {var}")
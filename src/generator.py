@@ -1,72 +1,118 @@
 from collections.abc import Callable
 from errors import ErrorHandler
 from comptypes import *
+from folder import wrap_int
+from loops import LoopInvariants, UNSET, assigned_slots, mutable_string_slots, string_length, string_lengths, \
+    int_range, induction_range, expression_token, slice_offset
+from dispatch import dispatch_table, lookup_values
 import tokentypes as tt
 
 
+# indexes of the registers that have a fixed job
+RAX, RBX, RCX, RDX, RSI, RDI, RSP, RBP = range(8)
+
+INT_MIN = -(1 << 31)
+
+def is_reducible_divisor(divisor: int) -> bool:
+    """
+    checks if dividing by the literal can be done without idiv,
+    dividing by 0 and -1 is left for idiv to trap on and the smallest int has no absolute value
+    """
+    return divisor not in (0, -1, INT_MIN)
+
+def magic_number(divisor: int) -> tuple[int, int]:
+    """
+    returns the multiplier and the shift that divide a 32 bit number by the divisor with a 64 bit multiplication,
+    n / divisor is n * multiplier >> shift, plus 1 for a negative n so it rounds towards zero like idiv,
+    the smallest shift whose rounding error can't reach the next integer for any n is taken,
+    the divisor has to be larger than 1 (Granlund, Montgomery: Division by Invariant Integers using Multiplication)
+    """
+    shift = 32
+    while True:
+        multiplier = -(-(1 << shift) // divisor) # rounded up
+        if multiplier * divisor - (1 << shift) <= 1 << shift - 31:
+            return multiplier, shift
+        shift += 1
+
+
 class Generator(ErrorHandler):
-    output: list[str] = []
-    section_data: list[str] = []
-
-    stack_size: size_bytes = 0
-    stack_item_sizes: list[size_bytes] = []
-    stack_padding: list[size_bytes] = []
-
-    variables: list[VariableContext] = [] # stores all variables on the stack
-    functions: list[str] = []
-    
-    # scopes stores the amount of variables in the scope
-    # defaulted with 0 so the global scope doesn't throw an exception when slicing the vars list
-    scopes: list[int] = [0]
-    
-    label_count: int = 0
-    loop_end_labels: list[str] = []
-
-    registers_64bit: tuple[str, ...] = (
-        "rax", "rbx", "rcx", "rdx",  
-        "rsi", "rdi", "rsp", "rbp", 
-        "r8", "r9", "r10", "r11", 
-        "r12", "r13", "r14", "r15"
-    )
-
-    registers_32bit: tuple[str, ...] = (
-        "eax", "ebx", "ecx", "edx",  
-        "esi", "edi", "esp", "ebp", 
-        "r8d", "r9d", "r10d", "r11d", 
-        "r12d", "r13d", "r14d", "r15d"
-    )
-    
-    registers_16bit: tuple[str, ...] = (
-        "ax", "bx", "cx", "dx", 
-        "si", "di", "sp", "bp", 
-        "r8w", "r9w", "r10w", "r11w", 
-        "r12w", "r13w", "r14w", "r15w"
-    )
-
-    registers_8bit: tuple[str, ...] = (
-        "al", "bl", "cl", "dl", 
-        "sil", "dil", "spl", "bpl", 
-        "r8b", "r9b", "r10b", "r11b", 
-        "r12b", "r13b", "r14b", "r15b"
-    )
-    
-    reg_lookup_table: dict[int, tuple[str, ...]] = {
-        1: registers_8bit,
-        2: registers_16bit,
-        4: registers_32bit,
-        8: registers_64bit,
-    }
-
-    get_type_size: dict[token_type, int] = {
-        BOOL_DEF: 1,
-        CHAR_DEF: 1,
-        INT_DEF: 4,
-        STR_DEF: 8
-    }
-    
-    def __init__(self, program: NodeProgram, file_content: str) -> None:
+    reg_lookup_table: dict[int, tuple[str, ...]] = REGISTERS
+
+    # registers that hold the temporary values of expressions, rbx, rsi, rdi and r8 - r15,
+    # rax, rcx and rdx are left out since division, shifts and indexing need them
+    scratch_registers: tuple[int, ...] = (RBX, RSI, RDI, 8, 9, 10, 11, 12, 13, 14, 15)
+
+    # scratch registers that no statement uses for anything else, rsi and rdi take syscall arguments
+    # and syscall changes r11, the print functions save the ones they use,
+    # a value hoisted out of a loop stays in one of them until the loop ends
+    hoist_registers: tuple[int, ...] = (RBX, 8, 9, 10, 12, 13, 14, 15)
+    # the amount of scratch registers that are always left for the expressions of the loop
+    min_free_regs: int = 4
+
+    # the functions that are copied into their call sites when optimizing if they take at most inline_limit instructions,
+    # exit only knows if it has to write out the output at the end, flush_out is only called by the others
+    # and bounds_error never returns
+    inlinable_funcs: tuple[str, ...] = ("print_char", "print_str")
+    inline_limit: int = 10
+
+    # the size of the buffer that printing writes into, it's written out once it's full and before the program ends
+    out_buf_size: int = 1 << 16
+    # the signals that end the program after the buffer gets written out
+    flush_signals: tuple[int, ...] = (8, 11) # SIGFPE, SIGSEGV
+
+    def __init__(self, program: NodeProgram | FlatTree, file_content: str) -> None:
         super().__init__(file_content)
-        self.main_program: NodeProgram = program
+        self.main_program: NodeProgram | FlatTree = program
+
+        self.output: list[AsmLine] = []
+        self.section_data: list[AsmLine] = []
+        self.section_rodata: list[AsmLine] = []
+
+        self.stack_size: size_bytes = 0
+        self.stack_item_sizes: list[size_bytes] = []
+        self.stack_padding: list[size_bytes] = []
+
+        self.free_regs: list[int] = list(reversed(self.scratch_registers)) # the first scratch register is taken first
+        self.reg_needs: dict[int, int] = {} # id of the expression -> its Sethi-Ullman number, for the current statement
+
+        self.variables: list[VariableContext] = [] # the live variables on the stack, indexed by the slots from the Binder
+        self.functions: list[str] = []
+        self.inline_bodies: dict[str, list[AsmLine] | None] = {} # name of a function -> its body without the ret if it's inlined
+
+        # when optimizing rsp isn't moved before every call, every top level statement moves it below its deepest call
+        # unless it's already below it, frame_size is how far below rbp it is and call_depth is the deepest call so far
+        self.frame_size: int = 0
+        self.call_depth: int = 0
+
+        # scopes stores the amount of variables and of stack items before the scope started,
+        # they differ since inlined `furt` variables take no stack items
+        self.scopes: list[tuple[int, int]] = []
+
+        # multiplications, divisions and modulos by literals are done with shifts, lea and multiplications,
+        # the invariant parts of loops are computed before them and long `ikec` chains comparing variables with literals
+        # are looked up in tables, Compiler(optimize=False) turns it off
+        self.optimize: bool = True
+        self.hoisted: dict[int, Reg] = {} # id of an expression -> the register its value was computed into before the loop
+
+        self.label_count: int = 0
+        self.data_count: int = 0
+        self.str_labels: dict[bytes, str] = {} # the bytes of a string in the read only data -> its label
+        # the string variables that outlive the current top level statement and the ones in it that get changed by indexing,
+        # their literals are copied into writeable memory, the rest point into the read only data
+        self.first_local: int = 0
+        self.mutable_strs: set[int] = set()
+
+        # with bounds checks every index and slice is checked against the length of the string unless the lengths
+        # of the strings and the ranges of the `sicke` variables prove it's in bounds, Compiler(bounds_checks=True) turns it on
+        self.bounds_checks: bool = False
+        self.str_lengths: dict[int, int | None] = {} # slot -> length of the strings assigned in the top level statement
+        self.index_ranges: dict[int, tuple[int, int]] = {} # slot -> range of the `sicke` variables whose body is generated
+        self.bounds_reports: list[BoundsReport] = []
+        self.open_reports: list[BoundsReport] = [] # the reports of the loops that are being generated
+        self.bounds_failures: list[tuple[str, Token, int]] = [] # label, location and stack size of the failed checks
+        # the bytes of the constant prints that weren't generated yet, the ones right after each other get printed at once
+        self.pending_print = bytearray()
+        self.loop_end_labels: list[str] = []
 
         self.column_number = -1
 
@@ -85,131 +131,278 @@ class Generator(ErrorHandler):
             NodeStmtBreak: self.gen_break,
         }
 
+    def emit(self, opcode: str, *operands: Operand, comment: str = "") -> None:
+        """
+        adds an instruction to the output
+        """
+        self.output.append(Instr(opcode, operands, comment))
+
+    def local(self, location: int, size: size_bytes | None = None) -> Mem:
+        """
+        returns the memory operand of a place on the stack, location is its distance below rbp
+        """
+        return Mem(Reg(RBP, 8), -location, size=size)
+
     def align_stack(self, size: size_bytes) -> size_bytes:
         padding = 0
         if self.stack_size % 2 != 0 and size > 1:
             padding = 2 - self.stack_size % 2
             self.stack_size += 2 - self.stack_size % 2
         return padding
-    
+
     def call_func(self, name: str) -> None:
         """
-        adds a call instruction corresponding to the given function name
+        adds a call instruction corresponding to the given function name,
+        when optimizing rsp is already below the stack for the whole top level statement
+        and a small function is copied into the call site instead
+        """
+        if not self.optimize:
+            self.emit("lea", Reg(RSP, 8), self.local(self.stack_size))
+        else:
+            self.call_depth = max(self.call_depth, self.stack_size)
+            if (body := self.inline_body(name)) is not None:
+                self.output.extend(body)
+                return
+        self.emit("call", Sym(name))
+        self.use_func(name)
+
+    def inline_body(self, name: str) -> list[AsmLine] | None:
         """
-        self.output.append(f"    lea rsp, [rbp - {self.stack_size}]\n")
-        self.output.append(f"    call {name}\n")
+        returns a copy of the body of the function without its ret to put into the call site, with its own labels,
+        None if it's too big, it's not the only way out of the function or the function can't be inlined at all
+        """
+        if name not in self.inline_bodies:
+            output, self.output = self.output, []
+            if name in self.inlinable_funcs:
+                self.add_func_body(name)
+            body, self.output = self.output, output
+            instrs = [line for line in body if isinstance(line, Instr)]
+            returns = [instr for instr in instrs if instr.opcode == "ret"]
+            fits = 0 < len(instrs) <= self.inline_limit + 1 and returns == [body[-1]]
+            self.inline_bodies[name] = body[:-1] if fits else None
+
+        body = self.inline_bodies[name]
+        if body is None:
+            return None
+        labels = {line.name: self.create_label() for line in body if isinstance(line, Label)}
+        copy: list[AsmLine] = []
+        for line in body:
+            if isinstance(line, Label):
+                copy.append(Label(labels[line.name]))
+            elif isinstance(line, Instr):
+                operands = tuple(Sym(labels.get(op.name, op.name)) if isinstance(op, Sym) else op for op in line.operands)
+                copy.append(Instr(line.opcode, operands, line.comment))
+            else:
+                copy.append(line)
+        return copy
 
+    def reserve_frame(self, start: int) -> None:
+        """
+        moves rsp below the deepest call of the lines from start on before them, unless it already is,
+        the calls of a statement only run after its start so none of them can push onto its variables
+        """
+        if self.call_depth > self.frame_size:
+            self.output.insert(start, Instr("lea", (Reg(RSP, 8), self.local(self.call_depth)), "frame"))
+            self.frame_size = self.call_depth
+        self.call_depth = 0
+
+    def use_func(self, name: str) -> None:
+        """
+        adds the function to the ones whose bodies get generated
+        """
         if name not in self.functions:
             self.functions.append(name)
-    
+
     def add_funcs(self) -> None:
         """
-        adds all of the function bodies that were used into the assembly
+        adds all of the function bodies that were used into the assembly,
+        printing copies into a buffer that flush_out writes out when it's full and when the program ends
         """
         for func in self.functions:
-            self.output.append(f"{func}:\n")
-            if func == "exit":
-                self.output.append(
-                    "    mov rax, 60\n"
-                    "    syscall\n"
-                )
-            elif func == "print_char":
-                self.output.append(
-                    "    mov rax, 1\n"
-                    "    mov rdi, 1\n"
-                    "    mov rdx, 1\n"
-                    "    syscall\n"
-                    "    ret\n"
-                )
-            elif func == "print_str":
-                self.output.append(
-                    "    mov rax, 1\n"
-                    "    mov rdi, 1\n"
-                    "    syscall\n"
-                    "    ret\n"
-                    )
-            else:
-                raise ValueError("Unreachable")
-
-    def push_stack(self, src: str, size_words: str = "") -> None:
-        """
-        adds a 'push' instruction to the output and updates the stack size 
-        """
-        if src in self.registers_64bit or src.startswith("QWORD") or size_words == "QWORD":
-            size: size_bytes = 8
-            reg = "rax"
-        elif src in self.registers_32bit or src.startswith("DWORD") or size_words == "DWORD":
-            size: size_bytes = 4
-            reg = "eax"
-        elif src in self.registers_16bit or src.startswith("WORD") or size_words == "WORD":
-            size: size_bytes = 2
-            reg = "ax"
-        elif src in self.registers_8bit or src.startswith("BYTE") or size_words == "BYTE":
-            size: size_bytes = 1
-            reg = "al"
+            self.output.append(Label(func))
+            self.add_func_body(func)
+
+    def add_func_body(self, func: str) -> None:
+        """
+        adds the instructions of the function
+        """
+        if func == "exit":
+            if "flush_out" in self.functions:
+                self.emit("push", Reg(RDI, 8))
+                self.emit("call", Sym("flush_out"))
+                self.emit("pop", Reg(RDI, 8))
+            self.emit("mov", Reg(RAX, 8), Imm(60))
+            self.emit("syscall")
+        elif func == "print_char":
+            # the char is in sil
+            self.emit("mov", Reg(RAX, 8), Mem(Sym("out_len"), size=8))
+            self.emit("cmp", Reg(RAX, 8), Imm(self.out_buf_size))
+            self.emit("jb", Sym(".print_char_store"))
+            self.emit("push", Reg(RSI, 8))
+            self.emit("call", Sym("flush_out"))
+            self.emit("pop", Reg(RSI, 8))
+            self.emit("xor", Reg(RAX, 4), Reg(RAX, 4))
+            self.output.append(Label(".print_char_store"))
+            self.emit("mov", Mem(Sym("out_buf"), index=Reg(RAX, 8), size=1), Reg(RSI, 1))
+            self.emit("inc", Reg(RAX, 8))
+            self.emit("mov", Mem(Sym("out_len"), size=8), Reg(RAX, 8))
+            self.emit("ret")
+        elif func == "print_str":
+            # the pointer to the string is in rsi and its length in rdx
+            self.emit("mov", Reg(RAX, 8), Mem(Sym("out_len"), size=8))
+            self.emit("lea", Reg(RCX, 8), Mem(Reg(RAX, 8), index=Reg(RDX, 8)))
+            self.emit("cmp", Reg(RCX, 8), Imm(self.out_buf_size))
+            self.emit("jbe", Sym(".print_str_copy"))
+            self.emit("push", Reg(RSI, 8))
+            self.emit("push", Reg(RDX, 8))
+            self.emit("call", Sym("flush_out"))
+            self.emit("pop", Reg(RDX, 8))
+            self.emit("pop", Reg(RSI, 8))
+            self.emit("xor", Reg(RAX, 4), Reg(RAX, 4))
+            self.emit("cmp", Reg(RDX, 8), Imm(self.out_buf_size))
+            self.emit("jbe", Sym(".print_str_copy"))
+            # a string that doesn't fit into the empty buffer is written out right away
+            self.emit("mov", Reg(RAX, 4), Imm(1))
+            self.emit("mov", Reg(RDI, 4), Imm(1))
+            self.emit("syscall")
+            self.emit("ret")
+            self.output.append(Label(".print_str_copy"))
+            self.emit("lea", Reg(RDI, 8), Mem(Sym("out_buf"), index=Reg(RAX, 8)))
+            self.emit("mov", Reg(RCX, 8), Reg(RDX, 8))
+            self.emit("rep movsb")
+            self.emit("add", Reg(RAX, 8), Reg(RDX, 8))
+            self.emit("mov", Mem(Sym("out_len"), size=8), Reg(RAX, 8))
+            self.emit("ret")
+        elif func == "flush_out":
+            self.add_flush_out()
+        elif func == "bounds_error":
+            # the message is in rsi and its length in rdx, the output printed so far comes before it
+            if "flush_out" in self.functions:
+                self.emit("push", Reg(RSI, 8))
+                self.emit("push", Reg(RDX, 8))
+                self.emit("call", Sym("flush_out"))
+                self.emit("pop", Reg(RDX, 8))
+                self.emit("pop", Reg(RSI, 8))
+            self.emit("mov", Reg(RAX, 4), Imm(1))
+            self.emit("mov", Reg(RDI, 4), Imm(2)) # stderr
+            self.emit("syscall")
+            self.emit("mov", Reg(RAX, 4), Imm(60))
+            self.emit("mov", Reg(RDI, 4), Imm(1))
+            self.emit("syscall")
         else:
+            raise ValueError("Unreachable")
+
+    def add_flush_out(self) -> None:
+        """
+        adds the body of flush_out and the data of the output buffer,
+        the first call installs the signal handlers that write the buffer out before a crash ends the program,
+        so the output is the same as if every print was written right away,
+        out_len starts full so the first print calls it
+        """
+        SA_RESTORER, SA_RESETHAND = 0x04000000, 0x80000000
+        SIGACTION_SIZE = 8 # the size of the signal mask the kernel expects
+        self.emit("cmp", Mem(Sym("out_ready"), size=1), Imm(0))
+        self.emit("jne", Sym(".flush_out_write"))
+        self.emit("mov", Mem(Sym("out_ready"), size=1), Imm(1))
+        self.emit("push", Reg(10, 8)) # r10 can hold a value hoisted out of a loop
+        for signal in self.flush_signals:
+            self.emit("mov", Reg(RAX, 4), Imm(13)) # rt_sigaction
+            self.emit("mov", Reg(RDI, 4), Imm(signal))
+            self.emit("mov", Reg(RSI, 8), Sym("out_action"))
+            self.emit("xor", Reg(RDX, 4), Reg(RDX, 4))
+            self.emit("mov", Reg(10, 4), Imm(SIGACTION_SIZE))
+            self.emit("syscall")
+        self.emit("pop", Reg(10, 8))
+        self.emit("mov", Mem(Sym("out_len"), size=8), Imm(0))
+        self.emit("ret")
+        self.output.append(Label(".flush_out_write"))
+        self.emit("mov", Reg(RDX, 8), Mem(Sym("out_len"), size=8))
+        self.emit("test", Reg(RDX, 8), Reg(RDX, 8))
+        self.emit("jz", Sym(".flush_out_done"))
+        self.emit("mov", Reg(RAX, 4), Imm(1))
+        self.emit("mov", Reg(RDI, 4), Imm(1))
+        self.emit("mov", Reg(RSI, 8), Sym("out_buf"))
+        self.emit("syscall")
+        self.emit("mov", Mem(Sym("out_len"), size=8), Imm(0))
+        self.output.append(Label(".flush_out_done"))
+        self.emit("ret")
+
+        # the handler returns to the instruction that crashed, which crashes again without the handler
+        self.output.append(Label("out_on_signal"))
+        self.emit("call", Sym("flush_out"))
+        self.emit("ret")
+        self.output.append(Label("out_restorer"))
+        self.emit("mov", Reg(RAX, 4), Imm(15)) # rt_sigreturn
+        self.emit("syscall")
+
+        self.section_data.append(Raw(f"out_action dq out_on_signal, {SA_RESTORER | SA_RESETHAND}, out_restorer, 0\n"))
+        self.section_data.append(Raw(f"out_len dq {self.out_buf_size}\n"))
+        self.section_data.append(Raw("out_ready db 0\n"))
+        self.section_data.append(Raw(f"out_buf rb {self.out_buf_size}\n"))
+
+    def push_stack(self, src: Operand, size: size_bytes | None = None) -> None:
+        """
+        adds a 'push' instruction to the output and updates the stack size,
+        the size is taken from the operand, only an immediate needs it given
+        """
+        if isinstance(src, (Reg, Mem)) and src.size is not None:
+            size = src.size
+        if size not in (1, 2, 4, 8):
             raise ValueError(f"Invalid register / WORD size {src}")
-        
+
         padding = self.align_stack(size)
 
         self.stack_size += size
         self.stack_item_sizes.append(size)
         self.stack_padding.append(padding)
 
+        if isinstance(src, Mem): # there's no memory to memory move
+            reg = self.get_reg(RAX, size)
+            self.emit("mov", reg, src)
+            src = reg
+        self.emit("mov", self.local(self.stack_size, size), src, comment="push")
 
-        if "[" not in src:
-            self.output.append(f"    mov {size_words} [rbp - {self.stack_size}], {src} ;push\n")
-        else:
-            self.output.append(
-                f"    mov {reg}, {src}\n"
-                f"    mov {size_words} [rbp - {self.stack_size}], {reg} ;push\n"
-            )
-        
         if ErrorHandler.debug_mode:
             print("push", self.stack_size, self.stack_item_sizes, self.variables)
 
-    def pop_stack(self, dest_reg: str):
+    def pop_stack(self, dest_reg: Reg):
         """
-        adds a 'pop' instruction to the output and updates the stack size 
+        adds a 'pop' instruction to the output and updates the stack size
         """
-        self.output.append(f"    mov {dest_reg}, [rbp - {self.stack_size}] ;pop\n")
+        self.emit("mov", dest_reg, self.local(self.stack_size, dest_reg.size), comment="pop")
         size = self.stack_item_sizes.pop() # removes the last items size
         padding = self.stack_padding.pop()
         self.stack_size -= size + padding
         if ErrorHandler.debug_mode:
             print("pop", self.stack_size, self.stack_item_sizes, self.variables)
-    
-    def push_stack_complex(self, src: list[str], sizes_w: list[size_words], sizes_b: list[size_bytes]):
+
+    def push_stack_complex(self, src: list[Operand], sizes_b: list[size_bytes]):
         """
         pushes multiple items onto the stack but only saves it as a whole item onto the compiler stack
         """
         #TODO: figure out what to do with the padding here
         padding = 0
-        for item, byte_s, word_s in zip(src, sizes_b, sizes_w):
+        for item, byte_s in zip(src, sizes_b):
             # padding += self.align_stack(byte_s)
             self.stack_size += byte_s
-            if word_s == "QWORD" and item not in self.registers_64bit:
-                self.output.append(f"    mov rbx, {item}\n"
-                    f"    mov {word_s} [rbp - {self.stack_size}], rbx ;push\n"
-                )
-            else:
-                self.output.append(f"    mov {word_s} [rbp - {self.stack_size}], {item} ;push\n")
-        
+            if byte_s == 8 and isinstance(item, Imm): # a QWORD immediate can only be moved into a register
+                # rdx since a string can be made while the scratch registers hold an expression
+                self.emit("mov", Reg(RDX, 8), item)
+                item = Reg(RDX, 8)
+            self.emit("mov", self.local(self.stack_size, byte_s), item, comment="push")
+
         self.stack_item_sizes.append(sum(sizes_b))
         self.stack_padding.append(padding)
         if ErrorHandler.debug_mode:
             print("push multi", self.stack_size, self.stack_item_sizes, self.variables)
 
-    def get_reg(self, idx: int) -> str:
+    def get_reg(self, idx: int, size: size_bytes) -> Reg:
         """
-        returns a name of the correctly sized register based on the current top of the stack
-        if the size doesn't exist throws a ValueError
+        returns the register sized for a value of the given size,
+        the size comes from the type annotations of the TypeChecker
         """
-        assert len(self.stack_item_sizes) > 0, "Stack underflow"
-        size = self.stack_item_sizes[-1]
-        if size not in self.reg_lookup_table.keys():
-            raise ValueError(self.stack_item_sizes)
-        return self.reg_lookup_table[size][idx]
+        assert size in self.reg_lookup_table, f"no register fits a value of {size} bytes"
+        return Reg(idx, size)
 
     def create_label(self, custom_lbl: str="") -> str:
         """
@@ -220,300 +413,742 @@ class Generator(ErrorHandler):
 
     def begin_scope(self) -> None:
         """
-        adds the amount of variables to the scopes list 
-        so the end scopes function knows how many variables it should delete,
+        adds the amount of variables and stack items to the scopes list
+        so the end scopes function knows how many of them it should delete,
         only used in the gen_scope() method
         """
-        self.scopes.append(len(self.variables))
+        self.scopes.append((len(self.variables), len(self.stack_item_sizes)))
 
     def end_scope(self) -> None:
         """
         removes the last scopes variables from memory (by moving the stack pointer),
         removes itself from the generators list of scopes,
-        removes the aforementioned variables from the generators dictionary
-        returns prematurely if theres nothing to remove,
+        removes the aforementioned variables from the generators list,
         only used in the gen_scope() method
         """
-        pop_count: int = len(self.variables) - self.scopes[-1]
-        if pop_count == 0:
-            del self.scopes[-1]
-            return # nothing to remove, if its not here then slice accepts all of the stack -> list[0:] == list
-
-        popped_size: int = sum(self.stack_item_sizes[-pop_count:]) + sum(self.stack_padding[-pop_count:])
+        var_count, item_count = self.scopes.pop()
+        popped_size: int = sum(self.stack_item_sizes[item_count:]) + sum(self.stack_padding[item_count:])
         self.stack_size -= popped_size
 
-        for _ in range(pop_count):
-            self.variables.pop()
-            self.stack_item_sizes.pop()
-            self.stack_padding.pop()
-        del self.scopes[-1]
-    
-    def make_str(self, str_term: NodeTermStr):
+        del self.variables[var_count:]
+        del self.stack_item_sizes[item_count:]
+        del self.stack_padding[item_count:]
+
+    def str_label(self, data: bytes) -> str:
+        """
+        returns the label of the bytes in the read only data, the same bytes are only added once
+        """
+        if (label := self.str_labels.get(data)) is None:
+            self.data_count += 1
+            label = self.str_labels[data] = f"str{self.data_count}"
+            self.section_rodata.append(Raw(f"{label} db {", ".join(map(str, data))}\n"))
+        return label
+
+    def string_literal(self, expr: NodeExpr) -> NodeTermStr | None:
+        """
+        returns the string literal that the expression is, None if it's something else
+        """
+        term = expr.var
+        while isinstance(term, NodeTerm) and isinstance(term.var, NodeTermParen) and term.index is None:
+            term = term.var.expr.var
+        if isinstance(term, NodeTerm) and isinstance(term.var, NodeTermStr) and term.index is None:
+            return term.var
+        return None
+
+    def is_mutable_str(self, slot: int) -> bool:
+        return slot < self.first_local or slot in self.mutable_strs
+
+    def known_length(self, slot: int) -> int | None:
+        return self.variables[slot].length if slot < len(self.variables) else UNSET
+
+    def in_bounds(self, term: NodeTerm, bounds: tuple[NodeExpr, ...]) -> bool:
         """
-        adds a string onto the stack with its pointer to the start and length
+        checks if the index or the start and the end of the slice of the string term are always in bounds
+        """
+        length = string_length(NodeExpr(NodeTerm(term.var)), self.str_lengths, self.known_length)
+        ranges = [int_range(bound, self.index_ranges) for bound in bounds]
+        if length is None or length == UNSET or None in ranges:
+            return False
+        lows, highs = [r[0] for r in ranges if r is not None], [r[1] for r in ranges if r is not None]
+        if len(bounds) == 1: # an index has to point to a byte of the string
+            return lows[0] >= 0 and highs[0] < length
+        ordered = highs[0] <= lows[1] or slice_offset(*bounds) is not None
+        return lows[0] >= 0 and ordered and highs[1] <= length
+
+    def needs_bounds_check(self, term: NodeTerm, bounds: tuple[NodeExpr, ...]) -> bool:
+        """
+        checks if the index or the slice of the string term has to be checked when it runs,
+        counts the check into the report of the loop it's in
+        """
+        if not self.bounds_checks:
+            return False
+        removed = self.in_bounds(term, bounds)
+        if self.open_reports:
+            self.open_reports[-1].checks += 1
+            self.open_reports[-1].removed += removed
+        return not removed
+
+    def add_bounds_check(self, term: NodeTerm, lhs: Operand, rhs: Operand, fail_if: str) -> None:
+        """
+        compares the operands and jumps to the bounds error of the string term if the condition holds
+        """
+        label = self.create_label("bounds")
+        self.bounds_failures.append((label, expression_token(NodeExpr(term)), self.stack_size))
+        self.emit("cmp", lhs, rhs)
+        self.emit(f"j{fail_if}", Sym(label))
+
+    def make_str(self, str_term: NodeTermStr, slot: int | None = None):
         """
-        if not str_term.string.value:
-            str_term.string.value = "0"
-        
-        str_data = list(map(lambda x: hex(int(x))[2:], str_term.string.value.split(",")[::-1]))
+        adds a string onto the stack with its pointer to the start and length,
+        the pointer points into the read only data unless the string is put into a variable that gets changed by indexing,
+        then the bytes are put into the writeable data if the statement runs once or onto the stack if it's in a loop
+        """
+        # an empty string still takes up a zeroed byte so the pointer points to something
+        str_data: bytes = str_term.data if str_term.data else b"\0"
         STR_LEN = len(str_data)
-        
-        str_chunks: list[str] = []
+
+        if slot is None or not self.is_mutable_str(slot):
+            label = self.str_label(str_data)
+        elif not self.loop_end_labels:
+            self.data_count += 1
+            label = f"str{self.data_count}"
+            self.section_data.append(Raw(f"{label} db {", ".join(map(str, str_data))}\n"))
+        else:
+            label = None
+
+        str_chunks: list[Operand] = []
         str_data_sizeb: list[size_bytes] = []
-        str_data_sizew: list[size_words] = []
-        
-        start = 0
-        end = 0
-        count = STR_LEN
-
-        for sizeb, sizew in zip((8, 4, 2, 1), ("QWORD", "DWORD", "WORD", "BYTE")):
-            res = count // sizeb
-            count %= sizeb
-
-            for i in range(res):
-                end += sizeb
-                str_chunks.append("0x" + "".join(str_data[start:end]))
-                str_data_sizeb.append(sizeb)
-                str_data_sizew.append(sizew)
-                start += sizeb
-        
-        self.output.append(f"    lea rax, [rbp - {self.stack_size + STR_LEN}]\n")
-        str_chunks.append("rax")
-        str_data_sizeb.append(8)
-        str_data_sizew.append("QWORD")
-        
-        if str_term.string.value != "0":
-            str_chunks.append(str(STR_LEN))
+
+        if label is not None:
+            self.emit("mov", Reg(RAX, 8), Sym(label))
         else:
-            str_chunks.append("0")
-        
+            # chunks get pushed from the end of the string since the stack grows downwards
+            end = STR_LEN
+            for sizeb in (8, 4, 2, 1):
+                while end >= sizeb:
+                    str_chunks.append(Imm(int.from_bytes(str_data[end - sizeb:end], "little")))
+                    str_data_sizeb.append(sizeb)
+                    end -= sizeb
+            self.emit("lea", Reg(RAX, 8), self.local(self.stack_size + STR_LEN))
+        str_chunks.append(Reg(RAX, 8))
+        str_data_sizeb.append(8)
+
+        str_chunks.append(Imm(str_term.length))
         str_data_sizeb.append(4)
-        str_data_sizew.append("DWORD")
-        
-        self.push_stack_complex(str_chunks, str_data_sizew, str_data_sizeb)
 
+        self.push_stack_complex(str_chunks, str_data_sizeb)
+
+
+    def alloc_reg(self) -> int:
+        """
+        takes a free scratch register, returns its index into the register tables
+        """
+        assert self.free_regs, "ran out of registers, the expression should have been spilled"
+        return self.free_regs.pop()
+
+    def free_reg(self, idx: int) -> None:
+        self.free_regs.append(idx)
+
+    def operand(self, expr: NodeExpr) -> Imm | Mem | Reg | None:
+        """
+        returns the expression as an immediate, a memory operand or the register it was hoisted into
+        if an instruction can use it directly, None if it has to be computed into a register first
+        """
+        if (reg := self.hoisted.get(id(expr))) is not None:
+            return reg
+        if not isinstance(expr.var, NodeTerm) or expr.var.index is not None:
+            return None
+        var = expr.var.var
+        if isinstance(var, NodeTermInt):
+            assert var.int_lit.value is not None, "int literals always have a value"
+            return Imm(-int(var.int_lit.value) if var.negative else int(var.int_lit.value))
+        elif isinstance(var, NodeTermBool):
+            assert var.bool.value is not None, "shouldn't be None here"
+            return Imm(int(var.bool.value))
+        elif isinstance(var, NodeTermChar):
+            assert var.char.value is not None, "shouldn't be None here"
+            return Imm(int(var.char.value))
+        elif isinstance(var, NodeTermIdent) and not var.negative:
+            var_ctx = self.variables[var.slot]
+            if var_ctx.size_w != "STR":
+                return self.local(var_ctx.loc, var_ctx.size_b)
+        return None
+
+    def reg_need(self, expr: NodeExpr, is_rhs: bool = False) -> int:
+        """
+        returns the Sethi-Ullman number of the expression, the amount of registers needed to compute it without spilling,
+        a right hand side that an instruction can use directly needs none
+        """
+        if is_rhs and self.operand(expr) is not None:
+            return 0
+        if id(expr) in self.hoisted:
+            return 1
+        if id(expr) in self.reg_needs:
+            return self.reg_needs[id(expr)]
+
+        # the left sides of long chains like a + b + c and the insides of deep parentheses are done innermost first,
+        # so only the right sides are recursed into
+        chain: list[NodeExpr] = []
+        inner = expr
+        while (inner := self.first_operand(inner)) is not None and id(inner) not in self.hoisted \
+                and id(inner) not in self.reg_needs:
+            chain.append(inner)
+        for inner in reversed(chain):
+            self.reg_need(inner)
+
+        if isinstance(expr.var, NodeTerm):
+            term = expr.var
+            while isinstance(term.var, (NodeTermNot, NodeTermBNot)) and term.index is None:
+                term = term.var.term
+            if term.index is not None:
+                need = max(self.reg_need(term.index), self.str_reg_need(term))
+            elif isinstance(term.var, (NodeTermParen, NodeTermCast)):
+                need = max(1, self.reg_need(term.var.expr))
+            else:
+                need = 1
+        else:
+            need = self.bin_reg_need(expr.var)
+        self.reg_needs[id(expr)] = need
+        return need
+
+    @staticmethod
+    def first_operand(expr: NodeExpr) -> NodeExpr | None:
+        """
+        returns the operand of the expression that its Sethi-Ullman number is worked out from first,
+        None if it has no operands
+        """
+        if isinstance(expr.var, NodeBinExpr):
+            return expr.var.lhs
+        term = expr.var
+        while isinstance(term.var, (NodeTermNot, NodeTermBNot)) and term.index is None:
+            term = term.var.term
+        if isinstance(term.var, (NodeTermParen, NodeTermCast)) and term.index is None:
+            return term.var.expr
+        return None
+
+    def inside_parens(self, expr: NodeExpr) -> NodeExpr:
+        """
+        returns the expression inside the parentheses around it,
+        generating it is the same as generating the parentheses as long as they aren't negative or hoisted
+        """
+        while id(expr) not in self.hoisted and isinstance(expr.var, NodeTerm) and expr.var.index is None \
+                and isinstance(expr.var.var, NodeTermParen) and not expr.var.var.negative:
+            expr = expr.var.var.expr
+        return expr
+
+    def bin_reg_need(self, bin_expr: NodeBinExpr) -> int:
+        if bin_expr.op.type in (tt.AND, tt.OR): # the result is kept while each side is compared
+            return 1 + max(self.reg_need(bin_expr.lhs), self.reg_need(bin_expr.rhs))
+        lhs_need = self.reg_need(bin_expr.lhs)
+        rhs_need = self.reg_need(bin_expr.rhs, True)
+        return lhs_need + 1 if lhs_need == rhs_need else max(lhs_need, rhs_need)
+
+    def gen_str(self, term: NodeTerm, slot: int | None = None) -> None:
+        """
+        generates a string term, its pointer and length get pushed on top of the stack,
+        slot is the variable the string is put into
+        """
+        if isinstance(term.var, NodeTermStr):
+            self.make_str(term.var, slot)
+        elif isinstance(term.var, NodeTermIdent):
+            len_loc = self.variables[term.var.slot].loc
+            LEN_SIZE = 4
+            PTR_SIZE = 8
+
+            self.push_stack(self.local(len_loc - 4, PTR_SIZE))
+            self.push_stack(self.local(len_loc, LEN_SIZE))
+            accum_size = self.stack_item_sizes.pop() + self.stack_item_sizes.pop()
+            accum_padding = self.stack_padding.pop() + self.stack_padding.pop()
+            self.stack_item_sizes.append(accum_size)
+            self.stack_padding.append(accum_padding)
+        elif isinstance(term.var, NodeTermParen):
+            assert isinstance(term.var.expr.var, NodeTerm), "strings have no binary operations"
+            self.gen_str(term.var.expr.var, slot)
+        elif isinstance(term.var, NodeTermSlice):
+            self.gen_str(term.var.term, slot)
+            self.gen_slice(term.var)
+        else:
+            raise ValueError("Unreachable")
 
-    def gen_term(self, term: NodeTerm) -> None:
+    def gen_slice(self, slice_: NodeTermSlice) -> None:
         """
-        generates a term, a term being a variable or a number, 
-        gets pushed on to of the stack
+        turns the string on top of the stack into its slice, the pointer is moved to the start
+        and the length becomes the distance from the start to the end, no bytes are copied,
+        with bounds checks the start can't be past the end and the end can't be past the length of the string
+        """
+        LEN_SIZE = 4
+        ptr = self.local(self.stack_size - LEN_SIZE, 8)
+        length = self.local(self.stack_size, LEN_SIZE)
+        start = self.operand(slice_.start)
+        end = self.operand(slice_.end)
+
+        if self.needs_bounds_check(slice_.term, (slice_.start, slice_.end)):
+            spilled = not isinstance(start, Imm)
+            if spilled: # the start waits on the stack while the end is computed
+                self.push_expression(slice_.start)
+                start = self.local(self.stack_size, LEN_SIZE)
+            assert start is not None, "the start is an immediate or on the stack"
+            re = self.gen_expression(slice_.end)
+            self.add_bounds_check(slice_.term, self.get_reg(re, 4), length, "a")
+            self.add_bounds_check(slice_.term, self.get_reg(re, 4), start, "b")
+            if isinstance(start, Imm):
+                if start.value != 0:
+                    self.emit("add", ptr, start)
+            else:
+                self.emit("movsxd", Reg(RDX, 8), start)
+                self.emit("add", ptr, Reg(RDX, 8))
+            self.emit("sub", self.get_reg(re, 4), start)
+            self.emit("mov", length, self.get_reg(re, 4))
+            self.free_reg(re)
+            if spilled:
+                self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop()
+            return
+
+        if isinstance(start, Imm):
+            if start.value != 0:
+                self.emit("add", ptr, start)
+            if isinstance(end, Imm):
+                self.emit("mov", length, Imm(wrap_int(end.value - start.value)))
+                return
+        else:
+            rs: int | None = None
+            if start is None:
+                rs = self.gen_expression(slice_.start)
+                start = self.get_reg(rs, 4)
+            self.emit("movsxd", Reg(RDX, 8), start)
+            self.emit("add", ptr, Reg(RDX, 8))
+            self.emit("mov", length, Reg(RDX, 4)) # the start waits here while the end is computed
+            if rs is not None:
+                self.free_reg(rs)
+            start = length
+        re = self.gen_expression(slice_.end)
+        self.emit("sub", self.get_reg(re, 4), start)
+        self.emit("mov", length, self.get_reg(re, 4))
+        self.free_reg(re)
+
+    def str_reg_need(self, term: NodeTerm) -> int:
+        """
+        returns the amount of registers that making the string term takes
+        """
+        var = term.var
+        if isinstance(var, NodeTermSlice):
+            return max(self.str_reg_need(var.term), self.reg_need(var.start), self.reg_need(var.end))
+        elif isinstance(var, NodeTermParen) and isinstance(var.expr.var, NodeTerm):
+            return self.str_reg_need(var.expr.var)
+        return 0
+
+    def gen_term(self, term: NodeTerm) -> int:
+        """
+        generates a term, a term being a variable or a number,
+        returns the index of the register it ends up in
         """
         if ErrorHandler.debug_mode:
             print(term.var)
-        
+
         if term.index is not None:
-            self.output.append("    ; --- indexing ---\n")
-            old_stack_size = self.stack_size # solves the incorrect reads
-            LEN_SIZE = 4
-            ITEM_SIZE_W = "BYTE"
+            self.output.append(Comment("; --- indexing ---"))
             ITEM_SIZE_B = 1
-            
-            self.gen_expression(term.index)
-
-            rb = self.get_reg(1)
-            self.output.append(f"    xor rbx, rbx\n")
-            self.pop_stack(rb)
-
-            self.gen_term(NodeTerm(term.var))
-            self.output.append(f"    mov rax, [rbp - {self.stack_size - LEN_SIZE}]\n") # reads the pointer to the string
-            
-            self.stack_size = old_stack_size
-            self.stack_item_sizes.pop()
-
-            self.push_stack(f"{ITEM_SIZE_W} [rax + rbx * {ITEM_SIZE_B}]")
-        elif isinstance(term.var, NodeTermInt):
-            assert term.var.int_lit.value is not None, "term.var.int_lit.value shouldn't be None, probably a parsing error"
-            
-            if term.var.negative:
-                term.var.int_lit.value = "-" + term.var.int_lit.value
-            self.push_stack(term.var.int_lit.value, "DWORD")
+            if isinstance(term.var, NodeTermIdent):
+                ptr_loc = self.variables[term.var.slot].loc - 4
+                ra = self.gen_expression(term.index)
+            else:
+                # the string is made first so making it can't overwrite the index
+                self.gen_str(NodeTerm(term.var))
+                ptr_loc = self.stack_size - 4
+                ra = self.gen_expression(term.index)
+                self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop()
+            if self.needs_bounds_check(term, (term.index,)): # a negative index is a large unsigned one
+                self.add_bounds_check(term, self.get_reg(ra, 4), self.local(ptr_loc + 4, 4), "ae")
+            # the index is a 32 bit value so the upper half of its 64 bit register is already zeroed
+            self.emit("mov", Reg(RAX, 8), self.local(ptr_loc, 8)) # reads the pointer to the string
+            self.emit("mov", self.get_reg(ra, ITEM_SIZE_B), Mem(Reg(RAX, 8), index=self.get_reg(ra, 8), scale=ITEM_SIZE_B, size=ITEM_SIZE_B))
+        elif isinstance(term.var, (NodeTermInt, NodeTermBool, NodeTermChar)):
+            ra = self.alloc_reg()
+            literal = self.operand(NodeExpr(term))
+            assert literal is not None, "literals are always operands"
+            self.emit("mov", self.get_reg(ra, term.value_size), literal)
         elif isinstance(term.var, NodeTermIdent):
             assert term.var.ident.value is not None, "term.var.ident.value shouldn't be None, probably a parsing error"
 
-            found_vars: tuple[VariableContext, ...] = tuple(filter(lambda x: x.name == term.var.ident.value, self.variables)) # type: ignore (says types are unknown even though they are known)
-            if not found_vars:
+            if term.var.slot == -1:
                 self.compiler_error("Value", f"variable was not declared: {term.var.ident.value}", term.var.ident)
-            if found_vars[-1].size_w == "STR": # reading a str type
-                len_loc = found_vars[-1].loc
-                LEN_SIZE = "DWORD"
-                PTR_SIZE = "QWORD"
-
-                self.push_stack(f"{PTR_SIZE} [rbp - {len_loc - 4}]")
-                self.push_stack(f"{LEN_SIZE} [rbp - {len_loc}]")
-                accum_size = self.stack_item_sizes.pop() + self.stack_item_sizes.pop()
-                accum_padding = self.stack_padding.pop() + self.stack_padding.pop()
-                self.stack_item_sizes.append(accum_size)
-                self.stack_padding.append(accum_padding)
-            else:
-                location, word_size = found_vars[-1].loc, found_vars[-1].size_w
-                self.push_stack(f"{word_size} [rbp - {location}]")
-
-                if term.var.negative:
-                    self.output.append(f"    neg {word_size}[rbp - {self.stack_size - self.stack_item_sizes[-1]}]\n")
-        elif isinstance(term.var, NodeTermBool):
-            assert term.var.bool.value is not None, "shouldn't be None here"
-            self.push_stack(term.var.bool.value, "BYTE")
-        elif isinstance(term.var, NodeTermChar):
-            assert term.var.char.value is not None, "shouldn't be None here"
-            self.push_stack(term.var.char.value, "BYTE")
-        elif isinstance(term.var, NodeTermStr):
-            assert term.var.string.value is not None, "shouldn't be None here"
-            self.make_str(term.var)
+            var_ctx = self.variables[term.var.slot]
+            ra = self.alloc_reg()
+            self.emit("mov", self.get_reg(ra, term.value_size), self.local(var_ctx.loc, term.value_size))
+            if term.var.negative:
+                self.emit("neg", self.get_reg(ra, term.value_size))
         elif isinstance(term.var, NodeTermParen):
-            self.gen_expression(term.var.expr)
+            ra = self.gen_expression(self.inside_parens(term.var.expr))
             if term.var.negative:
-                ra = self.get_reg(0)
-                self.pop_stack(ra)
-                self.output.append(f"    neg {ra}\n")
-                self.push_stack(ra)
-        elif isinstance(term.var, NodeTermNot):
-            self.gen_term(term.var.term) # type: ignore (type checking freaking out)
-            ra = self.get_reg(0)
-            rb = self.get_reg(1)
-            self.pop_stack(rb)
-            self.output.append(
-                f"    xor {ra}, {ra}\n"
-                f"    test {rb}, {rb}\n"
-                "    sete al\n"
-            )
-            self.push_stack(ra)
-        elif isinstance(term.var, NodeTermBNot):
-            self.gen_term(term.var.term) # type: ignore (type checking freaking out)
-            ra = self.get_reg(0)
-            self.pop_stack(ra)
-            self.output.append(f"    not {ra}\n")
-            self.push_stack(ra)
-        elif isinstance(term.var, NodeTermCast):
-            self.output.append("    ;--- typecast ---\n")
-            self.gen_expression(term.var.expr)
-            if self.stack_item_sizes[-1] not in (1, 2, 4, 8):
-                if term.var.type.type == tt.BOOL_DEF:
-                    ra = "eax"
+                self.emit("neg", self.get_reg(ra, term.value_size))
+        elif isinstance(term.var, (NodeTermNot, NodeTermBNot)):
+            # a long chain of nots is walked in a loop and applied innermost first
+            nots: list[NodeTerm] = []
+            while isinstance(term.var, (NodeTermNot, NodeTermBNot)) and term.index is None:
+                nots.append(term)
+                term = term.var.term # type: ignore (type checking freaking out)
+            ra = self.gen_term(term)
+            for not_term in reversed(nots):
+                if isinstance(not_term.var, NodeTermNot):
+                    rb = self.get_reg(ra, not_term.var.term.value_size)
+                    self.emit("test", rb, rb)
+                    self.emit("sete", self.get_reg(ra, 1))
                 else:
+                    self.emit("not", self.get_reg(ra, not_term.value_size))
+        elif isinstance(term.var, NodeTermCast):
+            self.output.append(Comment(";--- typecast ---"))
+            if term.var.expr.value_type == tt.STR_DEF:
+                if term.var.type.type != tt.BOOL_DEF:
                     raise NotImplementedError(f"{term.var.type.type} casting has not been implemented yet")
+                assert isinstance(term.var.expr.var, NodeTerm), "strings have no binary operations"
+                self.gen_str(term.var.expr.var)
+                ra = self.alloc_reg()
+                self.emit("mov", self.get_reg(ra, 4), self.local(self.stack_size, 4)) # the length of the string
+                self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop()
             else:
-                ra = self.get_reg(0)
-            
-            ra_sized = self.reg_lookup_table[
-                self.get_type_size[term.var.type.type]
-            ][0]
-            
-            self.output.append(f"    xor {ra_sized}, {ra_sized}\n")
-            self.pop_stack(ra)
-            self.push_stack(ra_sized)
+                ra = self.gen_expression(term.var.expr)
+                if term.value_size > term.var.expr.value_size: # zero extends the rest
+                    self.emit("movzx", self.get_reg(ra, term.value_size), self.get_reg(ra, term.var.expr.value_size))
         else:
             raise ValueError("Unreachable")
+        return ra
+
+    def gen_rhs_first(self, bin_expr: NodeBinExpr) -> tuple[Operand | None, int | None, bool]:
+        """
+        generates the right side of a binary expression if it has to be done before the left side,
+        the side that needs more registers goes first,
+        if there's not enough registers for both sides the right side waits on the stack and is read from there,
+        returns the operand of the right side or None if it's generated after the left side,
+        the register of the right side and if it was spilled, which are given back with free_operands()
+        """
+        rhs_size = bin_expr.rhs.value_size
+        rhs: Operand | None = self.operand(bin_expr.rhs)
+        if rhs is not None:
+            return rhs, None, False
+        elif self.bin_reg_need(bin_expr) <= len(self.free_regs):
+            if self.reg_need(bin_expr.lhs) >= self.reg_need(bin_expr.rhs):
+                return None, None, False
+            rb = self.gen_expression(bin_expr.rhs)
+            return self.get_reg(rb, rhs_size), rb, False
+        rb = self.gen_expression(bin_expr.rhs)
+        self.push_stack(self.get_reg(rb, rhs_size))
+        self.free_reg(rb)
+        return self.local(self.stack_size, rhs_size), None, True # the left side leaves the stack as it was
+
+    def gen_operands(self, bin_expr: NodeBinExpr) -> tuple[int, Operand, int | None, bool]:
+        """
+        generates both sides of a binary expression,
+        returns the register of the left side, the operand of the right side,
+        the register of the right side and if it was spilled, which are given back with free_operands()
+        """
+        rhs, rb, spilled = self.gen_rhs_first(bin_expr)
+        ra = self.gen_expression(bin_expr.lhs)
+        if rhs is None:
+            rb = self.gen_expression(bin_expr.rhs)
+            rhs = self.get_reg(rb, bin_expr.rhs.value_size)
+        return ra, rhs, rb, spilled
+
+    def free_operands(self, rb: int | None, spilled: bool) -> None:
+        if rb is not None:
+            self.free_reg(rb)
+        if spilled:
+            self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop()
 
-    def gen_binary_expression(self, bin_expr: NodeBinExpr) -> None:
+    def gen_cmp(self, bin_expr: NodeBinExpr, ra: int, rhs: Operand) -> None:
         """
-        generates a binary expression that gets pushed on top of the stack
+        compares the left side in the register with the right side,
+        an int compared to a char sign extends the char first
+        """
+        size, rhs_size = bin_expr.lhs.value_size, bin_expr.rhs.value_size
+        rd = self.get_reg(ra, size)
+        if size != rhs_size:
+            if size == 1:
+                self.emit("movsx", self.get_reg(ra, rhs_size), rd)
+                rd = self.get_reg(ra, rhs_size)
+            elif isinstance(rhs, Imm):
+                rhs = Imm(rhs.value - 256 if rhs.value > 127 else rhs.value)
+            else:
+                self.emit("movsx", Reg(RCX, 4), rhs)
+                rhs = Reg(RCX, 4)
+        self.emit("cmp", rd, rhs)
+
+    def gen_mul_const(self, ra: int, factor: int) -> None:
+        """
+        multiplies the int in the register by a literal,
+        a power of two times 1, 3, 5 or 9 is a lea and a shift, anything else is left for imul
+        """
+        rd = self.get_reg(ra, 4)
+        if factor == 0:
+            self.emit("xor", rd, rd)
+            return
+        magnitude = abs(factor)
+        shift = (magnitude & -magnitude).bit_length() - 1 # the amount of trailing zeros
+        odd = magnitude >> shift
+        if odd in (1, 3, 5, 9):
+            if odd != 1:
+                self.emit("lea", rd, Mem(self.get_reg(ra, 8), index=self.get_reg(ra, 8), scale=odd - 1))
+            if shift:
+                self.emit("sal", rd, Imm(shift))
+            if factor < 0:
+                self.emit("neg", rd)
+        else:
+            self.emit("imul", rd, rd, Imm(factor))
+
+    def gen_div_const(self, ra: int, divisor: int, remainder: bool) -> None:
+        """
+        divides the int in the register by a literal, keeps the remainder instead if remainder is set,
+        both round towards zero like idiv, a power of two is shifted and anything else is multiplied by its magic number
+        """
+        assert is_reducible_divisor(divisor), "only called on divisors that don't need idiv"
+        rd = self.get_reg(ra, 4)
+        magnitude = abs(divisor) # n % -d is the same as n % d
+        if magnitude == 1:
+            if remainder:
+                self.emit("xor", rd, rd)
+            return
+        if magnitude & (magnitude - 1) == 0:
+            shift = magnitude.bit_length() - 1
+            # a negative n gets magnitude - 1 added so the shift rounds it towards zero
+            self.emit("mov", Reg(RCX, 4), rd)
+            if shift > 1:
+                self.emit("sar", Reg(RCX, 4), Imm(31))
+            self.emit("shr", Reg(RCX, 4), Imm(32 - shift))
+            if remainder:
+                self.emit("add", Reg(RCX, 4), rd)
+                self.emit("and", Reg(RCX, 4), Imm(-magnitude))
+                self.emit("sub", rd, Reg(RCX, 4))
+            else:
+                self.emit("add", rd, Reg(RCX, 4))
+                self.emit("sar", rd, Imm(shift))
+                if divisor < 0:
+                    self.emit("neg", rd)
+            return
+
+        multiplier, shift = magic_number(magnitude)
+        self.emit("movsxd", Reg(RAX, 8), rd)
+        if multiplier < 1 << 31:
+            self.emit("imul", Reg(RAX, 8), Reg(RAX, 8), Imm(multiplier))
+        else: # the multiplier doesn't fit into a signed 32 bit immediate
+            self.emit("mov", Reg(RCX, 8), Imm(multiplier))
+            self.emit("imul", Reg(RAX, 8), Reg(RCX, 8))
+        self.emit("sar", Reg(RAX, 8), Imm(shift))
+        self.emit("mov", Reg(RCX, 4), rd)
+        self.emit("shr", Reg(RCX, 4), Imm(31))
+        self.emit("add", Reg(RAX, 4), Reg(RCX, 4)) # rounds a negative n towards zero
+        if remainder:
+            self.emit("imul", Reg(RAX, 4), Reg(RAX, 4), Imm(magnitude))
+            self.emit("sub", rd, Reg(RAX, 4))
+        else:
+            if divisor < 0:
+                self.emit("neg", Reg(RAX, 4))
+            self.emit("mov", rd, Reg(RAX, 4))
+
+    def gen_binary_expression(self, bin_expr: NodeBinExpr) -> int:
+        """
+        generates a binary expression, returns the index of the register it ends up in,
+        the left sides of a chain like a + b + c are walked in a loop instead of recursing into each one,
+        so are the parentheses around them
         """
         assert bin_expr is not None, "Should never trigger since its checked before calling"
-        
-        self.gen_expression(bin_expr.rhs)
-        self.gen_expression(bin_expr.lhs)
-        ra = self.get_reg(0) #NOTE: could cause problems with overwriting results
-        rb = self.get_reg(1)
-        rc_eq_rb = self.get_reg(2)
-        self.pop_stack(ra)
-        self.pop_stack(rb)
-
-        if bin_expr.op.type == tt.PLUS:
-            self.output.append(f"    add {ra}, {rb}\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.STAR:
-            self.output.append(f"    mul {rb}\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.MINUS:
-            self.output.append(f"    sub {ra}, {rb}\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.SLASH:
-            self.output.append(f"    idiv {rb}\n") #! NOTE: idiv is used because div only works with unsigned numbers
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.PERCENT:
-            self.output.append(
-                "    xor rdx, rdx\n"
-                "    cqo\n" # sign extends so the modulus result can be negative
-                f"    idiv {rb}\n"
-            )
+        if bin_expr.op.type in (tt.AND, tt.OR):
+            return self.gen_logical(bin_expr)
+        chain: list[tuple[NodeBinExpr, Operand | None, int | None, bool]] = []
+        while True:
+            chain.append((bin_expr, *self.gen_rhs_first(bin_expr)))
+            lhs = self.inside_parens(bin_expr.lhs)
+            if not isinstance(lhs.var, NodeBinExpr) or lhs.var.op.type in (tt.AND, tt.OR) or id(lhs) in self.hoisted:
+                break
+            bin_expr = lhs.var
+        ra = self.gen_expression(lhs)
+        for bin_expr, rhs, rb, spilled in reversed(chain): # innermost first, like the recursion would
+            if rhs is None:
+                rb = self.gen_expression(bin_expr.rhs)
+                rhs = self.get_reg(rb, bin_expr.rhs.value_size)
+            self.gen_operation(bin_expr, ra, rhs)
+            self.free_operands(rb, spilled)
+        return ra
+
+    def gen_operation(self, bin_expr: NodeBinExpr, ra: int, rhs: Operand) -> None:
+        """
+        applies the operator of the binary expression to the left side in the register and the right side
+        """
+        op = bin_expr.op.type
+        rd = self.get_reg(ra, bin_expr.lhs.value_size)
+
+        if op == tt.PLUS:
+            self.emit("add", rd, rhs)
+        elif op == tt.STAR:
+            if isinstance(rhs, Imm) and self.optimize:
+                self.gen_mul_const(ra, wrap_int(rhs.value))
+            elif isinstance(rhs, Imm):
+                self.emit("imul", rd, rd, rhs)
+            else:
+                self.emit("imul", rd, rhs)
+        elif op == tt.MINUS:
+            self.emit("sub", rd, rhs)
+        elif op in (tt.SLASH, tt.PERCENT) and isinstance(rhs, Imm) and self.optimize \
+                and is_reducible_divisor(wrap_int(rhs.value)):
+            self.gen_div_const(ra, wrap_int(rhs.value), op == tt.PERCENT)
+        elif op in (tt.SLASH, tt.PERCENT):
+            if isinstance(rhs, Imm): # idiv can't divide by an immediate
+                self.emit("mov", Reg(RCX, 4), rhs)
+                rhs = Reg(RCX, 4)
+            self.emit("mov", Reg(RAX, 4), rd)
+            self.emit("cdq") # sign extends eax into edx, idiv divides edx:eax
+            self.emit("idiv", rhs) #! NOTE: idiv is used because div only works with unsigned numbers
+            # idiv leaves the quotient in eax and the remainder in edx
+            self.emit("mov", rd, Reg(RAX if op == tt.SLASH else RDX, 4))
             #TODO: make division be generic for any size
-            self.push_stack("edx") # assembly stores the modulus in rdx after the standard division instruction
-        elif bin_expr.op.type == tt.BOR:
-            self.output.append(f"    or {ra}, {rb}\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.BAND:
-            self.output.append(f"    and {ra}, {rb}\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.XOR:
-            self.output.append(f"    xor {ra}, {rb}\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.SHIFT_LEFT:
+        elif op == tt.BOR:
+            self.emit("or", rd, rhs)
+        elif op == tt.BAND:
+            self.emit("and", rd, rhs)
+        elif op == tt.XOR:
+            self.emit("xor", rd, rhs)
+        elif op in (tt.SHIFT_LEFT, tt.SHIFT_RIGHT):
             #NOTE: using arithmetic shifts because theres only signed numbers for now
-            self.output.append(f"    mov {rc_eq_rb}, {rb}\n")
-            self.output.append(f"    sal {ra}, cl\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type == tt.SHIFT_RIGHT:
-            self.output.append(f"    mov {rc_eq_rb}, {rb}\n")
-            self.output.append(f"    sar {ra}, cl\n")
-            self.push_stack(ra)
-        elif bin_expr.op.type in COMPARISONS:
-            self.output.append(f"    cmp {ra}, {rb}\n")
-            if bin_expr.op.type == tt.IS_EQUAL:
-                self.output.append("    sete al\n")
-            elif bin_expr.op.type == tt.IS_NOT_EQUAL:
-                self.output.append("    setne al\n")
-            elif bin_expr.op.type == tt.LARGER_THAN:
-                self.output.append("    setg al\n")
-            elif bin_expr.op.type == tt.LESS_THAN:
-                self.output.append("    setl al\n")
-            elif bin_expr.op.type == tt.LARGER_THAN_OR_EQ:
-                self.output.append("    setge al\n")
-            elif bin_expr.op.type == tt.LESS_THAN_OR_EQ:
-                self.output.append("    setle al\n")
+            instr = "sal" if op == tt.SHIFT_LEFT else "sar"
+            if isinstance(rhs, Imm):
+                self.emit(instr, rd, Imm(rhs.value & 31)) # the cpu only uses the lowest 5 bits anyway
             else:
-                raise TypeError(f"Unreachable {bin_expr.op.type}")
-            self.push_stack("al")
-        elif bin_expr.op.type in (OR, AND):
-            rc = "cl"
-            self.output.append(
-                f"    mov {rc}, {ra}\n"
-                f"    test {rb}, {rb}\n"
-            )
+                self.emit("mov", Reg(RCX, 4), rhs)
+                self.emit(instr, rd, Reg(RCX, 1))
+        elif op in COMPARISONS:
+            self.gen_cmp(bin_expr, ra, rhs)
+            self.emit(f"set{CONDITION_CODES[op]}", self.get_reg(ra, 1))
+        else:
+            raise ValueError(f"Unreachable {op}")
 
-            label = self.create_label()
-            if bin_expr.op.type == tt.AND:
-                self.output.append(
-                    f"    jnz {label}\n"
-                    f"    mov {rc}, {rb}\n"
-                )
-            elif bin_expr.op.type == tt.OR:
-                self.output.append(
-                    f"    jz {label}\n"
-                    f"    mov {rc}, {rb}\n"
-                )
-            else:
-                raise ValueError(f"Unreachable {bin_expr.op.type}")
-            
-            self.output.append(
-                f"{label}:\n"
-                f"    test {rc}, {rc}\n"
-                "    setne al\n"
-            )
-            self.push_stack("al")
+    def gen_logical(self, bin_expr: NodeBinExpr) -> int:
+        """
+        generates `aj` or `abo` into a 0 or 1, returns the index of the register it ends up in,
+        the result starts as what the left side alone can decide and the right side is skipped once it does
+        """
+        is_and = bin_expr.op.type == tt.AND
+        ra = self.alloc_reg()
+        end_label = self.create_label()
+        rd = self.get_reg(ra, 4)
+        if is_and:
+            self.emit("xor", rd, rd)
+        else:
+            self.emit("mov", rd, Imm(1))
+        # a false side of `aj` or a true side of `abo` decides it
+        self.gen_branch(bin_expr.lhs, end_label, not is_and)
+        self.gen_branch(bin_expr.rhs, end_label, not is_and)
+        if is_and:
+            self.emit("mov", rd, Imm(1))
         else:
-            raise ValueError(f"Unreachable {bin_expr.op.type}")
+            self.emit("xor", rd, rd)
+        self.output.append(Label(end_label))
+        return ra
 
-    def gen_expression(self, expression: NodeExpr) -> None:
+    def gen_expression(self, expression: NodeExpr) -> int:
         """
-        generates an expression and pushes it on top of the stack
+        generates an expression into a register, returns the index of the register,
+        the register has to be given back with free_reg() once the value is used
         """
-        if isinstance(expression.var, NodeTerm):
-            self.gen_term(expression.var)
+        if (reg := self.hoisted.get(id(expression))) is not None: # the register is kept for the rest of the loop
+            ra = self.alloc_reg()
+            self.emit("mov", self.get_reg(ra, reg.size), reg)
+            return ra
+        elif isinstance(expression.var, NodeTerm):
+            return self.gen_term(expression.var)
         elif isinstance(expression.var, NodeBinExpr):
-            self.gen_binary_expression(expression.var)
+            return self.gen_binary_expression(expression.var)
         else:
             raise ValueError("Unreachable")
 
+    def push_expression(self, expression: NodeExpr) -> None:
+        """
+        generates an expression and pushes it on top of the stack
+        """
+        if expression.value_type == tt.STR_DEF:
+            assert isinstance(expression.var, NodeTerm), "strings have no binary operations"
+            self.gen_str(expression.var)
+        elif isinstance(src := self.operand(expression), (Imm, Reg)):
+            self.push_stack(src, expression.value_size)
+        else:
+            ra = self.gen_expression(expression)
+            self.push_stack(self.get_reg(ra, expression.value_size))
+            self.free_reg(ra)
+
+    def gen_condition(self, expression: NodeExpr, false_label: str) -> None:
+        """
+        generates an expression and jumps to the label if it's false (zero)
+        """
+        self.gen_branch(expression, false_label, False)
+
+    def gen_branch(self, expression: NodeExpr, label: str, jump_if: bool) -> None:
+        """
+        jumps to the label if the expression is true when jump_if is set or false when it isn't,
+        a comparison is only used by the jump and `aj` / `abo` jump as soon as one side decides them,
+        so no bool is made unless the condition is a plain value,
+        the sides are walked with a work stack so long `aj` / `abo` chains don't hit the recursion limit
+        """
+        work: list[tuple[NodeExpr, str, bool] | Label] = [(expression, label, jump_if)]
+        while work:
+            item = work.pop()
+            if isinstance(item, Label):
+                self.output.append(item)
+                continue
+            expression, label, jump_if = item
+            var = expression.var
+            if id(expression) in self.hoisted:
+                reg = self.hoisted[id(expression)]
+                self.emit("test", reg, reg)
+                self.emit("jnz" if jump_if else "jz", Sym(label))
+            elif isinstance(var, NodeBinExpr) and var.op.type in COMPARISONS:
+                self.gen_compare_branch(var, label, jump_if)
+            elif isinstance(var, NodeBinExpr) and var.op.type in (tt.AND, tt.OR):
+                if (var.op.type == tt.AND) != jump_if:
+                    # a false side of `aj` or a true side of `abo` is enough to jump
+                    work.append((var.rhs, label, jump_if))
+                    work.append((var.lhs, label, jump_if))
+                else:
+                    # the left side alone can only decide to not jump
+                    skip_label = self.create_label()
+                    work.append(Label(skip_label))
+                    work.append((var.rhs, label, jump_if))
+                    work.append((var.lhs, skip_label, not jump_if))
+            elif isinstance(var, NodeTerm) and var.index is None and isinstance(var.var, NodeTermNot):
+                work.append((NodeExpr(var.var.term), label, not jump_if))
+            elif isinstance(var, NodeTerm) and var.index is None and isinstance(var.var, NodeTermParen) \
+                    and not var.var.negative:
+                work.append((var.var.expr, label, jump_if))
+            elif isinstance(src := self.operand(expression), Imm):
+                if bool(src.value) == jump_if: # the folder made the condition a constant
+                    self.emit("jmp", Sym(label))
+            elif isinstance(src, Mem):
+                self.emit("cmp", src, Imm(0))
+                self.emit("jne" if jump_if else "je", Sym(label))
+            else:
+                ra = self.gen_expression(expression)
+                reg = self.get_reg(ra, expression.value_size)
+                self.emit("test", reg, reg)
+                self.emit("jnz" if jump_if else "jz", Sym(label))
+                self.free_reg(ra)
+
+    def gen_compare_branch(self, bin_expr: NodeBinExpr, label: str, jump_if: bool) -> None:
+        """
+        compares the sides of the comparison and jumps on its condition code,
+        sides of the same size that are already operands are compared right away
+        """
+        cc = CONDITION_CODES[bin_expr.op.type]
+        lhs, rhs = self.operand(bin_expr.lhs), self.operand(bin_expr.rhs)
+        same_size = bin_expr.lhs.value_size == bin_expr.rhs.value_size
+        if same_size and isinstance(lhs, (Mem, Reg)) and rhs is not None \
+                and not (isinstance(lhs, Mem) and isinstance(rhs, Mem)): # there's no memory to memory cmp
+            self.emit("cmp", lhs, rhs)
+        elif same_size and isinstance(lhs, Imm) and isinstance(rhs, (Mem, Reg)):
+            self.emit("cmp", rhs, lhs)
+            cc = SWAPPED_CONDITIONS[cc]
+        else:
+            ra, rhs_operand, rb, spilled = self.gen_operands(bin_expr)
+            self.gen_cmp(bin_expr, ra, rhs_operand)
+            self.free_reg(ra)
+            self.free_operands(rb, spilled)
+        self.emit(f"j{cc if jump_if else INVERTED_CONDITIONS[cc]}", Sym(label))
+
     def gen_scope(self, scope: NodeScope) -> None:
         """
         generates all of the statements in a given scope
@@ -521,6 +1156,7 @@ class Generator(ErrorHandler):
         self.begin_scope()
         for stmt in scope.stmts:
             self.gen_statement(stmt)
+        self.flush_prints()
         self.end_scope()
 
     def gen_if_predicate(self, pred: NodeIfPred, end_label: str) -> None:
@@ -528,120 +1164,120 @@ class Generator(ErrorHandler):
         generates the following statements connected to the if statement if there are any
         """
         if isinstance(pred.var, NodeIfPredElif):
-            self.output.append("    ;; --- elif ---\n")
-            self.gen_expression(pred.var.expr)
+            self.output.append(Comment(";; --- elif ---"))
             label = self.create_label()
-
-            first_reg = self.get_reg(0)
-            self.pop_stack(first_reg)
-            self.output.append(f"    test {first_reg}, {first_reg}\n")
-            
-            self.output.append(f"    jz {label}\n")
+            self.gen_condition(pred.var.expr, label)
             self.gen_scope(pred.var.scope)
-            self.output.append(
-                f"    jmp {end_label}\n"
-                f"{label}:\n"
-            )
+            self.emit("jmp", Sym(end_label))
+            self.output.append(Label(label))
             if pred.var.pred is not None:
                 self.gen_if_predicate(pred.var.pred, end_label)
         elif isinstance(pred.var, NodeIfPredElse):
-            self.output.append("    ;; --- else ---\n")
+            self.output.append(Comment(";; --- else ---"))
             self.gen_scope(pred.var.scope)
         else:
             raise ValueError("Unreachable")
 
     def add_variable(self, decl_stmt: NodeStmtDeclare, word_size: size_words, byte_size: size_bytes):
         """
-        adds a VariableContext into the self.variables list
+        adds a VariableContext into the self.variables list,
+        an inlined or unused variable gets the location -1 since it's never on the stack
         """
-        location: int = self.stack_size
+        location: int = self.stack_size if not (decl_stmt.inlined or decl_stmt.unused) else -1
         assert decl_stmt.ident.value is not None, "var name shouldn't be None here"
+        assert decl_stmt.slot == len(self.variables), "the variable slots are out of sync with the Binder"
         self.variables.append(VariableContext(decl_stmt.ident.value, location, word_size, byte_size))
 
     def gen_decl(self, decl_stmt: NodeStmtDeclare):
         """
         generates a variable declaration
         """
-        found_vars: tuple[VariableContext, ...] = tuple(
-            filter(
-                lambda x: x.name == decl_stmt.ident.value, 
-                self.variables[self.scopes[-1]::]
-            )
-        )
-        if found_vars:
-            self.compiler_error("Value", f"variable has been already declared in this scope: {decl_stmt.ident.value}", decl_stmt.ident)
-
-        if decl_stmt.type_.type == tt.INT_DEF:
-            self.output.append("    ;; --- int var declaration ---\n")
-            self.gen_expression(decl_stmt.expr)
+        if decl_stmt.inlined or decl_stmt.unused:
+            # only keeps the slot, every use of the variable was replaced with its value by the Folder or removed
+            self.add_variable(decl_stmt, "", TYPE_SIZES[decl_stmt.type_.type])
+        elif decl_stmt.type_.type == tt.INT_DEF:
+            self.output.append(Comment(";; --- int var declaration ---"))
+            self.push_expression(decl_stmt.expr)
             self.add_variable(decl_stmt, "DWORD", 4)
         elif decl_stmt.type_.type == tt.BOOL_DEF:
-            self.output.append("    ;; --- bul var declaration ---\n")
-            self.gen_expression(decl_stmt.expr)
+            self.output.append(Comment(";; --- bul var declaration ---"))
+            self.push_expression(decl_stmt.expr)
             self.add_variable(decl_stmt, "BYTE", 1)
         elif decl_stmt.type_.type == tt.CHAR_DEF:
-            self.output.append("    ;; --- char var declaration ---\n")
-            self.gen_expression(decl_stmt.expr)
+            self.output.append(Comment(";; --- char var declaration ---"))
+            self.push_expression(decl_stmt.expr)
             self.add_variable(decl_stmt, "BYTE", 1)
         elif decl_stmt.type_.type == tt.STR_DEF:
-            self.output.append("    ;; --- string var declaration ---\n")
-            self.gen_expression(decl_stmt.expr)
+            self.output.append(Comment(";; --- string var declaration ---"))
+            assert isinstance(decl_stmt.expr.var, NodeTerm), "strings have no binary operations"
+            self.gen_str(decl_stmt.expr.var, decl_stmt.slot)
             self.add_variable(decl_stmt, "STR", self.stack_item_sizes[-1])
+            self.variables[-1].length = self.str_lengths.get(decl_stmt.slot)
         else:
             raise ValueError("Unreachable")
-        
+
+    def gen_store_index(self, ident: NodeTerm) -> int:
+        """
+        generates the index of the byte of the string variable that gets assigned and checks its bounds,
+        returns the index of the register it's in
+        """
+        assert isinstance(ident.var, NodeTermIdent) and ident.index is not None, "only called on indexed variables"
+        LEN_SIZE = 4
+        rb = self.gen_expression(ident.index) # the offset
+        if self.needs_bounds_check(ident, (ident.index,)):
+            var_ctx = self.variables[ident.var.slot]
+            self.add_bounds_check(ident, self.get_reg(rb, 4), self.local(var_ctx.loc, LEN_SIZE), "ae")
+        return rb
+
+    def store_byte(self, var_ctx: VariableContext, rb: int, src: Operand) -> None:
+        """
+        stores the byte into the string variable at the index in the register
+        """
+        LEN_SIZE = 4
+        ITEM_SIZE_B = 1
+        self.emit("mov", Reg(RAX, 8), self.local(var_ctx.loc - LEN_SIZE, 8))
+        self.emit("mov", Mem(Reg(RAX, 8), index=self.get_reg(rb, 8), scale=ITEM_SIZE_B, size=ITEM_SIZE_B), src)
+
     def gen_reassign(self, reassign_stmt: NodeStmtReassign):
         """
         generates a var reassignment, increment and decrement
         """
         assert isinstance(reassign_stmt.var.ident.var, NodeTermIdent)
-        found_vars: tuple[VariableContext, ...] = tuple(filter(lambda x: x.name == reassign_stmt.var.ident.var.ident.value, self.variables)) # type: ignore
-        
+        var_ctx = self.variables[reassign_stmt.var.ident.var.slot]
+
         if isinstance(reassign_stmt.var, NodeStmtReassignEq):
-            self.output.append("    ;; --- var reassign ---\n")
-            var_ctx = found_vars[-1]
+            self.output.append(Comment(";; --- var reassign ---"))
 
             if reassign_stmt.var.ident.index is not None:
-                LEN_SIZE = 4
-                ITEM_SIZE_B = 1
-                self.gen_expression(reassign_stmt.var.ident.index)
-                rb = "rbx"
-                self.output.append(f"    xor rbx, rbx\n")
-                self.pop_stack("ebx") # saves the offset
-
-                offset = f"{rb} * {ITEM_SIZE_B}"
-                location = var_ctx.loc - LEN_SIZE
-                self.output.append(f"    mov rcx, [rbp - {location}]\n")
-                self.gen_expression(reassign_stmt.var.rvalue)
-                ra = self.get_reg(0)
-                self.pop_stack(ra)
-                self.output.append(f"    mov [rcx + {offset}], {ra}\n")
+                rb = self.gen_store_index(reassign_stmt.var.ident)
+                src = self.operand(reassign_stmt.var.rvalue)
+                ra: int | None = None
+                if not isinstance(src, (Imm, Reg)):
+                    ra = self.gen_expression(reassign_stmt.var.rvalue)
+                    src = self.get_reg(ra, reassign_stmt.var.rvalue.value_size)
+                self.store_byte(var_ctx, rb, src)
+                if ra is not None:
+                    self.free_reg(ra)
+                self.free_reg(rb)
+            elif reassign_stmt.var.rvalue.value_type == tt.STR_DEF:
+                assert isinstance(reassign_stmt.var.rvalue.var, NodeTerm), "strings have no binary operations"
+                self.gen_str(reassign_stmt.var.rvalue.var, reassign_stmt.var.ident.var.slot)
+                var_ctx.length = self.str_lengths.get(reassign_stmt.var.ident.var.slot)
+                self.emit("mov", Reg(RAX, 4), self.local(self.stack_size, 4))
+                self.emit("mov", self.local(var_ctx.loc, 4), Reg(RAX, 4))
+                self.emit("mov", Reg(RAX, 8), self.local(self.stack_size - 4, 8))
+                self.emit("mov", self.local(var_ctx.loc - 4, 8), Reg(RAX, 8))
+                self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop()
+            elif isinstance(src := self.operand(reassign_stmt.var.rvalue), (Imm, Reg)):
+                self.emit("mov", self.local(var_ctx.loc, var_ctx.size_b), src)
             else:
-                self.gen_expression(reassign_stmt.var.rvalue)
-                if self.stack_item_sizes[-1] not in (1,2,4,8):
-                    self.output.append(
-                        f"    mov eax, [rbp - {self.stack_size}]\n"
-                        f"    mov [rbp - {var_ctx.loc}], eax\n"
-                        f"    mov rax, [rbp - {self.stack_size - 4}]\n"
-                        f"    mov [rbp - {var_ctx.loc - 4}], rax\n"
-                    )
-                    self.stack_size -= self.stack_item_sizes.pop()
-                else:
-                    ra = self.get_reg(0)
-                    self.pop_stack(ra)
-                    self.output.append(f"    mov [rbp - {var_ctx.loc}], {ra}\n")
+                ra = self.gen_expression(reassign_stmt.var.rvalue)
+                self.emit("mov", self.local(var_ctx.loc, var_ctx.size_b), self.get_reg(ra, reassign_stmt.var.rvalue.value_size))
+                self.free_reg(ra)
         elif isinstance(reassign_stmt.var, (NodeStmtReassignInc, NodeStmtReassignDec)):
-            self.output.append("    ;; --- var inc / dec ---\n")
-            var_ctx = found_vars[-1]
-            location, size_words = var_ctx.loc, var_ctx.size_w
-            self.push_stack(f"{size_words} [rbp - {location}]") # QWORD 64 bits (word = 16 bits)
-            ra = self.get_reg(0)
-            self.pop_stack(ra)
-            inc_or_dec = f"    inc {ra}\n" if isinstance(reassign_stmt.var, NodeStmtReassignInc) else f"    dec {ra}\n"
-            self.output.append(
-                inc_or_dec +
-                f"    mov [rbp - {location}], {ra}\n"
-            )
+            self.output.append(Comment(";; --- var inc / dec ---"))
+            inc_or_dec = "inc" if isinstance(reassign_stmt.var, NodeStmtReassignInc) else "dec"
+            self.emit(inc_or_dec, self.local(var_ctx.loc, var_ctx.size_b))
         else:
             raise ValueError("Unreachable")
 
@@ -649,149 +1285,321 @@ class Generator(ErrorHandler):
         """
         generates an exit syscall
         """
-        self.output.append("    ;; --- exit ---\n")
-        self.gen_expression(exit_stmt.expr)
-        rdi = self.get_reg(5) # rdi / di is 5th register
-        self.pop_stack(rdi)
+        self.output.append(Comment(";; --- exit ---"))
+        rdi = self.get_reg(RDI, exit_stmt.expr.value_size)
+        if (src := self.operand(exit_stmt.expr)) is not None:
+            self.emit("mov", rdi, src)
+        else:
+            ra = self.gen_expression(exit_stmt.expr)
+            if ra != RDI:
+                self.emit("mov", rdi, self.get_reg(ra, exit_stmt.expr.value_size))
+            self.free_reg(ra)
         self.call_func("exit")
 
     def gen_if_statement(self, if_stmt: NodeStmtIf) -> None:
-        self.output.append("    ;; --- if block ---\n")
-        self.gen_expression(if_stmt.expr)
+        if self.optimize and (table := dispatch_table(if_stmt)) is not None:
+            self.gen_dispatch(table)
+            return
+        self.output.append(Comment(";; --- if block ---"))
         label = self.create_label()
-        
-        first_reg = self.get_reg(0)
-        self.pop_stack(first_reg)
-        self.output.append(f"    test {first_reg}, {first_reg}\n")
-
-        self.output.append(f"    jz {label}\n")
+        self.gen_condition(if_stmt.expr, label)
         self.gen_scope(if_stmt.scope)
-        
+
         if if_stmt.ifpred is not None:
             end_label = self.create_label()
-            self.output.append(
-                f"    jmp {end_label}\n"
-                f"{label}:\n"
-            )
+            self.emit("jmp", Sym(end_label))
+            self.output.append(Label(label))
             self.gen_if_predicate(if_stmt.ifpred, end_label)
-            self.output.append(f"{end_label}:\n")
+            self.output.append(Label(end_label))
         else:
-            self.output.append(f"{label}:\n")
+            self.output.append(Label(label))
+
+    def load_table(self, ra: int, entries: list[int], size: size_bytes) -> None:
+        """
+        replaces the index in the register with its entry of a table in the read only data, the same tables are only added once
+        """
+        data = b"".join((entry & (1 << 8 * size) - 1).to_bytes(size, "little") for entry in entries)
+        src = Mem(Sym(self.str_label(data)), index=self.get_reg(ra, 8), scale=size, size=size)
+        self.emit("mov" if size == 4 else "movzx", self.get_reg(ra, 4), src)
+
+    def gen_dispatch_key(self, table: DispatchTable, entries: list[int], size: size_bytes) -> int:
+        """
+        looks up the codes of the variables of the table and adds them up into the key,
+        returns the index of the register that the entry of the key is read into,
+        the entries are the numbers of the branches the keys pick or what those branches assign
+        """
+        rk = self.alloc_reg()
+        for i, (slot, var_size, offset, codes) in enumerate(zip(table.slots, table.sizes, table.offsets, table.codes)):
+            ra = RAX if i else rk
+            var_ctx = self.variables[slot]
+            if var_size == 1:
+                self.emit("movzx", self.get_reg(ra, 4), self.local(var_ctx.loc, 1))
+            else: # an int outside of the table reads the 0 code at its end
+                self.emit("mov", self.get_reg(ra, 4), self.local(var_ctx.loc, 4))
+                if offset:
+                    self.emit("sub", self.get_reg(ra, 4), Imm(offset))
+                self.emit("mov", Reg(RDX, 4), Imm(len(codes) - 1))
+                self.emit("cmp", self.get_reg(ra, 4), Reg(RDX, 4))
+                self.emit("cmova", self.get_reg(ra, 4), Reg(RDX, 4))
+            self.load_table(ra, codes, table.code_size)
+            if i:
+                self.emit("add", self.get_reg(rk, 4), self.get_reg(ra, 4))
+        self.load_table(rk, entries, size)
+        return rk
+
+    def gen_dispatch(self, table: DispatchTable) -> None:
+        """
+        generates an `ikec` chain that only compares variables with literals by looking up the branch it runs,
+        a chain whose every branch assigns a literal to the same variable looks up the value instead,
+        the rest jump to their branch through a table of its labels
+        """
+        end_label = self.create_label()
+        lookup = lookup_values(table)
+        if lookup is not None and self.bounds_checks and (index := lookup[0].ident.index) is not None \
+                and not self.in_bounds(lookup[0].ident, (index,)):
+            lookup = None # a failed bounds check has to point to the branch that ran
+        if lookup is not None:
+            self.output.append(Comment(";; --- if block as a lookup table ---"))
+            store, values = lookup
+            assert isinstance(store.ident.var, NodeTermIdent), "only variables get assigned"
+            var_ctx = self.variables[store.ident.var.slot]
+            size = var_ctx.size_b if store.ident.index is None else 1 # a string gets a byte assigned
+            if table.default is None: # nothing gets assigned when no branch runs
+                rk = self.gen_dispatch_key(table, table.keys, 1)
+                self.emit("test", self.get_reg(rk, 4), self.get_reg(rk, 4))
+                self.emit("jz", Sym(end_label))
+                self.load_table(rk, values, size)
+            else: # every key has a value to assign
+                rk = self.gen_dispatch_key(table, [values[arm] for arm in table.keys], size)
+            if store.ident.index is not None:
+                rb = self.gen_store_index(store.ident)
+                self.store_byte(var_ctx, rb, self.get_reg(rk, size))
+                self.free_reg(rb)
+            else:
+                self.emit("mov", self.local(var_ctx.loc, var_ctx.size_b), self.get_reg(rk, size))
+            self.free_reg(rk)
+            if table.default is None:
+                self.output.append(Label(end_label))
+            return
+
+        self.output.append(Comment(";; --- if block as a jump table ---"))
+        rk = self.gen_dispatch_key(table, table.keys, 1)
+        labels = [self.create_label() for _ in table.scopes]
+        default_label = self.create_label() if table.default is not None else end_label
+        self.data_count += 1
+        jumps = f"jumps{self.data_count}"
+        #NOTE: the labels of the statements belong to _start, outside of it they need its name in front
+        self.section_rodata.append(Raw(f"{jumps} dq {", ".join(f"_start{label}" for label in [default_label, *labels])}\n"))
+        self.emit("jmp", Mem(Sym(jumps), index=self.get_reg(rk, 8), scale=8, size=8))
+        self.free_reg(rk)
+        for label, scope in zip(labels, table.scopes):
+            self.output.append(Label(label))
+            self.gen_scope(scope)
+            self.emit("jmp", Sym(end_label))
+        if table.default is not None:
+            self.output.append(Label(default_label))
+            self.gen_scope(table.default)
+        self.output.append(Label(end_label))
+
+    def hoist_invariants(self, exprs: list[NodeExpr], stmts: list[NodeStmt]) -> list[int]:
+        """
+        computes the invariant parts of a loop made of the expressions and the statements before it starts,
+        each one is kept in its own register while the loop runs and used instead of the expression,
+        a part is only hoisted while enough registers are left for the loop itself,
+        returns the ids of the hoisted expressions for release_invariants()
+        """
+        if not self.optimize:
+            return []
+        ids: list[int] = []
+        invariants = LoopInvariants(assigned_slots(stmts), self.hoisted)
+        for expr in invariants.find_all(exprs, stmts):
+            if len(self.free_regs) <= self.min_free_regs or not set(self.free_regs) & set(self.hoist_registers):
+                break
+            if not ids:
+                self.output.append(Comment(";; --- loop invariants ---"))
+            idx = next(idx for idx in reversed(self.free_regs) if idx in self.hoist_registers)
+            self.free_regs.remove(idx)
+            self.free_regs.append(idx) # the expression usually ends up in the register it takes first
+            ra = self.gen_expression(expr)
+            if ra not in self.hoist_registers:
+                idx = next(idx for idx in self.free_regs if idx in self.hoist_registers)
+                self.free_regs.remove(idx)
+                self.emit("mov", self.get_reg(idx, expr.value_size), self.get_reg(ra, expr.value_size))
+                self.free_reg(ra)
+                ra = idx
+            self.hoisted[id(expr)] = self.get_reg(ra, expr.value_size)
+            ids.append(id(expr))
+        return ids
+
+    def release_invariants(self, ids: list[int]) -> None:
+        for expr_id in ids:
+            self.free_reg(self.hoisted.pop(expr_id).idx)
+
+    def begin_report(self, token: Token) -> None:
+        """
+        starts counting the bounds checks of the loop, the loop is reported at the line of the token
+        """
+        if self.bounds_checks:
+            self.open_reports.append(BoundsReport(token.line))
+
+    def end_report(self) -> None:
+        if self.bounds_checks:
+            self.bounds_reports.append(self.open_reports.pop())
 
     def gen_while(self, while_stmt: NodeStmtWhile) -> None:
-        self.output.append("    ;; --- while loop ---\n")
+        """
+        generates a while loop with its condition at the bottom, the loop is entered by jumping to the condition
+        """
+        self.output.append(Comment(";; --- while loop ---"))
         end_label = self.create_label()
-        reset_label = self.create_label()
+        body_label = self.create_label()
+        test_label = self.create_label()
         self.loop_end_labels.append(end_label)
+        self.begin_report(expression_token(while_stmt.expr))
+        hoisted = self.hoist_invariants([while_stmt.expr], while_stmt.scope.stmts)
 
-        self.output.append(f"{reset_label}:\n")
-
-        self.gen_expression(while_stmt.expr)
-        first_reg = self.get_reg(0)
-        self.pop_stack(first_reg)
-        self.output.append(
-            f"    test {first_reg}, {first_reg}\n"
-            f"    jz {end_label}\n"
-        )
+        self.emit("jmp", Sym(test_label))
+        self.output.append(Label(body_label))
 
         self.gen_scope(while_stmt.scope)
-        
-        self.output.append(
-            f"    jmp {reset_label}\n"
-            f"{end_label}:\n"
-        )
+
+        self.output.append(Label(test_label))
+        self.gen_branch(while_stmt.expr, body_label, True)
+        self.output.append(Label(end_label))
+        self.release_invariants(hoisted)
+        self.end_report()
         self.loop_end_labels.pop()
 
     def gen_do_while(self, do_while_stmt: NodeStmtDoWhile) -> None:
-        self.output.append("    ;; --- do while loop ---\n")
+        self.output.append(Comment(";; --- do while loop ---"))
         end_label = self.create_label()
-        reset_label = self.create_label()
+        body_label = self.create_label()
         self.loop_end_labels.append(end_label)
+        self.begin_report(expression_token(do_while_stmt.expr))
+        hoisted = self.hoist_invariants([do_while_stmt.expr], do_while_stmt.scope.stmts)
 
-        self.output.append(f"{reset_label}:\n")
+        self.output.append(Label(body_label))
 
         self.gen_scope(do_while_stmt.scope)
 
-        self.gen_expression(do_while_stmt.expr)
-        
-        first_reg = self.get_reg(0)
-        self.pop_stack(first_reg)
-        self.output.append(
-            f"    test {first_reg}, {first_reg}\n"
-            f"    jz {end_label}\n"
-        )
-
-        self.output.append(
-            f"    jmp {reset_label}\n"
-            f"{end_label}:\n"
-        )
+        self.gen_branch(do_while_stmt.expr, body_label, True)
+        self.output.append(Label(end_label))
+        self.release_invariants(hoisted)
+        self.end_report()
         self.loop_end_labels.pop()
 
     def gen_for(self, for_stmt: NodeStmtFor) -> None:
-        self.output.append("    ;; --- for loop ---\n")
+        """
+        generates a for loop with its condition at the bottom, the loop is entered by jumping to the condition
+        """
+        self.output.append(Comment(";; --- for loop ---"))
         end_label = self.create_label("end")
-        reset_label = self.create_label("rst")
+        body_label = self.create_label("body")
+        test_label = self.create_label("test")
         self.loop_end_labels.append(end_label)
 
         self.gen_decl(for_stmt.ident_def)
+        self.begin_report(for_stmt.ident_def.ident)
+        loop_stmts = [*for_stmt.scope.stmts, NodeStmt(for_stmt.ident_assign)]
+        hoisted = self.hoist_invariants([for_stmt.condition], loop_stmts)
 
-        self.output.append(f"{reset_label}:\n")
-
-        self.gen_expression(for_stmt.condition)
-
-        first_reg = self.get_reg(0)
-        self.pop_stack(first_reg)
-        self.output.append(
-            f"    test {first_reg}, {first_reg}\n"
-            f"    jz {end_label}\n"
-        )
+        self.emit("jmp", Sym(test_label))
+        self.output.append(Label(body_label))
 
+        # the range only holds in the body, the condition also sees the value that ends the loop
+        slot = for_stmt.ident_def.slot
+        if self.bounds_checks and (counter_range := induction_range(for_stmt, self.index_ranges)) is not None:
+            self.index_ranges[slot] = counter_range
         self.gen_scope(for_stmt.scope)
-        
+        self.index_ranges.pop(slot, None)
+
         self.gen_reassign(for_stmt.ident_assign)
 
-        self.output.append(
-            f"    jmp {reset_label}\n"
-            f"{end_label}:\n"
-        )
-        self.stack_size -= self.stack_item_sizes.pop() # does this to remove the variable after the i loop ends
+        self.output.append(Label(test_label))
+        self.gen_branch(for_stmt.condition, body_label, True)
+        self.output.append(Label(end_label))
+        self.release_invariants(hoisted)
+        self.end_report()
+        self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop() # does this to remove the variable after the i loop ends
         self.variables.pop()
         self.loop_end_labels.pop()
 
+    def constant_print(self, stmt: NodeStmt) -> bytes | None:
+        """
+        returns the bytes the statement prints if it's a print of a literal, None if it's something else
+        """
+        if not self.optimize or not isinstance(stmt.stmt_var, NodeStmtPrint):
+            return None
+        content = stmt.stmt_var.content.var
+        if not isinstance(content, NodeTerm) or content.index is not None:
+            return None
+        elif isinstance(content.var, NodeTermChar):
+            assert content.var.char.value is not None, "char literals always have a value"
+            return bytes([int(content.var.char.value)])
+        elif isinstance(content.var, NodeTermStr):
+            return content.var.data
+        return None
+
+    def flush_prints(self) -> None:
+        """
+        generates the constant prints that were put off, a single char is printed straight from a register,
+        more bytes are put into the read only data and printed from there
+        """
+        if not self.pending_print:
+            return
+        data, self.pending_print = bytes(self.pending_print), bytearray()
+        if len(data) == 1:
+            self.output.append(Comment(";; --- print char ---"))
+            self.emit("mov", Reg(RSI, 4), Imm(data[0]))
+            self.call_func("print_char")
+        else:
+            self.output.append(Comment(";; --- print str ---"))
+            self.emit("mov", Reg(RSI, 8), Sym(self.str_label(data)))
+            self.emit("mov", Reg(RDX, 4), Imm(len(data)))
+            self.call_func("print_str")
+        self.use_func("flush_out")
+
     def gen_print(self, print_stmt: NodeStmtPrint) -> None:
         """
-        generates a print syscall and cleaning up the stack
+        generates a print, the bytes are copied into the output buffer,
+        a char is passed in sil and a string by its pointer in rsi and its length in rdx
         """
         if print_stmt.cont_type == CHAR_DEF:
-            self.output.append("    ;; --- print char ---\n")
-            self.gen_expression(print_stmt.content)
-
-            self.output.append(f"    lea rsi, [rbp - {self.stack_size}]\n")
+            self.output.append(Comment(";; --- print char ---"))
+            src = self.operand(print_stmt.content)
+            if isinstance(src, Imm):
+                self.emit("mov", Reg(RSI, 4), src)
+            elif src is not None:
+                self.emit("mov", Reg(RSI, 1), src)
+            else:
+                ra = self.gen_expression(print_stmt.content)
+                self.emit("mov", Reg(RSI, 1), self.get_reg(ra, 1))
+                self.free_reg(ra)
             self.call_func("print_char")
-            # it removes the printed expression because it causes a mess in the stack when looping
-            self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop()
+        elif print_stmt.cont_type == STR_DEF and (literal := self.string_literal(print_stmt.content)) is not None:
+            self.output.append(Comment(";; --- print str ---"))
+            self.emit("mov", Reg(RSI, 8), Sym(self.str_label(literal.data if literal.data else b"\0")))
+            self.emit("mov", Reg(RDX, 4), Imm(literal.length))
+            self.call_func("print_str")
         elif print_stmt.cont_type == STR_DEF:
-            self.output.append("    ;; --- print str ---\n")
-            self.gen_expression(print_stmt.content)
+            self.output.append(Comment(";; --- print str ---"))
+            self.push_expression(print_stmt.content)
             LEN_SIZE = 4
-            self.output.append(
-                f"    mov rsi, [rbp - {self.stack_size - LEN_SIZE}]\n"
-                f"    mov edx, [rbp - {self.stack_size}]\n"
-            )
+            self.emit("mov", Reg(RSI, 8), self.local(self.stack_size - LEN_SIZE, 8))
+            self.emit("mov", Reg(RDX, 4), self.local(self.stack_size, 4))
 
             self.call_func("print_str")
             # it removes the printed expression because it causes a mess in the stack when looping
             self.stack_size -= self.stack_item_sizes.pop() + self.stack_padding.pop()
+        self.use_func("flush_out")
 
     def gen_break(self, break_stmt: NodeStmtBreak) -> None:
         """
         adds a jump to the end of the loop if it exists, if not in a loop throws a compiler error
         """
         if self.loop_end_labels:
-            self.output.append(
-                "    ;; --- break --- \n"
-                f"    jmp {self.loop_end_labels[-1]}\n"
-            )
+            self.output.append(Comment(";; --- break --- "))
+            self.emit("jmp", Sym(self.loop_end_labels[-1]))
         else:
             self.compiler_error("Syntax", "cant break out of a loop when not inside one", break_stmt.break_tkn)
 
@@ -800,31 +1608,77 @@ class Generator(ErrorHandler):
         generates a statement based on the node passed in
         """
         gen_func: Callable | None = self.map_generate_func.get(statement.stmt_var.__class__)
-        
+        self.reg_needs.clear()
+        top_level = not self.scopes
+        start = len(self.output)
+        if top_level: # the statements in it are all known now
+            var = statement.stmt_var
+            self.first_local = var.slot + 1 if isinstance(var, NodeStmtDeclare) else len(self.variables)
+            self.mutable_strs = mutable_string_slots([statement], self.first_local)
+            if self.bounds_checks:
+                self.str_lengths = string_lengths([statement], self.known_length)
+
+        if (data := self.constant_print(statement)) is not None:
+            self.pending_print += data
+            return
+        elif not isinstance(statement.stmt_var, NodeStmtEmpty):
+            self.flush_prints()
+
         if gen_func is not None: #can be None for NodeStmtEmpty
             gen_func(statement.stmt_var)
         elif isinstance(statement.stmt_var, NodeStmtEmpty):
             pass
         else:
-            raise ValueError("Unreachable") 
+            raise ValueError("Unreachable")
+        if top_level:
+            self.reserve_frame(start)
+
+    def gen_prologue(self) -> None:
+        self.output.append(Raw("format ELF64 executable 3\nsegment readable executable\nentry _start\n"))
+        self.output.append(Label("_start"))
+        self.emit("mov", Reg(RBP, 8), Reg(RSP, 8))
+
+    def gen_epilogue(self) -> list[AsmLine]:
+        """
+        finishes the assembly after the last statement,
+        returns the lines of the assembly, they're turned into text with str()
+        """
+        start = len(self.output)
+        self.flush_prints()
+        self.output.append(Comment(";; --- default exit ---"))
+        if "flush_out" in self.functions:
+            self.emit("call", Sym("flush_out"))
+        self.emit("mov", Reg(RAX, 8), Imm(60))
+        self.emit("mov", Reg(RDI, 8), Imm(0))
+        self.emit("syscall")
+        self.reserve_frame(start)
+        #NOTE: the failed bounds checks are jumped to from any statement, so rsp can be above its variables,
+        # bounds_error never returns so it doesn't matter what it pushes over
+        for label, token, stack_size in self.bounds_failures:
+            message = f"IndexError: (line {token.line} column {token.col}) index out of range\n".encode()
+            self.output.append(Label(label))
+            self.emit("mov", Reg(RSI, 8), Sym(self.str_label(message)))
+            self.emit("mov", Reg(RDX, 4), Imm(len(message)))
+            self.stack_size = stack_size
+            self.call_func("bounds_error")
+        self.add_funcs()
+        if self.section_rodata:
+            self.output.append(Raw("segment readable\n"))
+            self.output.extend(self.section_rodata)
+        if self.section_data:
+            self.output.append(Raw("segment readable writeable\n"))
+            self.output.extend(self.section_data)
+        return self.output
 
     def gen_program(self) -> list[str]:
         """
         generates the whole assembly based on the nodes that are given,
         returns a list of strings that contains the assembly instructions
         """
-        self.output.append(
-            "format ELF64 executable 3\nsegment readable executable\nentry _start\n"
-            "_start:\n    mov rbp, rsp\n"
-        )
+        self.gen_prologue()
 
         for stmt in self.main_program.stmts:
             assert stmt is not None, "None statement shouldn't make it here"
             self.gen_statement(stmt)
 
-        self.output.append("    ;; --- default exit ---\n    mov rax, 60\n    mov rdi, 0\n    syscall\n" )
-        self.add_funcs()
-        if self.section_data:
-            self.output.append("segment readable writeable\n")
-            self.output.extend(self.section_data)
-        return self.output
+        return list(map(str, self.gen_epilogue()))
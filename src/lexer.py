@@ -1,24 +1,55 @@
+import re
 import tokentypes as tt
-from errors import ErrorHandler
-from comptypes import Token
+from errors import ErrorHandler, CompilerError
+from collections.abc import Iterator
+from comptypes import TokenTable, TokenStream
+
+
+TWO_CHAR_SYMBOLS: tuple[str, ...] = tuple(filter(lambda x: len(x) == 2, tt.SYMBOLS))
+ONE_CHAR_SYMBOLS: tuple[str, ...] = tuple(filter(lambda x: len(x) == 1, tt.SYMBOLS))
+
+# one alternative per lexeme class, the order of the alternatives mirrors the order of checks in Tokenizer.tokenize(),
+# spaces in front of a lexeme are skipped as a part of its match
+MASTER_PATTERN = re.compile(
+    r" *(?:(?P<word>[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<hex>0x[0-9a-fA-F]*)"
+    r"|(?P<number>[0-9]+)"
+    r"|(?P<char>')"
+    r'|(?P<string>")'
+    r"|(?P<line_comment>//[^\n]*)"
+    r"|(?P<block_comment>/\*)"
+    rf"|(?P<symbol>{"|".join(map(re.escape, TWO_CHAR_SYMBOLS))}|[{re.escape("".join(ONE_CHAR_SYMBOLS))}])"
+    r"|(?P<invalid>.)|(?P<end>\Z))",
+    re.DOTALL
+)
+STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+ESCAPE_SEQ = re.compile(r"\\(.)", re.DOTALL)
+
+NEWLINE_KIND = tt.KIND[tt.NEWLINE]
+
+ESCAPES: dict[str, int] = {
+    "n": 10, # ascii code for newline
+    "t": 9,
+    "0": 0,
+}
 
 class Tokenizer(ErrorHandler):
     curr_char: str | None = None
-    tokens: list[Token] = []
     index: int = -1
     
     def __init__(self, file_content: str) -> None:
         super().__init__(file_content)
+        self.tokens: TokenTable = TokenTable()
         self.advance() # sets the current char
 
-    def search_for_keyword(self, potential_keyword: str) -> Token:
+    def search_for_keyword(self, potential_keyword: str) -> None:
         """
-        sees if a keyword is in the tokens list, otherwise makes an identifier
+        sees if a keyword is in the tokens list and adds it, otherwise adds an identifier
         """
         if potential_keyword in tt.KEYWORD_TO_TOKEN_TYPE:
-            return Token(type=tt.KEYWORD_TO_TOKEN_TYPE[potential_keyword], value=None, line=self.line_number, col=self.column_number - len(potential_keyword))
+            self.tokens.add(tt.KEYWORD_TO_TOKEN_TYPE[potential_keyword], self.line_number, self.column_number - len(potential_keyword))
         else:
-            return Token(type=tt.IDENT, value=potential_keyword, line=self.line_number, col=self.column_number)
+            self.tokens.add(tt.IDENT, self.line_number, self.column_number, potential_keyword)
     
     @staticmethod
     def is_valid_keyword(char: str) -> bool:
@@ -56,7 +87,7 @@ class Tokenizer(ErrorHandler):
             buffer += self.curr_char
             self.advance()
         type_of_number = tt.INT_LIT
-        self.tokens.append(Token(type=type_of_number, value=buffer, line=self.line_number, col=self.column_number - 1))
+        self.tokens.add(type_of_number, self.line_number, self.column_number - 1, buffer)
     
     def lex_hex(self):
         self.advance()
@@ -74,7 +105,7 @@ class Tokenizer(ErrorHandler):
         
         type_of_number = tt.INT_LIT
         buffer = str(int(buffer, base=16))
-        self.tokens.append(Token(type=type_of_number, value=buffer, line=self.line_number, col=self.column_number - 1))
+        self.tokens.add(type_of_number, self.line_number, self.column_number - 1, buffer)
 
     def lex_keyword(self):
         """
@@ -86,7 +117,7 @@ class Tokenizer(ErrorHandler):
         while self.curr_char is not None and self.is_valid_keyword(self.curr_char):
             buffer += self.curr_char
             self.advance()
-        self.tokens.append(self.search_for_keyword(buffer))
+        self.search_for_keyword(buffer)
     
     def escape_char(self) -> int:
         """
@@ -95,15 +126,7 @@ class Tokenizer(ErrorHandler):
         if self.curr_char is None:
             self.compiler_error("Syntax", "expected a character after \\ escape", (self.line_number, self.column_number))
         assert self.curr_char is not None, "char shouldn't be None here"
-        if self.curr_char == "n":
-            ascii_value = 10 # ascii code for newline
-        elif self.curr_char == "t":
-            ascii_value = 9
-        elif self.curr_char == "0":
-            ascii_value = 0
-        else:
-            ascii_value = ord(self.curr_char)
-        return ascii_value
+        return ESCAPES.get(self.curr_char, ord(self.curr_char))
 
     def lex_char(self):
         """
@@ -120,7 +143,7 @@ class Tokenizer(ErrorHandler):
         else:
             self.compiler_error("Syntax", "unclosed `'` started here", (self.line_number, self.column_number))
         
-        self.tokens.append(Token(type=tt.CHAR_LIT, value=ascii_value, line=self.line_number, col=self.column_number)) # type: ignore (never unbound since else catches it)
+        self.tokens.add(tt.CHAR_LIT, self.line_number, self.column_number, ascii_value) # type: ignore (never unbound since else catches it)
         
         self.advance()
         if self.curr_char is None or self.curr_char != "'":
@@ -133,60 +156,210 @@ class Tokenizer(ErrorHandler):
         """
         start_str = (self.line_number, self.column_number)
         self.advance()
-        string: list[str] = []
+        string = bytearray()
         while self.curr_char != '"':
             if self.curr_char == "\\":
                 self.advance()
-                string.append(str(self.escape_char()))
+                string += chr(self.escape_char()).encode()
             elif self.curr_char is not None:
-                string.append(str(ord(self.curr_char)))
+                string += self.curr_char.encode()
             else:
                 self.compiler_error("Syntax", 'unclosed `"` started here', start_str)
             self.advance()
         
-        self.tokens.append(Token(type=tt.STR_LIT, value=",".join(string), line=self.line_number, col=self.column_number))
+        self.tokens.add(tt.STR_LIT, self.line_number, self.column_number, bytes(string))
         self.advance()
 
-    def tokenize(self):
+    def tokenize(self) -> TokenTable:
         while self.curr_char is not None:
-            if self.curr_char.isalpha() or self.curr_char == "_":
-                self.lex_keyword()
-            elif self.curr_char == '0' and self.look_ahead() is not None and self.look_ahead() == 'x':
-                self.lex_hex()
-            elif self.curr_char.isnumeric():
-                self.lex_number()
-            elif self.curr_char == "'":
-                self.lex_char()
-            elif self.curr_char == '"':
-                self.lex_string()
-            elif self.curr_char == "/" and self.look_ahead() == "/":
-                self.advance()
-                while self.curr_char not in ("\n", None):
-                    self.advance()
-            elif self.curr_char == "/" and self.look_ahead() == "*":
-                comment_start = (self.line_number, self.column_number)
-                self.advance()
-                self.advance()
-                while self.curr_char not in ("*", None) or self.look_ahead() not in ("/", None):
+            lexeme_start = (self.index, self.line_number, self.column_number)
+            try:
+                self.lex_next()
+            except CompilerError as error:
+                self.recover(error)
+                # carries on from the end of the line the broken lexeme started on,
+                # an unclosed comment takes up the rest of the file
+                self.index, self.line_number, self.column_number = lexeme_start
+                self.curr_char = self.file_content[self.index]
+                is_comment = self.curr_char == "/" and self.look_ahead() == "*"
+                while self.curr_char is not None and (is_comment or self.curr_char != "\n"):
                     self.advance()
+        return self.tokens
+
+    def lex_next(self):
+        """
+        makes the token starting at the current char
+        """
+        if self.curr_char.isalpha() or self.curr_char == "_":
+            self.lex_keyword()
+        elif self.curr_char == '0' and self.look_ahead() is not None and self.look_ahead() == 'x':
+            self.lex_hex()
+        elif self.curr_char.isnumeric():
+            self.lex_number()
+        elif self.curr_char == "'":
+            self.lex_char()
+        elif self.curr_char == '"':
+            self.lex_string()
+        elif self.curr_char == "/" and self.look_ahead() == "/":
+            self.advance()
+            while self.curr_char not in ("\n", None):
                 self.advance()
+        elif self.curr_char == "/" and self.look_ahead() == "*":
+            comment_start = (self.line_number, self.column_number)
+            self.advance()
+            self.advance()
+            while self.curr_char not in ("*", None) or self.look_ahead() not in ("/", None):
                 self.advance()
-                if self.curr_char is None:
-                    self.compiler_error("Syntax", "unclosed multiline comment", comment_start)
-            elif self.curr_char == " ":
-                self.advance()
-            elif self.look_ahead() is not None and self.curr_char + self.look_ahead() in tt.SYMBOLS: # type: ignore
-                self.tokens.append(Token(type=self.curr_char + self.look_ahead(),  # type: ignore
-                                        line=self.line_number, col=self.column_number))
-                self.advance()
+            self.advance()
+            self.advance()
+            if self.curr_char is None:
+                self.compiler_error("Syntax", "unclosed multiline comment", comment_start)
+        elif self.curr_char == " ":
+            self.advance()
+        elif self.look_ahead() is not None and self.curr_char + self.look_ahead() in tt.SYMBOLS: # type: ignore
+            self.tokens.add(self.curr_char + self.look_ahead(), self.line_number, self.column_number) # type: ignore
+            self.advance()
+            self.advance()
+        elif self.curr_char in tt.SYMBOLS:
+            if self.curr_char == "\n" and self.tokens.kind_at(-1) == NEWLINE_KIND:
                 self.advance()
-            elif self.curr_char in tt.SYMBOLS:
-                if self.curr_char == "\n" and self.tokens and self.tokens[-1].type == tt.NEWLINE:
-                    self.advance()
-                else:
-                    self.tokens.append(Token(type=self.curr_char, 
-                                            line=self.line_number, col=self.column_number))
-                    self.advance()
             else:
-                self.compiler_error("Syntax", "character not included in the language grammar", (self.line_number, self.column_number))
+                self.tokens.add(self.curr_char, self.line_number, self.column_number)
+                self.advance()
+        else:
+            self.compiler_error("Syntax", "character not included in the language grammar", (self.line_number, self.column_number))
+
+    def position(self, idx: int) -> tuple[int, int]:
+        """
+        returns the line and column of the char at idx the same way advance() would count them,
+        only used for error reporting in the scanner
+        """
+        line = self.file_content.count("\n", 0, idx) + 1
+        last_newline = self.file_content.rfind("\n", 0, idx)
+        return line, idx - last_newline - 1 if last_newline != -1 else idx + 1
+
+    def scan(self) -> TokenTable:
+        """
+        tokenizes the file by matching whole lexemes with the master pattern instead of walking it char by char,
+        produces the same tokens as tokenize(), falls back to it for non ascii files 
+        since the char classes of the pattern only cover ascii
+        """
+        for _ in self.scan_lines():
+            pass
         return self.tokens
+
+    def stream(self) -> TokenStream:
+        """
+        returns the tokens as a TokenStream that lexes the file line by line as the tokens are read
+        """
+        return TokenStream(self.tokens, self.scan_lines())
+
+    def scan_lines(self) -> Iterator[None]:
+        """
+        the scanning of scan(), yields every time the tokens of a line were added,
+        a non ascii file is tokenized all at once
+        """
+        src = self.file_content
+        if not src.isascii():
+            self.tokenize()
+            yield
+            return
+
+        tokens = self.tokens
+        keywords = tt.KEYWORD_TO_TOKEN_TYPE
+        match_lexeme = MASTER_PATTERN.match
+        src_len = len(src)
+        
+        line = 1
+        last_newline = -2 # the first line starts at column 1 unlike the rest, see advance()
+        pos = 0
+        while pos < src_len:
+            m = match_lexeme(src, pos)
+            assert m is not None, "the invalid group matches any char and the end group matches trailing spaces"
+            kind = m.lastgroup
+            pos = m.end()
+            start = m.start(kind)
+            col = start - last_newline - 1
+
+            try:
+                if kind == "word":
+                    word = src[start:pos]
+                    if word in keywords:
+                        tokens.add(keywords[word], line, col)
+                    else:
+                        tokens.add(tt.IDENT, line, col + pos - start, word)
+                elif kind == "symbol":
+                    symbol = src[start:pos]
+                    if symbol == "\n":
+                        if tokens.kind_at(-1) != NEWLINE_KIND:
+                            tokens.add(tt.NEWLINE, line, col)
+                        line += 1
+                        last_newline = start
+                        yield
+                    else:
+                        tokens.add(symbol, line, col)
+                elif kind == "line_comment" or kind == "end":
+                    continue
+                elif kind == "number":
+                    tokens.add(tt.INT_LIT, line, col + pos - start - 1, src[start:pos])
+                elif kind == "hex":
+                    if pos - start == 2:
+                        self.compiler_error("Syntax", "invalid hexadecimal", (line, col + 2))
+                    tokens.add(tt.INT_LIT, line, col + pos - start - 1, str(int(src[start + 2:pos], base=16)))
+                elif kind == "char":
+                    if pos >= src_len:
+                        self.compiler_error("Syntax", "unclosed `'` started here", self.position(pos))
+                    elif src[pos] == "\\":
+                        pos += 1
+                        if pos >= src_len:
+                            self.compiler_error("Syntax", "expected a character after \\ escape", self.position(pos))
+                        ascii_value = ESCAPES.get(src[pos], ord(src[pos]))
+                    elif src[pos] == "'":
+                        self.compiler_error("Syntax", "empty char literal is not supported", self.position(pos))
+                    else:
+                        ascii_value = ord(src[pos])
+                    tokens.add(tt.CHAR_LIT, line, pos - last_newline - 1, str(ascii_value)) # type: ignore (never unbound)
+                    
+                    if pos + 1 >= src_len or src[pos + 1] != "'":
+                        self.compiler_error("Syntax", "expected `'`", self.position(pos + 1))
+                    if src[pos] == "\n": # a raw newline inside of the literal
+                        line += 1
+                        last_newline = pos
+                    pos += 2
+                elif kind == "string":
+                    body = STRING_BODY.match(src, pos)
+                    assert body is not None, "the string body pattern can match an empty string"
+                    end = body.end()
+                    if end >= src_len:
+                        self.compiler_error("Syntax", 'unclosed `"` started here', (line, col))
+                    elif src[end] != '"': # a lone backslash right before the end of the file
+                        self.compiler_error("Syntax", "expected a character after \\ escape", self.position(src_len))
+                    
+                    content = body.group()
+                    if "\\" in content:
+                        string = ESCAPE_SEQ.sub(lambda x: chr(ESCAPES.get(x[1], ord(x[1]))), content).encode()
+                    else:
+                        string = content.encode()
+                    
+                    if (newlines := content.count("\n")) != 0:
+                        line += newlines
+                        last_newline = content.rfind("\n") + pos
+                    tokens.add(tt.STR_LIT, line, end - last_newline - 1, string)
+                    pos = end + 1
+                elif kind == "block_comment":
+                    end = src.find("*/", pos)
+                    if end == -1 or end + 2 >= src_len:
+                        self.compiler_error("Syntax", "unclosed multiline comment", (line, col))
+                    if (newlines := src.count("\n", pos, end)) != 0:
+                        line += newlines
+                        last_newline = src.rfind("\n", pos, end)
+                    pos = end + 2
+                else:
+                    self.compiler_error("Syntax", "character not included in the language grammar", (line, col))
+            except CompilerError as error:
+                self.recover(error)
+                # carries on from the end of the line the broken lexeme started on,
+                # an unclosed comment takes up the rest of the file
+                pos = src.find("\n", start) if kind != "block_comment" else -1
+                if pos == -1:
+                    pos = src_len
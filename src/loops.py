@@ -0,0 +1,440 @@
+from collections.abc import Callable, Container, Iterator
+from comptypes import *
+from folder import INT_BITS
+import tokentypes as tt
+
+
+INT_MIN, INT_MAX = -(1 << INT_BITS - 1), (1 << INT_BITS - 1) - 1
+
+# the length of a variable whose assignments weren't looked at yet
+UNSET = -1
+
+
+def loop_statements(stmts: list[NodeStmt]) -> Iterator[NodeStmt]:
+    """
+    yields the statements and every statement nested in them
+    """
+    for stmt in stmts:
+        yield stmt
+        var = stmt.stmt_var
+        if isinstance(var, NodeScope):
+            yield from loop_statements(var.stmts)
+        elif isinstance(var, (NodeStmtWhile, NodeStmtDoWhile)):
+            yield from loop_statements(var.scope.stmts)
+        elif isinstance(var, NodeStmtFor):
+            yield NodeStmt(var.ident_def)
+            yield NodeStmt(var.ident_assign)
+            yield from loop_statements(var.scope.stmts)
+        elif isinstance(var, NodeStmtIf):
+            yield from loop_statements(var.scope.stmts)
+            ifpred = var.ifpred
+            while ifpred is not None:
+                yield from loop_statements(ifpred.var.scope.stmts)
+                ifpred = ifpred.var.pred if isinstance(ifpred.var, NodeIfPredElif) else None
+
+def statement_expressions(stmt: NodeStmt) -> Iterator[NodeExpr]:
+    """
+    yields the expressions of the statement itself, not the ones of the statements nested in it
+    """
+    var = stmt.stmt_var
+    if isinstance(var, NodeStmtDeclare):
+        yield var.expr
+    elif isinstance(var, NodeStmtReassign):
+        if var.var.ident.index is not None:
+            yield var.var.ident.index
+        if isinstance(var.var, NodeStmtReassignEq):
+            yield var.var.rvalue
+    elif isinstance(var, NodeStmtExit):
+        yield var.expr
+    elif isinstance(var, NodeStmtPrint):
+        yield var.content
+    elif isinstance(var, (NodeStmtWhile, NodeStmtDoWhile)):
+        yield var.expr
+    elif isinstance(var, NodeStmtFor):
+        yield var.condition
+    elif isinstance(var, NodeStmtIf):
+        yield var.expr
+        ifpred = var.ifpred
+        while ifpred is not None and isinstance(ifpred.var, NodeIfPredElif):
+            yield ifpred.var.expr
+            ifpred = ifpred.var.pred
+
+def may_trap(bin_expr: NodeBinExpr) -> bool:
+    """
+    checks if the operation can end the program, dividing by 0 and -1 can trap so only other literal divisors are safe
+    """
+    if bin_expr.op.type not in (tt.SLASH, tt.PERCENT):
+        return False
+    divisor = bin_expr.rhs.var
+    if not (isinstance(divisor, NodeTerm) and isinstance(divisor.var, NodeTermInt) and divisor.index is None):
+        return True
+    assert divisor.var.int_lit.value is not None, "int literals always have a value"
+    value = int(divisor.var.int_lit.value)
+    return value == 0 or value == 1 and divisor.var.negative
+
+def assigned_slots(stmts: list[NodeStmt]) -> set[int]:
+    """
+    returns the slots of the variables that the statements declare or assign to
+    """
+    slots: set[int] = set()
+    for stmt in loop_statements(stmts):
+        var = stmt.stmt_var
+        if isinstance(var, NodeStmtDeclare):
+            slots.add(var.slot)
+        elif isinstance(var, NodeStmtReassign) and var.var.ident.index is None:
+            assert isinstance(var.var.ident.var, NodeTermIdent), "only variables are assigned to"
+            slots.add(var.var.ident.var.slot)
+    return slots
+
+
+class LoopInvariants:
+    """
+    finds the expressions of a loop that have the same value on every iteration, so they can be computed before it,
+    an expression is invariant if no variable in it is assigned in the loop,
+    indexing never is since the string can be changed through any variable that holds it,
+    strings aren't either and neither is a division that could trap since the loop might not run at all,
+    hoisted are the ids of the expressions that an outer loop already computed
+    """
+    def __init__(self, assigned: set[int], hoisted: Container[int]) -> None:
+        self.assigned = assigned
+        self.hoisted = hoisted
+
+    def is_invariant_term(self, term: NodeTerm) -> bool:
+        var = term.var
+        if term.index is not None or term.value_type == tt.STR_DEF:
+            return False
+        elif isinstance(var, (NodeTermInt, NodeTermBool, NodeTermChar)):
+            return True
+        elif isinstance(var, NodeTermIdent):
+            return var.slot not in self.assigned
+        elif isinstance(var, (NodeTermParen, NodeTermCast)):
+            return self.is_invariant(var.expr)
+        elif isinstance(var, (NodeTermNot, NodeTermBNot)):
+            return self.is_invariant_term(var.term)
+        return False
+
+    def is_invariant(self, expr: NodeExpr) -> bool:
+        if id(expr) in self.hoisted:
+            return True
+        elif isinstance(expr.var, NodeTerm):
+            return self.is_invariant_term(expr.var)
+        bin_expr = expr.var
+        if may_trap(bin_expr):
+            return False
+        return self.is_invariant(bin_expr.lhs) and self.is_invariant(bin_expr.rhs)
+
+    def has_operation(self, expr: NodeExpr) -> bool:
+        """
+        checks if computing the expression takes more than reading a variable or a literal
+        """
+        if isinstance(expr.var, NodeBinExpr):
+            return True
+        var = expr.var.var
+        if isinstance(var, NodeTermIdent):
+            return var.negative
+        elif isinstance(var, NodeTermParen):
+            return var.negative or self.has_operation(var.expr)
+        return isinstance(var, (NodeTermNot, NodeTermBNot, NodeTermCast))
+
+    def find(self, expr: NodeExpr, found: list[NodeExpr]) -> None:
+        """
+        adds the largest invariant parts of the expression that are worth computing once into found
+        """
+        if id(expr) in self.hoisted:
+            return
+        elif self.is_invariant(expr):
+            if self.has_operation(expr):
+                found.append(expr)
+        elif isinstance(expr.var, NodeBinExpr):
+            self.find(expr.var.lhs, found)
+            self.find(expr.var.rhs, found)
+        else:
+            self.find_in_term(expr.var, found)
+
+    def find_in_term(self, term: NodeTerm, found: list[NodeExpr]) -> None:
+        if term.index is not None:
+            self.find(term.index, found)
+        var = term.var
+        if isinstance(var, (NodeTermParen, NodeTermCast)):
+            self.find(var.expr, found)
+        elif isinstance(var, (NodeTermNot, NodeTermBNot)):
+            self.find_in_term(var.term, found)
+        elif isinstance(var, NodeTermSlice):
+            self.find_in_term(var.term, found)
+            self.find(var.start, found)
+            self.find(var.end, found)
+
+    def find_all(self, exprs: list[NodeExpr], stmts: list[NodeStmt]) -> list[NodeExpr]:
+        """
+        returns the invariant parts of the expressions and of every expression in the statements
+        """
+        found: list[NodeExpr] = []
+        for expr in exprs:
+            self.find(expr, found)
+        for stmt in loop_statements(stmts):
+            for expr in statement_expressions(stmt):
+                self.find(expr, found)
+        return found
+
+def string_source(expr: NodeExpr) -> int | None:
+    """
+    returns the slot of the string variable whose bytes the expression points to, None if it's something else
+    """
+    term = expr.var
+    while isinstance(term, NodeTerm) and isinstance(term.var, (NodeTermParen, NodeTermSlice)) and term.index is None:
+        term = term.var.expr.var if isinstance(term.var, NodeTermParen) else term.var.term
+    if isinstance(term, NodeTerm) and isinstance(term.var, NodeTermIdent) and term.index is None \
+            and term.value_type == tt.STR_DEF:
+        return term.var.slot
+    return None
+
+def mutable_string_slots(stmts: list[NodeStmt], first_local: int) -> set[int]:
+    """
+    returns the slots of the string variables declared in the statements whose bytes can be changed through indexing,
+    the variables with a slot below first_local outlive the statements so the statements after them can change them,
+    a string assigned to a variable shares its bytes with it, so a variable is changed if one it was assigned to is
+    """
+    mutable: set[int] = set()
+    copies: list[tuple[int, int]] = [] # the slot that got the string and the slot it was read from
+    for stmt in loop_statements(stmts):
+        var = stmt.stmt_var
+        if isinstance(var, NodeStmtDeclare) and (src := string_source(var.expr)) is not None:
+            copies.append((var.slot, src))
+        elif isinstance(var, NodeStmtReassign):
+            assert isinstance(var.var.ident.var, NodeTermIdent), "only variables are assigned to"
+            if var.var.ident.index is not None:
+                mutable.add(var.var.ident.var.slot)
+            elif isinstance(var.var, NodeStmtReassignEq) and (src := string_source(var.var.rvalue)) is not None:
+                copies.append((var.var.ident.var.slot, src))
+
+    changed = True
+    while changed:
+        changed = False
+        for dest, src in copies:
+            if (dest < first_local or dest in mutable) and src >= first_local and src not in mutable:
+                mutable.add(src)
+                changed = True
+    return {slot for slot in mutable if slot >= first_local}
+
+def expression_token(expr: NodeExpr) -> Token:
+    """
+    returns the first token of the expression, for the location of what it belongs to
+    """
+    while True:
+        while isinstance(expr.var, NodeBinExpr):
+            expr = expr.var.lhs
+        var = expr.var.var
+        if isinstance(var, (NodeTermParen, NodeTermCast)):
+            expr = var.expr
+        elif isinstance(var, (NodeTermNot, NodeTermBNot, NodeTermSlice)):
+            expr = NodeExpr(var.term)
+        else:
+            break
+    if isinstance(var, NodeTermInt):
+        return var.int_lit
+    elif isinstance(var, NodeTermIdent):
+        return var.ident
+    elif isinstance(var, NodeTermBool):
+        return var.bool
+    elif isinstance(var, NodeTermChar):
+        return var.char
+    return var.string
+
+def literal_int(expr: NodeExpr) -> int | None:
+    """
+    returns the value of an int literal, None if the expression is something else
+    """
+    term = expr.var
+    if not isinstance(term, NodeTerm) or term.index is not None or not isinstance(term.var, NodeTermInt):
+        return None
+    assert term.var.int_lit.value is not None, "int literals always have a value"
+    value = int(term.var.int_lit.value)
+    return -value if term.var.negative else value
+
+def unwrap_parens(expr: NodeExpr) -> NodeExpr:
+    """
+    returns the expression inside the parentheses around it
+    """
+    while isinstance(expr.var, NodeTerm) and isinstance(expr.var.var, NodeTermParen) and expr.var.index is None \
+            and not expr.var.var.negative:
+        expr = expr.var.var.expr
+    return expr
+
+def same_value(a: NodeExpr, b: NodeExpr) -> bool:
+    """
+    checks if the two expressions are written the same way out of literals and variables, so they have the same value
+    """
+    a, b = unwrap_parens(a), unwrap_parens(b)
+    if isinstance(a.var, NodeBinExpr) or isinstance(b.var, NodeBinExpr):
+        return isinstance(a.var, NodeBinExpr) and isinstance(b.var, NodeBinExpr) and a.var.op.type == b.var.op.type \
+            and same_value(a.var.lhs, b.var.lhs) and same_value(a.var.rhs, b.var.rhs)
+    x, y = a.var.var, b.var.var
+    if a.var.index is not None or b.var.index is not None:
+        return False
+    elif isinstance(x, NodeTermInt) and isinstance(y, NodeTermInt):
+        return literal_int(a) == literal_int(b)
+    elif isinstance(x, NodeTermIdent) and isinstance(y, NodeTermIdent):
+        return x.slot == y.slot and x.negative == y.negative
+    elif isinstance(x, NodeTermParen) and isinstance(y, NodeTermParen):
+        return x.negative == y.negative and same_value(x.expr, y.expr)
+    return False
+
+def slice_offset(start: NodeExpr, end: NodeExpr) -> int | None:
+    """
+    returns how far the end of a slice is after its start when the end is the start plus a literal, None if it isn't
+    """
+    if same_value(start, end):
+        return 0
+    if isinstance(end.var, NodeBinExpr) and end.var.op.type == tt.PLUS:
+        for lhs, rhs in ((end.var.lhs, end.var.rhs), (end.var.rhs, end.var.lhs)):
+            if same_value(lhs, start) and (offset := literal_int(rhs)) is not None and offset >= 0:
+                return offset
+    return None
+
+def string_length(expr: NodeExpr, lengths: dict[int, int | None], known: Callable[[int], int | None]) -> int | None:
+    """
+    returns the length of the string expression, None if it isn't known and UNSET if it depends on a variable
+    that doesn't have a length yet
+    """
+    term = expr.var
+    assert isinstance(term, NodeTerm), "strings have no binary operations"
+    var = term.var
+    if isinstance(var, NodeTermStr):
+        return var.length
+    elif isinstance(var, NodeTermIdent):
+        return lengths[var.slot] if var.slot in lengths else known(var.slot)
+    elif isinstance(var, NodeTermParen):
+        return string_length(var.expr, lengths, known)
+    elif isinstance(var, NodeTermSlice):
+        start, end = literal_int(var.start), literal_int(var.end)
+        if start is not None and end is not None and 0 <= start <= end:
+            return end - start
+        return slice_offset(var.start, var.end)
+    return None
+
+def string_lengths(stmts: list[NodeStmt], known: Callable[[int], int | None]) -> dict[int, int | None]:
+    """
+    returns the lengths of the string variables that the statements declare or assign to,
+    a variable has a length if every string it's given has the same known length, otherwise its length is None,
+    known returns the length of a variable from before the statements and UNSET for the ones declared in them,
+    so the variables with a length keep it however the statements run
+    """
+    sources: list[tuple[int, NodeExpr]] = []
+    for stmt in loop_statements(stmts):
+        var = stmt.stmt_var
+        if isinstance(var, NodeStmtDeclare) and var.type_.type == tt.STR_DEF:
+            sources.append((var.slot, var.expr))
+        elif isinstance(var, NodeStmtReassign) and isinstance(var.var, NodeStmtReassignEq) \
+                and var.var.ident.index is None and var.var.rvalue.value_type == tt.STR_DEF:
+            assert isinstance(var.var.ident.var, NodeTermIdent), "only variables are assigned to"
+            sources.append((var.var.ident.var.slot, var.var.rvalue))
+
+    lengths: dict[int, int | None] = {}
+    for slot, _ in sources:
+        if (length := known(slot)) != UNSET:
+            lengths[slot] = length
+    changed = True
+    while changed:
+        changed = False
+        for slot, expr in sources:
+            length = string_length(expr, lengths, known)
+            if length == UNSET or lengths.get(slot, UNSET) is None:
+                continue
+            elif slot not in lengths:
+                lengths[slot] = length
+                changed = True
+            elif lengths[slot] != length:
+                lengths[slot] = None
+                changed = True
+    return lengths
+
+def int_range(expr: NodeExpr, ranges: dict[int, tuple[int, int]]) -> tuple[int, int] | None:
+    """
+    returns the smallest and the largest value the int expression can have, None if it isn't known,
+    ranges has the ranges of the variables that are known
+    """
+    if isinstance(expr.var, NodeBinExpr):
+        bin_expr = expr.var
+        if (a := int_range(bin_expr.lhs, ranges)) is None or (b := int_range(bin_expr.rhs, ranges)) is None:
+            return None
+        op = bin_expr.op.type
+        if op == tt.PLUS:
+            low, high = a[0] + b[0], a[1] + b[1]
+        elif op == tt.MINUS:
+            low, high = a[0] - b[1], a[1] - b[0]
+        elif op == tt.STAR:
+            products = (a[0] * b[0], a[0] * b[1], a[1] * b[0], a[1] * b[1])
+            low, high = min(products), max(products)
+        elif op == tt.BAND and (a[0] >= 0 or b[0] >= 0):
+            low, high = 0, min(bound[1] for bound in (a, b) if bound[0] >= 0)
+        elif op in (tt.SLASH, tt.PERCENT, tt.SHIFT_RIGHT) and a[0] >= 0 and b[0] == b[1] and b[0] > 0:
+            if op == tt.PERCENT:
+                low, high = 0, min(a[1], b[0] - 1)
+            elif op == tt.SLASH:
+                low, high = a[0] // b[0], a[1] // b[0]
+            elif b[0] < INT_BITS:
+                low, high = a[0] >> b[0], a[1] >> b[0]
+            else:
+                return None
+        else:
+            return None
+        return (low, high) if INT_MIN <= low and high <= INT_MAX else None
+
+    term = expr.var
+    var = term.var
+    if term.index is not None:
+        return None
+    elif isinstance(var, NodeTermInt):
+        value = literal_int(expr)
+        assert value is not None, "int literals always have a value"
+        low, high = value, value
+    elif isinstance(var, NodeTermIdent) and var.slot in ranges:
+        low, high = ranges[var.slot]
+    elif isinstance(var, NodeTermParen) and (inner := int_range(var.expr, ranges)) is not None:
+        low, high = inner
+    elif isinstance(var, NodeTermCast) and var.expr.value_size == 1 and term.value_type == tt.INT_DEF:
+        return 0, 255 # the byte is zero extended
+    else:
+        return None
+    if isinstance(var, (NodeTermIdent, NodeTermParen)) and var.negative:
+        low, high = -high, -low
+    return (low, high) if INT_MIN <= low and high <= INT_MAX else None
+
+def induction_range(for_stmt: NodeStmtFor, ranges: dict[int, tuple[int, int]]) -> tuple[int, int] | None:
+    """
+    returns the smallest and the largest value the variable of the `sicke` loop can have in its body,
+    None if the loop doesn't count by one up to or down to a bound with a known range or the body changes the variable
+    """
+    slot = for_stmt.ident_def.slot
+    step = for_stmt.ident_assign.var
+    if not isinstance(step, (NodeStmtReassignInc, NodeStmtReassignDec)) or step.ident.index is not None \
+            or slot in assigned_slots(for_stmt.scope.stmts):
+        return None
+    cond = for_stmt.condition.var
+    if not isinstance(cond, NodeBinExpr) or cond.op.type not in (tt.LESS_THAN, tt.LESS_THAN_OR_EQ, tt.LARGER_THAN, tt.LARGER_THAN_OR_EQ):
+        return None
+
+    op = cond.op.type
+    counter, bound_expr = cond.lhs.var, cond.rhs
+    if not (isinstance(counter, NodeTerm) and isinstance(counter.var, NodeTermIdent) and counter.var.slot == slot):
+        counter, bound_expr = cond.rhs.var, cond.lhs
+        op = {tt.LESS_THAN: tt.LARGER_THAN, tt.LESS_THAN_OR_EQ: tt.LARGER_THAN_OR_EQ,
+              tt.LARGER_THAN: tt.LESS_THAN, tt.LARGER_THAN_OR_EQ: tt.LESS_THAN_OR_EQ}[op]
+    if not (isinstance(counter, NodeTerm) and isinstance(counter.var, NodeTermIdent) and counter.var.slot == slot) \
+            or counter.index is not None or counter.var.negative:
+        return None
+    if (start := int_range(for_stmt.ident_def.expr, ranges)) is None or (bound := int_range(bound_expr, ranges)) is None:
+        return None
+
+    # the variable can't wrap around since the condition stops it before the largest or the smallest int
+    if isinstance(step, NodeStmtReassignInc) and op == tt.LESS_THAN:
+        low, high = start[0], bound[1] - 1
+    elif isinstance(step, NodeStmtReassignInc) and op == tt.LESS_THAN_OR_EQ and bound[1] < INT_MAX:
+        low, high = start[0], bound[1]
+    elif isinstance(step, NodeStmtReassignDec) and op == tt.LARGER_THAN:
+        low, high = bound[0] + 1, start[1]
+    elif isinstance(step, NodeStmtReassignDec) and op == tt.LARGER_THAN_OR_EQ and bound[0] > INT_MIN:
+        low, high = bound[0], start[1]
+    else:
+        return None
+    return (low, high) if low <= high else None
@@ -1,207 +1,341 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
 from comptypes import * # uh-oh a wildcard import
 import tokentypes as tt
-from errors import ErrorHandler
+from errors import ErrorHandler, CompilerError
+
+
+NO_KIND = -1 # the kind of the cursor once there are no tokens left
+MINUS_KIND = tt.KIND[tt.MINUS]
+LEFT_BRACKET_KIND = tt.KIND[tt.LEFT_BRACKET]
+COLON_KIND = tt.KIND[tt.COLON]
+TRUE_KIND = tt.KIND[tt.TRUE]
+LEFT_PAREN_KIND = tt.KIND[tt.LEFT_PAREN]
+RIGHT_PAREN_KIND = tt.KIND[tt.RIGHT_PAREN]
+RIGHT_BRACKET_KIND = tt.KIND[tt.RIGHT_BRACKET]
+CONST_KIND = tt.KIND[tt.CONST]
+IDENT_KIND = tt.KIND[tt.IDENT]
+EQUALS_KIND = tt.KIND[tt.EQUALS]
+NEWLINE_KIND = tt.KIND[tt.NEWLINE]
+LEFT_CURLY_KIND = tt.KIND[tt.LEFT_CURLY]
+RIGHT_CURLY_KIND = tt.KIND[tt.RIGHT_CURLY]
+ELIF_KIND = tt.KIND[tt.ELIF]
+ELSE_KIND = tt.KIND[tt.ELSE]
+COMMA_KIND = tt.KIND[tt.COMMA]
+WHILE_KIND = tt.KIND[tt.WHILE]
+INCREMENT_KIND = tt.KIND[tt.INCREMENT]
+DECREMENT_KIND = tt.KIND[tt.DECREMENT]
+
+# kinds of the groups that wait for an inner expression or term while parsing expressions
+GROUP_PAREN = 0
+GROUP_CAST = 1
+GROUP_INDEX = 2
+GROUP_NOT = 3
+GROUP_BNOT = 4
+GROUP_SLICE = 5
+
+
+@dataclass(slots=True)
+class ExprGroup:
+    """
+    a construct that is still waiting for the expression (or term for `ne` and `~`) inside of it,
+    operator_base is the height of the operator stack when the group was opened,
+    the operators below it belong to the enclosing expression
+    """
+    kind: int
+    operator_base: int = 0
+    negative: bool = False
+    token: Token | None = None # the type of a cast or the colon of a slice
+    term: NodeTerm | None = None # the term being indexed or sliced
+    start: NodeExpr | None = None # the start of a slice
 
 
 class Parser(ErrorHandler):
     index: int = -1
     column_number = -1 # -1 means that theres no column number tracked
-    current_token: Token | None = None
+    current_kind: int = NO_KIND # integer code of the current token
+    token_cache: Token | None = None
+    token_cache_index: int = -1 # the index token_cache was made for
 
-    def __init__(self, tokens: list[Token], file_content: str):
+    def __init__(self, tokens: TokenTable | TokenStream, file_content: str):
         super().__init__(file_content)
-        self.all_tokens: list[Token] = tokens
-        self.map_parse_func: dict[token_type, Callable] = {
-            tt.EXIT: self.parse_exit,
-            tt.PRINT: self.parse_print,
-            tt.INFER_DEF: self.parse_decl,
-            tt.INT_DEF: self.parse_decl,
-            tt.BOOL_DEF: self.parse_decl,
-            tt.CHAR_DEF: self.parse_decl,
-            tt.STR_DEF: self.parse_decl,
-            tt.CONST: self.parse_decl,
-            tt.LEFT_CURLY: self.parse_scope,
-            tt.IF: self.parse_if,
-            tt.IDENT: self.parse_reassign,
-            tt.WHILE: self.parse_while,
-            tt.FOR: self.parse_for_loop,
-            tt.DO: self.parse_do_while,
-            tt.BREAK: self.parse_break,
-            tt.NEWLINE: self.parse_newline,
+        self.all_tokens: TokenTable | TokenStream = tokens
+        # keyed by the integer token kinds so the statement dispatch doesn't compare strings
+        self.map_parse_func: dict[int, Callable] = {
+            tt.KIND[tt.EXIT]: self.parse_exit,
+            tt.KIND[tt.PRINT]: self.parse_print,
+            tt.KIND[tt.INFER_DEF]: self.parse_decl,
+            tt.KIND[tt.INT_DEF]: self.parse_decl,
+            tt.KIND[tt.BOOL_DEF]: self.parse_decl,
+            tt.KIND[tt.CHAR_DEF]: self.parse_decl,
+            tt.KIND[tt.STR_DEF]: self.parse_decl,
+            tt.KIND[tt.CONST]: self.parse_decl,
+            tt.KIND[tt.LEFT_CURLY]: self.parse_scope,
+            tt.KIND[tt.IF]: self.parse_if,
+            tt.KIND[tt.IDENT]: self.parse_reassign,
+            tt.KIND[tt.WHILE]: self.parse_while,
+            tt.KIND[tt.FOR]: self.parse_for_loop,
+            tt.KIND[tt.DO]: self.parse_do_while,
+            tt.KIND[tt.BREAK]: self.parse_break,
+            tt.KIND[tt.NEWLINE]: self.parse_newline,
         }
+        # parses the term that starts with the token or opens the group that the token starts
+        self.prefix_parse_func: dict[int, Callable[[bool], NodeTerm | ExprGroup]] = {
+            tt.KIND[tt.INT_LIT]: self.parse_int_term,
+            tt.KIND[tt.IDENT]: self.parse_ident_term,
+            tt.KIND[tt.CHAR_LIT]: self.parse_char_term,
+            tt.KIND[tt.STR_LIT]: self.parse_str_term,
+            tt.KIND[tt.TRUE]: self.parse_bool_term,
+            tt.KIND[tt.FALSE]: self.parse_bool_term,
+            tt.KIND[tt.LEFT_PAREN]: self.parse_paren_term,
+            tt.KIND[tt.NOT]: self.parse_not_term,
+            tt.KIND[tt.BNOT]: self.parse_bnot_term,
+        }
+        for type_kw in tt.TYPE_KWS:
+            self.prefix_parse_func[tt.KIND[type_kw]] = self.parse_cast_term
         self.next_token() # here to set the first token
 
     def next_token(self) -> None:
         self.index += 1
-        self.current_token = self.all_tokens[self.index] if self.index < len(self.all_tokens) else None
+        self.current_kind = self.all_tokens.kind_at(self.index)
+
+    @property
+    def current_token(self) -> Token | None:
+        """
+        the Token at the cursor, made out of the token table only once an error or a node needs it,
+        the parser itself only looks at current_kind
+        """
+        if self.token_cache_index != self.index:
+            self.token_cache = self.all_tokens.token_at(self.index)
+            self.token_cache_index = self.index
+        return self.token_cache
 
     def get_token_at(self, offset: int = 0) -> Token | None:
-        return self.all_tokens[self.index + offset] if self.index + offset < len(self.all_tokens) else None
+        return self.all_tokens.token_at(self.index + offset)
     
-    def try_compiler_error(self, token_type: tuple[token_type, ...] | token_type, error_name: str, error_details: str) -> None:
+    def try_compiler_error(self, kind: int, error_name: str, error_details: str) -> None:
         """
-        checks if the current token is none or if its type is not the token type given,
+        checks if the current token is none or if its kind is not the kind given,
         raises an error if the condition is true
         """
-        if self.current_token is None or self.current_token.type not in token_type:
+        if self.current_kind != kind:
             self.compiler_error(error_name, error_details, self.current_token)
 
-    def parse_term(self) -> NodeTerm | None:
-        is_negative = False
-        if self.current_token is not None and self.current_token.type == tt.MINUS:
-            is_negative = True
-            self.next_token()
-
-        if self.current_token is not None and self.current_token.type == tt.INT_LIT:
-            ret_term = NodeTerm(NodeTermInt(self.current_token, is_negative))
-            self.next_token()
-        elif self.current_token is not None and self.current_token.type == tt.IDENT:
-            ret_term = NodeTerm(NodeTermIdent(self.current_token, is_negative))
-            self.next_token()
-        elif self.current_token is not None and self.current_token.type == tt.CHAR_LIT:
-            if is_negative:
-                self.compiler_error("Syntax", f"`{CHAR_DEF}` literal cannot be negative", self.get_token_at(-1))
-            ret_term = NodeTerm(NodeTermChar(self.current_token))
-            self.next_token()
-        elif self.current_token is not None and self.current_token.type == tt.STR_LIT:
-            if is_negative:
-                self.compiler_error("Syntax", f"`{STR_DEF}` literal cannot be negative", self.get_token_at(-1))
-            assert self.current_token.value is not None, "string value shouldn't be None here, bug in lexing"
-            length = len(self.current_token.value.split(","))
-            ret_term = NodeTerm(NodeTermStr(self.current_token, str(length)))
-            self.next_token()
-        elif self.current_token is not None and self.current_token.type == tt.TRUE:
-            if is_negative:
-                self.compiler_error("Syntax", f"`{BOOL_DEF}` literal cannot be negative", self.get_token_at(-1))
-            self.current_token.value = "1"
-            ret_term = NodeTerm(NodeTermBool(bool=self.current_token))
-            self.next_token()
-        elif self.current_token is not None and self.current_token.type == tt.FALSE:
-            if is_negative:
-                self.compiler_error("Syntax", f"`{BOOL_DEF}` literal cannot be negative", self.get_token_at(-1))
-            self.current_token.value = "0"
-            ret_term = NodeTerm(NodeTermBool(bool=self.current_token))
-            self.next_token()
-        elif self.current_token is not None and self.current_token.type == tt.LEFT_PAREN:
-            self.next_token()
-            expr = self.parse_expr()
-            if expr is None:
-                self.compiler_error("Value", "expected expression", self.current_token)
+    def parse_int_term(self, negative: bool) -> NodeTerm:
+        assert self.current_token is not None, "cant be None here since it triggered the method"
+        term = NodeTerm(NodeTermInt(self.current_token, negative))
+        self.next_token()
+        return term
 
-            self.try_compiler_error(tt.RIGHT_PAREN, "Syntax", "expected `)`") # TODO: add tests for other errors below this one
+    def parse_ident_term(self, negative: bool) -> NodeTerm:
+        assert self.current_token is not None, "cant be None here since it triggered the method"
+        term = NodeTerm(NodeTermIdent(self.current_token, negative))
+        self.next_token()
+        return term
 
-            assert expr is not None, "Should be handled in the if statement above"
-            ret_term = NodeTerm(NodeTermParen(expr, is_negative))
-            self.next_token()
-        elif self.current_token is not None and self.current_token.type == tt.NOT:
-            if is_negative:
-                self.compiler_error("Syntax", f"logical `ne` expression cannot be negative", self.get_token_at(-1))
-            self.next_token()
-            
-            term = self.parse_term()
-            if term is None:
-                self.compiler_error("Value", "expected term", self.current_token)
-            
-            assert term is not None, "Should be handled in the if statement above"
-            ret_term = NodeTerm(NodeTermNot(term))
-            #NOTE: no next token here because it breaks the term call here
-        elif self.current_token is not None and self.current_token.type == tt.BNOT:
-            self.next_token()
-            
-            term = self.parse_term()
-            if term is None:
-                self.compiler_error("Value", "expected term", self.current_token)
-            
-            assert term is not None, "Should be handled in the if statement above"
-            ret_term = NodeTerm(NodeTermBNot(term))
-        elif self.current_token is not None and self.current_token.type in tt.TYPE_KWS:
-            cast_type = self.current_token
-            assert cast_type is not None, "Should never be None here"
-            self.next_token()
-            
-            self.try_compiler_error(tt.LEFT_PAREN, "Syntax", "expected a `(`") #skipped this in the testing errors
-            self.next_token()
-            
-            expr = self.parse_expr()
-            if expr is None:
-                self.compiler_error("Syntax", "invalid expression", self.current_token) #skipped this in the testing errors
-            assert expr is not None, "Shouldn't be None here, if guard failed"
-            
-            self.try_compiler_error(tt.RIGHT_PAREN, "Syntax", "expected a `)`") # skipped this in the testing errors
+    def parse_char_term(self, negative: bool) -> NodeTerm:
+        assert self.current_token is not None, "cant be None here since it triggered the method"
+        if negative:
+            self.compiler_error("Syntax", f"`{CHAR_DEF}` literal cannot be negative", self.get_token_at(-1))
+        term = NodeTerm(NodeTermChar(self.current_token))
+        self.next_token()
+        return term
 
-            ret_term = NodeTerm(NodeTermCast(expr, cast_type))
-            self.next_token()
-        else:
-            ret_term = None
-        
-        if self.current_token is not None and self.current_token.type == tt.LEFT_BRACKET:
-            self.next_token()
-            expr = self.parse_expr()
-            self.next_token()
-            if expr is None:
-                self.compiler_error("Syntax", "invalid expression", self.current_token)
-            assert expr is not None, "expression cant be None here"
-            
-            assert ret_term is not None, "ret_term else branch got triggered"
-            ret_term.index = expr
-        
-        return ret_term
+    def parse_str_term(self, negative: bool) -> NodeTerm:
+        assert self.current_token is not None, "cant be None here since it triggered the method"
+        if negative:
+            self.compiler_error("Syntax", f"`{STR_DEF}` literal cannot be negative", self.get_token_at(-1))
+        assert isinstance(self.current_token.value, bytes), "string value should be bytes here, bug in lexing"
+        term = NodeTerm(NodeTermStr(self.current_token, self.current_token.value))
+        self.next_token()
+        return term
 
-    def parse_expr(self, min_prec: int = 0) -> NodeExpr | None:
-        term_lhs = self.parse_term()
-        
-        if term_lhs is None:
-            return None
+    def parse_bool_term(self, negative: bool) -> NodeTerm:
+        assert self.current_token is not None, "cant be None here since it triggered the method"
+        if negative:
+            self.compiler_error("Syntax", f"`{BOOL_DEF}` literal cannot be negative", self.get_token_at(-1))
+        self.current_token.value = "1" if self.current_kind == TRUE_KIND else "0"
+        term = NodeTerm(NodeTermBool(bool=self.current_token))
+        self.next_token()
+        return term
 
-        expr_lhs = NodeExpr(var=term_lhs)
+    def parse_paren_term(self, negative: bool) -> ExprGroup:
+        self.next_token()
+        return ExprGroup(GROUP_PAREN, negative=negative)
 
-        while True:
-            op: Token | None = self.current_token
-            prec: int | None = None
+    def parse_not_term(self, negative: bool) -> ExprGroup:
+        if negative:
+            self.compiler_error("Syntax", f"logical `ne` expression cannot be negative", self.get_token_at(-1))
+        self.next_token()
+        return ExprGroup(GROUP_NOT)
 
-            if op:
-                prec: int | None = get_prec_level(op.type)
+    def parse_bnot_term(self, negative: bool) -> ExprGroup:
+        self.next_token()
+        return ExprGroup(GROUP_BNOT)
 
-            if op is None or prec is None or prec < min_prec:
-                break
+    def parse_cast_term(self, negative: bool) -> ExprGroup:
+        cast_type = self.current_token
+        assert cast_type is not None, "Should never be None here"
+        self.next_token()
+        
+        self.try_compiler_error(LEFT_PAREN_KIND, "Syntax", "expected a `(`") #skipped this in the testing errors
+        self.next_token()
+        return ExprGroup(GROUP_CAST, token=cast_type)
 
-            next_min_prec: int = prec + 1
+    def missing_operand(self, groups: list[ExprGroup], after_operator: bool) -> None:
+        """
+        raises the error for a missing term that fits the place where it is missing,
+        returns only when the whole expression is missing, its up to the caller to report that
+        """
+        if after_operator:
+            self.compiler_error("Value", "invalid expression", self.current_token)
+        elif not groups:
+            return
+        elif groups[-1].kind == GROUP_PAREN:
+            self.compiler_error("Value", "expected expression", self.current_token)
+        elif groups[-1].kind == GROUP_CAST:
+            self.compiler_error("Syntax", "invalid expression", self.current_token) #skipped this in the testing errors
+        elif groups[-1].kind in (GROUP_INDEX, GROUP_SLICE):
             self.next_token()
+            self.compiler_error("Syntax", "invalid expression", self.current_token)
+        else:
+            self.compiler_error("Value", "expected term", self.current_token)
 
-            expr_rhs = self.parse_expr(next_min_prec)
+    def parse_operands(self, single_term: bool) -> NodeExpr | NodeTerm | None:
+        """
+        parses an expression (or just a single term) with explicit stacks instead of recursion,
+        so the depth of nesting and the number of operands are only limited by memory,
+        binary operators wait on the operator stack until an operator that binds looser (or the end of their group) comes,
+        parentheses, casts, indexes, slices, `ne` and `~` open groups which are closed once their expression or term is done,
+        an index group becomes a slice group at its `:`
+        """
+        operands: list[NodeExpr] = []
+        operators: list[tuple[int, Token]] = [] # (precedence level, operator)
+        groups: list[ExprGroup] = []
+        term: NodeTerm | None = None
+        after_operator = False
+        check_index = True
+
+        while True:
+            if term is None:
+                negative = False
+                if self.current_kind == MINUS_KIND:
+                    negative = True
+                    self.next_token()
+
+                prefix_func: Callable | None = self.prefix_parse_func.get(self.current_kind)
+                if prefix_func is None:
+                    self.missing_operand(groups, after_operator)
+                    return None
+                
+                result = prefix_func(negative)
+                if isinstance(result, ExprGroup):
+                    result.operator_base = len(operators)
+                    groups.append(result)
+                    after_operator = False
+                    continue
+                term = result
+                check_index = True
+
+            # the term is done, it can still get indexed or be the operand of a waiting `ne` or `~`
+            if check_index and self.current_kind == LEFT_BRACKET_KIND:
+                self.next_token()
+                groups.append(ExprGroup(GROUP_INDEX, len(operators), term=term))
+                term = None
+                after_operator = False
+                continue
+            if groups and groups[-1].kind in (GROUP_NOT, GROUP_BNOT):
+                term = NodeTerm(NodeTermNot(term) if groups.pop().kind == GROUP_NOT else NodeTermBNot(term))
+                check_index = True
+                continue
+            if single_term and not groups:
+                return term
+
+            operands.append(NodeExpr(term))
+            term = None
+
+            prec = tt.PREC_BY_KIND[self.current_kind] if self.current_kind >= 0 else -1
+            right_assoc = prec >= 0 and tt.RIGHT_ASSOC_BY_KIND[self.current_kind]
+            operator_base = groups[-1].operator_base if groups else 0
+            # folds the operators that bind at least as tightly as the next one (all of them at the end of a group)
+            while len(operators) > operator_base and \
+                    (operators[-1][0] > prec or (operators[-1][0] == prec and not right_assoc)):
+                rhs = operands.pop()
+                operands[-1] = NodeExpr(NodeBinExpr(operands[-1], rhs, operators.pop()[1]))
+
+            if prec >= 0:
+                assert self.current_token is not None, "binary operators have a precedence level, None doesn't"
+                operators.append((prec, self.current_token))
+                self.next_token()
+                after_operator = True
+                continue
 
-            if expr_rhs is None:
-                self.compiler_error("Value", "invalid expression", self.current_token)
-            assert expr_rhs is not None, "expression shouldn't be None, is handled in the above if statement"
+            if not groups:
+                assert len(operands) == 1 and not operators, "every operator should be folded by now"
+                return operands.pop()
 
-            expr_lhs2 = NodeExpr(None) # prevents a recursion error, god knows why but it makes it work
+            group = groups.pop()
+            expr = operands.pop()
+            if group.kind == GROUP_PAREN:
+                self.try_compiler_error(RIGHT_PAREN_KIND, "Syntax", "expected `)`") # TODO: add tests for other errors below this one
+                self.next_token()
+                term = NodeTerm(NodeTermParen(expr, group.negative))
+                check_index = True
+            elif group.kind == GROUP_CAST:
+                assert group.token is not None, "cast groups always have their type"
+                self.try_compiler_error(RIGHT_PAREN_KIND, "Syntax", "expected a `)`") # skipped this in the testing errors
+                term = NodeTerm(NodeTermCast(expr, group.token))
+                self.next_token()
+                check_index = True
+            elif group.kind == GROUP_INDEX and self.current_kind == COLON_KIND:
+                colon = self.current_token
+                self.next_token()
+                groups.append(ExprGroup(GROUP_SLICE, len(operators), token=colon, term=group.term, start=expr))
+                after_operator = False
+            elif group.kind == GROUP_SLICE:
+                assert group.term is not None and group.start is not None and group.token is not None, \
+                    "slice groups always have their term, start and colon"
+                self.try_compiler_error(RIGHT_BRACKET_KIND, "Syntax", "expected `]`")
+                self.next_token()
+                term = NodeTerm(NodeTermSlice(group.term, group.start, expr, group.token))
+                check_index = True
+            else:
+                assert group.kind == GROUP_INDEX and group.term is not None, "only groups of expressions are closed here"
+                self.next_token() # right bracket
+                group.term.index = expr
+                term = group.term
+                check_index = False
 
-            bin_expr = NodeBinExpr(expr_lhs2, expr_rhs, op)
-            
-            expr_lhs2.var = expr_lhs.var
-            expr_lhs.var = bin_expr
-        return expr_lhs
+    def parse_term(self) -> NodeTerm | None:
+        term = self.parse_operands(single_term=True)
+        assert term is None or isinstance(term, NodeTerm), "single_term only returns terms"
+        return term
+
+    def parse_expr(self) -> NodeExpr | None:
+        expr = self.parse_operands(single_term=False)
+        assert expr is None or isinstance(expr, NodeExpr), "expressions are wrapped into NodeExpr"
+        return expr
     
     def parse_decl(self) -> NodeStmtDeclare:
-        assert self.current_token is not None, "cant be None here since it triggered the method"
+        assert self.current_kind != NO_KIND, "cant be None here since it triggered the method"
         is_const = False
-        if self.current_token.type == tt.CONST:
+        if self.current_kind == CONST_KIND:
             is_const = True
             self.next_token()
         
         type_def = self.current_token
-        if type_def.type == tt.IDENT and is_const:
+        if self.current_kind == IDENT_KIND and is_const:
             # allows for type inference without `naj` just with `furt`
-            type_def = Token(tt.INFER_DEF, self.current_token.line, self.current_token.col)
+            assert type_def is not None, "the kind is an identifier"
+            type_def = Token(tt.INFER_DEF, type_def.line, type_def.col)
         else:
             self.next_token() # removes type def
 
-        self.try_compiler_error(tt.IDENT, "Syntax", "expected valid identifier")
+        self.try_compiler_error(IDENT_KIND, "Syntax", "expected valid identifier")
         ident = self.current_token
         self.next_token()
 
-        self.try_compiler_error(tt.EQUALS, "Syntax", "expected `=`")
+        self.try_compiler_error(EQUALS_KIND, "Syntax", "expected `=`")
         self.next_token()
 
         assert type_def is not None, "type_def should never be None"
@@ -217,7 +351,7 @@ class Parser(ErrorHandler):
     def parse_exit(self) -> NodeStmtExit:
         self.next_token() # removes exit token
         
-        self.try_compiler_error(tt.LEFT_PAREN, "Syntax", "expected `(`") # skipped this in the testing errors
+        self.try_compiler_error(LEFT_PAREN_KIND, "Syntax", "expected `(`") # skipped this in the testing errors
         self.next_token()
 
         expr = self.parse_expr()
@@ -227,40 +361,45 @@ class Parser(ErrorHandler):
         
         assert expr is not None, "expr shouldn't be None, handled in the above if statement"
 
-        self.try_compiler_error(tt.RIGHT_PAREN, "Syntax", "expected `)`") # skipped this in the testing errors
+        self.try_compiler_error(RIGHT_PAREN_KIND, "Syntax", "expected `)`") # skipped this in the testing errors
         self.next_token()
 
         return NodeStmtExit(expr=expr)
 
     def parse_scope(self) -> NodeScope:
-        if self.current_token is not None and self.current_token.type == tt.NEWLINE:
+        if self.current_kind == NEWLINE_KIND:
             self.next_token()
         
         start_curly = self.current_token
-        self.try_compiler_error(tt.LEFT_CURLY, "Syntax", "expected `{`")
+        self.try_compiler_error(LEFT_CURLY_KIND, "Syntax", "expected `{`")
         self.next_token()  # left curly
 
         scope = NodeScope(stmts=[])
-        while stmt := self.parse_statement():
-            scope.stmts.append(stmt)
-            if not isinstance(stmt.stmt_var, (NodeStmtEmpty, NodeStmtIf)) \
-                    and self.current_token and self.current_token.type != tt.RIGHT_CURLY:
-                self.try_compiler_error(tt.NEWLINE, "Syntax", "expected newline")
-                self.next_token()
-            if self.current_token and self.current_token.type == tt.RIGHT_CURLY:
+        while self.current_kind != NO_KIND:
+            try:
+                stmt = self.parse_statement()
+                scope.stmts.append(stmt)
+                if not isinstance(stmt.stmt_var, (NodeStmtEmpty, NodeStmtIf)) \
+                        and self.current_kind != NO_KIND and self.current_kind != RIGHT_CURLY_KIND:
+                    self.try_compiler_error(NEWLINE_KIND, "Syntax", "expected newline")
+                    self.next_token()
+            except CompilerError as error:
+                self.recover(error)
+                self.synchronize()
+            if self.current_kind == RIGHT_CURLY_KIND:
                 self.next_token() # right curly
                 return scope
         else:
             self.compiler_error("Syntax", "unclosed scope starting here", start_curly)
         
-        if self.current_token and self.current_token.type == tt.RIGHT_CURLY:
+        if self.current_kind == RIGHT_CURLY_KIND:
             self.next_token() # right curly (for empty statement with no statements inside)
         return scope
 
     def parse_ifpred(self) -> NodeIfPred | None:
-        while self.current_token is not None and self.current_token.type == tt.NEWLINE:
+        while self.current_kind == NEWLINE_KIND:
             self.next_token()
-        if self.current_token is not None and self.current_token.type == tt.ELIF:
+        if self.current_kind == ELIF_KIND:
             self.next_token()
             
             expr = self.parse_expr()
@@ -274,7 +413,7 @@ class Parser(ErrorHandler):
             ifpred = self.parse_ifpred()
 
             return NodeIfPred(NodeIfPredElif(expr, scope, ifpred))
-        elif self.current_token is not None and self.current_token.type == tt.ELSE:
+        elif self.current_kind == ELSE_KIND:
             self.next_token()
             
             scope = self.parse_scope()
@@ -294,7 +433,7 @@ class Parser(ErrorHandler):
         
         scope = self.parse_scope()
 
-        while self.current_token is not None and self.current_token.type == tt.NEWLINE:
+        while self.current_kind == NEWLINE_KIND:
             self.next_token()
 
         ifpred = self.parse_ifpred()
@@ -315,27 +454,26 @@ class Parser(ErrorHandler):
     def parse_for_loop(self) -> NodeStmtFor:
         self.next_token()
 
-        self.try_compiler_error(tt.LEFT_PAREN, "Syntax", "expected `(`")
+        self.try_compiler_error(LEFT_PAREN_KIND, "Syntax", "expected `(`")
         self.next_token()
 
         ident_def = self.parse_decl()
 
-        self.try_compiler_error(tt.COMMA, "Syntax", "expected `,`")
+        self.try_compiler_error(COMMA_KIND, "Syntax", "expected `,`")
         self.next_token()
 
         condition = self.parse_expr()
-        if condition is None or condition.var is None:
+        if condition is None:
             self.compiler_error("Syntax", "missing condition", self.current_token)
         
         assert condition is not None, "expr shouldn't be None, handled in the previous if statement"
-        assert condition.var is not None, "expr.var shouldn't be None, handled in the previous if statement"
 
-        self.try_compiler_error(tt.COMMA, "Syntax", "expected `,`")
+        self.try_compiler_error(COMMA_KIND, "Syntax", "expected `,`")
         self.next_token()
 
         assign = self.parse_reassign()
         
-        self.try_compiler_error(tt.RIGHT_PAREN, "Syntax", "expected `)`")
+        self.try_compiler_error(RIGHT_PAREN_KIND, "Syntax", "expected `)`")
         self.next_token()
 
         scope = self.parse_scope()
@@ -346,7 +484,7 @@ class Parser(ErrorHandler):
 
         scope = self.parse_scope()
         
-        self.try_compiler_error(tt.WHILE, "Syntax", "expected `kim`")
+        self.try_compiler_error(WHILE_KIND, "Syntax", "expected `kim`")
         self.next_token()
 
         expr = self.parse_expr()
@@ -363,14 +501,14 @@ class Parser(ErrorHandler):
             self.compiler_error("Syntax", "expected identifier", self.current_token)
         assert term is not None, "should have thrown a compiler error here"
         
-        if self.current_token is not None and self.current_token.type == tt.INCREMENT:
+        if self.current_kind == INCREMENT_KIND:
             self.next_token()
             return NodeStmtReassign(var=NodeStmtReassignInc(term))
-        elif self.current_token is not None and self.current_token.type == tt.DECREMENT:
+        elif self.current_kind == DECREMENT_KIND:
             self.next_token()
             return NodeStmtReassign(var=NodeStmtReassignDec(term))
 
-        self.try_compiler_error(tt.EQUALS, "Syntax", "expected `=`")
+        self.try_compiler_error(EQUALS_KIND, "Syntax", "expected `=`")
         self.next_token()
 
         expr = self.parse_expr()
@@ -384,7 +522,7 @@ class Parser(ErrorHandler):
     def parse_print(self) -> NodeStmtPrint:
         self.next_token() # removes print token
 
-        self.try_compiler_error(tt.LEFT_PAREN, "Syntax", "expected `(`")
+        self.try_compiler_error(LEFT_PAREN_KIND, "Syntax", "expected `(`")
         self.next_token()
 
         cont = self.parse_expr()
@@ -394,7 +532,7 @@ class Parser(ErrorHandler):
         
         assert cont is not None, "content shouldn't be None, handled by the previous if statement"
 
-        self.try_compiler_error(tt.RIGHT_PAREN, "Syntax", "expected `)`")
+        self.try_compiler_error(RIGHT_PAREN_KIND, "Syntax", "expected `)`")
         self.next_token()
         
         return NodeStmtPrint(cont, cont_type=INFER_DEF)
@@ -410,12 +548,12 @@ class Parser(ErrorHandler):
         return NodeStmtEmpty()
     
     def parse_statement(self) -> NodeStmt:
-        assert self.current_token is not None, "checked in the while loop, should never be None here"
+        assert self.current_kind != NO_KIND, "checked in the while loop, should never be None here"
         statement = None
         
-        parse_func: Callable | None = self.map_parse_func.get(self.current_token.type)
+        parse_func: Callable | None = self.map_parse_func.get(self.current_kind)
         
-        if self.current_token.type == tt.RIGHT_CURLY: # here to handle fully empty scopes like this -> {{}}
+        if self.current_kind == RIGHT_CURLY_KIND: # here to handle fully empty scopes like this -> {{}}
             return NodeStmt(stmt_var=NodeStmtEmpty())
         if parse_func is None:
             self.compiler_error("Syntax", "invalid statement start", self.current_token)
@@ -426,12 +564,56 @@ class Parser(ErrorHandler):
         assert statement is not None, "statement should never be None, handled by the if statements above"
         return NodeStmt(stmt_var=statement)
 
-    def parse_program(self) -> NodeProgram:
-        program: NodeProgram = NodeProgram(stmts=[])
-        while self.current_token is not None:
-            stmt = self.parse_statement()
-            if not isinstance(stmt.stmt_var, (NodeStmtEmpty, NodeScope, NodeStmtIf)) and self.current_token:
-                self.try_compiler_error(tt.NEWLINE, "Syntax", "expected newline")
+    def synchronize(self) -> None:
+        """
+        skips the rest of a broken statement, up to and including the next newline
+        or up to the `}` that closes the current scope,
+        scopes opened in the skipped tokens are skipped as a whole
+        """
+        depth = 0
+        while self.current_kind != NO_KIND:
+            if self.current_kind == LEFT_CURLY_KIND:
+                depth += 1
+            elif self.current_kind == RIGHT_CURLY_KIND:
+                if depth == 0:
+                    return
+                depth -= 1
+            elif self.current_kind == NEWLINE_KIND and depth == 0:
                 self.next_token()
-            program.stmts.append(stmt)
-        return program
+                return
+            self.next_token()
+
+    def parse_top_level(self) -> Iterator[NodeStmt]:
+        """
+        parses the top level statements one by one, yielding each one when it's done
+        """
+        while self.current_kind != NO_KIND:
+            if isinstance(self.all_tokens, TokenStream):
+                self.all_tokens.release(self.index) # the statements before this one are done
+            try:
+                if self.current_kind == RIGHT_CURLY_KIND:
+                    self.compiler_error("Syntax", "invalid statement start", self.current_token)
+                stmt = self.parse_statement()
+                if not isinstance(stmt.stmt_var, (NodeStmtEmpty, NodeScope, NodeStmtIf)) and self.current_kind != NO_KIND:
+                    self.try_compiler_error(NEWLINE_KIND, "Syntax", "expected newline")
+                    self.next_token()
+                yield stmt
+            except CompilerError as error:
+                self.recover(error)
+                self.synchronize()
+                if self.current_kind == RIGHT_CURLY_KIND:
+                    self.next_token() # a stray `}` has no scope to close
+
+    def parse_program(self) -> NodeProgram:
+        return NodeProgram(stmts=list(self.parse_top_level()))
+
+    def parse_flat(self) -> FlatTree:
+        """
+        parses the program into a FlatTree,
+        every statement is flattened as soon as it's parsed so the whole dataclass tree never exists at once
+        """
+        assert isinstance(self.all_tokens, TokenTable), "a FlatTree needs all of the tokens"
+        tree = FlatTree(self.all_tokens)
+        for stmt in self.parse_top_level():
+            tree.add_statement(stmt)
+        return tree
@@ -0,0 +1,230 @@
+from comptypes import *
+
+
+RAX, RDX = 0, 3
+
+# instructions that only write their first operand, its old value is never read
+WRITE_ONLY: tuple[str, ...] = ("mov", "movzx", "movsx", "movsxd", "lea")
+
+# instructions that leave a register as it was when their second operand is the immediate
+IDENTITY_OPS: dict[str, int] = {"add": 0, "sub": 0, "or": 0, "xor": 0, "sal": 0, "sar": 0, "shr": 0, "and": -1}
+
+# instructions that touch more than their operands, nothing is moved across them
+BARRIERS: tuple[str, ...] = ("call", "syscall", "ret", "idiv", *JUMPS)
+
+# how far back a load looks for the same load
+LOAD_WINDOW = 8
+
+RULES: tuple[str, ...] = (
+    "store-load", "store-forward", "redundant-load", "dead-store", "dead-write", "self-move", "identity-op", "jump-to-next"
+)
+
+
+def operand_regs(operand: Operand) -> set[int]:
+    """
+    returns the indexes of the registers the operand reads
+    """
+    if isinstance(operand, Reg):
+        return {operand.idx}
+    elif isinstance(operand, Mem):
+        regs = {operand.base.idx} if isinstance(operand.base, Reg) else set()
+        return regs if operand.index is None else regs | {operand.index.idx}
+    return set()
+
+def is_zeroing(instr: Instr) -> bool:
+    return instr.opcode == "xor" and len(instr.operands) == 2 \
+        and isinstance(instr.operands[0], Reg) and instr.operands[0] == instr.operands[1]
+
+def reads(instr: Instr) -> set[int] | None:
+    """
+    returns the indexes of the registers the instruction reads, None if it isn't known
+    """
+    if instr.opcode in BARRIERS:
+        return None
+    elif instr.opcode in WRITE_ONLY:
+        dest, src = instr.operands[0], instr.operands[1]
+        return operand_regs(src) | (operand_regs(dest) if isinstance(dest, Mem) else set())
+    elif is_zeroing(instr):
+        return set()
+    elif instr.opcode in ("cqo", "cdq"):
+        return {RAX}
+    regs: set[int] = set()
+    for operand in instr.operands:
+        regs |= operand_regs(operand)
+    return regs
+
+def written_reg(instr: Instr) -> Reg | None:
+    """
+    returns the register that the instruction writes without reading it first, None if there isn't one
+    """
+    if (instr.opcode in WRITE_ONLY or is_zeroing(instr)) and isinstance(instr.operands[0], Reg):
+        return instr.operands[0]
+    elif instr.opcode == "cqo":
+        return Reg(RDX, 8)
+    elif instr.opcode == "cdq":
+        return Reg(RDX, 4)
+    return None
+
+def written_regs(instr: Instr) -> set[int]:
+    """
+    returns the indexes of the registers the instruction might change
+    """
+    regs: set[int] = {instr.operands[0].idx} if instr.operands and isinstance(instr.operands[0], Reg) else set()
+    if instr.opcode in ("cqo", "cdq"):
+        regs.add(RDX)
+    return regs
+
+def overlaps(a: Mem, b: Mem) -> bool:
+    """
+    checks if the two memory operands could be the same memory, only stack slots are told apart
+    """
+    if a.index is not None or b.index is not None or a.base != b.base or a.size is None or b.size is None:
+        return True
+    return a.offset < b.offset + b.size and b.offset < a.offset + a.size
+
+
+class Peephole:
+    """
+    removes instructions that don't change what the program does by looking at the instructions right after them,
+    it relies on the Generator never reading the flags of an instruction other than the cmp or test right before,
+    stats counts how many instructions every rule removed, store-forward counts the loads it made into register moves
+    """
+    def __init__(self) -> None:
+        self.stats: dict[str, int] = dict.fromkeys(RULES, 0)
+        self.pending: list[AsmLine] = [] # the end of the lines fed so far, the next lines can still change them
+
+    def next_instr(self, lines: list[AsmLine | None], idx: int) -> int | None:
+        """
+        returns the index of the instruction that runs right after the one at idx,
+        None if a label or something else is in the way
+        """
+        for i in range(idx + 1, len(lines)):
+            line = lines[i]
+            if isinstance(line, Instr):
+                return i
+            elif not isinstance(line, Comment) and line is not None:
+                return None
+        return None
+
+    def jumps_to_next(self, lines: list[AsmLine | None], idx: int) -> bool:
+        """
+        checks if the jump at idx only jumps over labels and comments
+        """
+        jump = lines[idx]
+        assert isinstance(jump, Instr) and isinstance(jump.operands[0], Sym), "only called on jumps"
+        for i in range(idx + 1, len(lines)):
+            line = lines[i]
+            if isinstance(line, Label) and line.name == jump.operands[0].name:
+                return True
+            elif not isinstance(line, (Label, Comment)) and line is not None:
+                return False
+        return False
+
+    def is_redundant_load(self, lines: list[AsmLine | None], idx: int) -> bool:
+        """
+        checks if the load at idx reads what a load a few instructions before already put into the register
+        """
+        load = lines[idx]
+        assert isinstance(load, Instr), "only called on loads"
+        dest, src = load.operands
+        assert isinstance(dest, Reg) and isinstance(src, Mem), "only called on loads"
+        seen = 0
+        for i in range(idx - 1, -1, -1):
+            line = lines[i]
+            if line is None or isinstance(line, Comment):
+                continue
+            if not isinstance(line, Instr) or line.opcode in BARRIERS or seen == LOAD_WINDOW:
+                return False
+            if line == load:
+                return True
+            if dest.idx in written_regs(line) or operand_regs(src) & written_regs(line):
+                return False
+            if line.operands and isinstance(line.operands[0], Mem) and line.opcode not in ("cmp", "test") \
+                    and overlaps(line.operands[0], src):
+                return False
+            seen += 1
+        return False
+
+    def match(self, lines: list[AsmLine | None], idx: int) -> tuple[str, int] | None:
+        """
+        returns the name of the rule that applies to the instruction at idx and the index of the instruction it removes
+        """
+        a = lines[idx]
+        assert isinstance(a, Instr), "only instructions are matched"
+
+        if a.opcode == "mov" and isinstance(a.operands[0], Reg) and a.operands[0] == a.operands[1] \
+                and a.operands[0].size != 4: # a 32 bit move clears the upper half of the register
+            return "self-move", idx
+        if a.opcode in IDENTITY_OPS and isinstance(a.operands[0], Reg) \
+                and a.operands[1] == Imm(IDENTITY_OPS[a.opcode]):
+            return "identity-op", idx
+        if a.opcode == "imul" and len(a.operands) == 3 and a.operands[0] == a.operands[1] and a.operands[2] == Imm(1):
+            return "identity-op", idx
+        if a.opcode in JUMPS and isinstance(a.operands[0], Sym) and self.jumps_to_next(lines, idx):
+            return "jump-to-next", idx
+        if a.opcode == "mov" and isinstance(a.operands[0], Reg) and isinstance(a.operands[1], Mem) \
+                and a.operands[0].idx not in operand_regs(a.operands[1]) and self.is_redundant_load(lines, idx):
+            return "redundant-load", idx
+
+        if (j := self.next_instr(lines, idx)) is None:
+            return None
+        b = lines[j]
+        assert isinstance(b, Instr), "next_instr() only returns instructions"
+
+        if a.opcode == "mov" and b.opcode == "mov" and isinstance(a.operands[0], Mem):
+            # the value that was just stored is still in the register
+            if a.operands[0] == b.operands[1] and a.operands[1] == b.operands[0]:
+                return "store-load", j
+            # the stored value is read back into another register, it's moved over without the memory
+            if a.operands[0] == b.operands[1] and isinstance(b.operands[0], Reg) and not isinstance(a.operands[1], Mem) \
+                    and (isinstance(a.operands[1], Imm) or a.operands[1].size == b.operands[0].size):
+                lines[j] = Instr("mov", (b.operands[0], a.operands[1]), b.comment)
+                return "store-forward", -1
+            # the stored value gets overwritten before anything reads it
+            if a.operands[0] == b.operands[0] and not isinstance(b.operands[1], Mem):
+                return "dead-store", idx
+
+        # the register gets overwritten before anything reads it
+        dest, overwritten = written_reg(a), written_reg(b)
+        b_reads = reads(b)
+        if dest is not None and overwritten is not None and b_reads is not None \
+                and overwritten.idx == dest.idx and dest.idx not in b_reads \
+                and (overwritten.size >= 4 or overwritten.size >= dest.size):
+            return "dead-write", idx
+        return None
+
+    def optimize(self, lines: list[AsmLine]) -> list[AsmLine]:
+        """
+        applies the rules until none of them matches, returns the lines without the removed instructions
+        """
+        work: list[AsmLine | None] = list(lines)
+        changed = True
+        while changed:
+            changed = False
+            for idx, line in enumerate(work):
+                if not isinstance(line, Instr):
+                    continue
+                if (found := self.match(work, idx)) is not None:
+                    rule, removed = found
+                    if removed != -1: # -1 when the rule replaced an instruction instead
+                        work[removed] = None
+                    self.stats[rule] += 1
+                    changed = True
+        return [line for line in work if line is not None]
+
+    def feed(self, lines: list[AsmLine]) -> list[AsmLine]:
+        """
+        optimizes the lines together with the end of the lines fed before,
+        returns the lines that can't change anymore, so the assembly can be written out as it's generated
+        """
+        self.pending = self.optimize(self.pending + lines)
+        done = self.pending[:max(0, len(self.pending) - LOAD_WINDOW)]
+        del self.pending[:len(done)]
+        return done
+
+    def drain(self) -> list[AsmLine]:
+        """
+        returns the lines that were kept back after the last feed()
+        """
+        done, self.pending = self.pending, []
+        return done
@@ -8,6 +8,7 @@ LEFT_BRACKET = "["
 RIGHT_BRACKET = "]"
 
 COMMA = ","
+COLON = ":"
 NEWLINE = "\n"
 
 EXIT = "exit"
@@ -67,7 +68,7 @@ SYMBOLS: tuple[token_type, ...] = (
     INCREMENT, DECREMENT,
     IS_EQUAL, IS_NOT_EQUAL, LARGER_THAN, LESS_THAN, LARGER_THAN_OR_EQ, LESS_THAN_OR_EQ,
     PLUS, MINUS, STAR, SLASH, PERCENT, EQUALS,
-    COMMA, NEWLINE,
+    COMMA, COLON, NEWLINE,
     LEFT_PAREN, RIGHT_PAREN, RIGHT_CURLY, LEFT_CURLY, LEFT_BRACKET, RIGHT_BRACKET,
     BAND, BOR, XOR, BNOT, SHIFT_LEFT, SHIFT_RIGHT
 )
@@ -100,6 +101,21 @@ KEYWORD_TO_TOKEN_TYPE: dict[str, token_type] = {
     "ne": NOT,
 }
 
+# every token type gets a small integer code (its index in this tuple),
+# the packed token table stores these codes instead of the strings
+TOKEN_TYPES: tuple[token_type, ...] = (
+    NEWLINE, IDENT, INT_LIT, CHAR_LIT, STR_LIT, TRUE, FALSE,
+    LEFT_PAREN, RIGHT_PAREN, LEFT_CURLY, RIGHT_CURLY, LEFT_BRACKET, RIGHT_BRACKET, COMMA, COLON,
+    EXIT, PRINT, INFER_DEF, INT_DEF, BOOL_DEF, CHAR_DEF, STR_DEF,
+    IF, ELIF, ELSE, WHILE, DO, CONST, FOR, BREAK,
+    PLUS, MINUS, STAR, SLASH, PERCENT, EQUALS,
+    IS_EQUAL, IS_NOT_EQUAL, LARGER_THAN, LESS_THAN, LARGER_THAN_OR_EQ, LESS_THAN_OR_EQ,
+    INCREMENT, DECREMENT, AND, OR, NOT,
+    BAND, BOR, XOR, BNOT, SHIFT_LEFT, SHIFT_RIGHT
+)
+
+KIND: dict[token_type, int] = {type_: kind for kind, type_ in enumerate(TOKEN_TYPES)}
+
 COMPARISONS: tuple[token_type, ...] = (
     IS_EQUAL, IS_NOT_EQUAL, LARGER_THAN, LESS_THAN, LARGER_THAN_OR_EQ, LESS_THAN_OR_EQ
 )
@@ -108,22 +124,21 @@ TYPE_KWS: tuple[token_type, ...] = (
     INT_DEF, STR_DEF, BOOL_DEF, CHAR_DEF
 )
 
-def get_prec_level(tt: token_type) -> int | None:
-    """
-    returns the precedence level of the token, 
-    returns None if that token doesn't have a precedence level (token isn't a binary operator)
-    """
-    if tt == AND or tt == OR:
-        return 0
-    elif tt in COMPARISONS:
-        return 1
-    elif tt in (BAND, BOR, XOR):
-        return 2
-    elif tt in (SHIFT_LEFT, SHIFT_RIGHT):
-        return 3
-    elif tt == PLUS or tt == MINUS:
-        return 4
-    elif tt in (STAR, SLASH, PERCENT):
-        return 5
-    else:
-        return None
+LEFT_ASSOC = False
+RIGHT_ASSOC = True
+
+# binary operators mapped to their precedence level (higher binds tighter) and associativity
+BINARY_OPS: dict[token_type, tuple[int, bool]] = {
+    AND: (0, LEFT_ASSOC), OR: (0, LEFT_ASSOC),
+    IS_EQUAL: (1, LEFT_ASSOC), IS_NOT_EQUAL: (1, LEFT_ASSOC),
+    LARGER_THAN: (1, LEFT_ASSOC), LESS_THAN: (1, LEFT_ASSOC),
+    LARGER_THAN_OR_EQ: (1, LEFT_ASSOC), LESS_THAN_OR_EQ: (1, LEFT_ASSOC),
+    BAND: (2, LEFT_ASSOC), BOR: (2, LEFT_ASSOC), XOR: (2, LEFT_ASSOC),
+    SHIFT_LEFT: (3, LEFT_ASSOC), SHIFT_RIGHT: (3, LEFT_ASSOC),
+    PLUS: (4, LEFT_ASSOC), MINUS: (4, LEFT_ASSOC),
+    STAR: (5, LEFT_ASSOC), SLASH: (5, LEFT_ASSOC), PERCENT: (5, LEFT_ASSOC),
+}
+
+# the same table indexed by the integer token kinds, -1 marks tokens that aren't binary operators
+PREC_BY_KIND: tuple[int, ...] = tuple(BINARY_OPS[type_][0] if type_ in BINARY_OPS else -1 for type_ in TOKEN_TYPES)
+RIGHT_ASSOC_BY_KIND: tuple[bool, ...] = tuple(type_ in BINARY_OPS and BINARY_OPS[type_][1] for type_ in TOKEN_TYPES)
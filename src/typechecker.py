@@ -1,14 +1,31 @@
-from errors import ErrorHandler
+from collections.abc import Callable
+from functools import partial
+from errors import ErrorHandler, CompilerError
 from comptypes import *
 
 
-class TypeChecker(ErrorHandler):
-    stack: list[StackItem] = []
-    variables: list[StackItem] = [] # stores all variables and their types
+INT_KIND = KIND[INT_DEF]
+BOOL_KIND = KIND[BOOL_DEF]
+CHAR_KIND = KIND[CHAR_DEF]
+STR_KIND = KIND[STR_DEF]
+INFER_KIND = KIND[INFER_DEF]
+
+# kinds of the binary operators grouped by the types of operands they take
+COMPARISON_KINDS = frozenset(KIND[op] for op in COMPARISONS)
+LOGICAL_KINDS = frozenset((KIND[OR], KIND[AND]))
+INT_OP_KINDS = frozenset(KIND[op] for op in (SHIFT_LEFT, SHIFT_RIGHT, BOR, BAND, XOR, PLUS, MINUS, STAR, SLASH, PERCENT))
+CONDITION_KINDS = frozenset((BOOL_KIND, INT_KIND))
+
+# nodes that are left to check and the checks that wait for their operands
+CheckWork = NodeExpr | NodeTerm | NodeBinExpr | Callable[[], None]
 
-    def __init__(self, program: NodeProgram, file_content: str) -> None:
+
+class TypeChecker(ErrorHandler):
+    def __init__(self, program: NodeProgram | FlatTree, file_content: str) -> None:
         super().__init__(file_content)
         self.main_program = program
+        self.stack: list[StackItem] = []
+        self.variables: list[StackItem] = [] # types of the live variables, indexed by the slots from the Binder
 
     def push_stack(self, item: StackItem):
         """
@@ -28,9 +45,21 @@ class TypeChecker(ErrorHandler):
     def check_program(self):
         for stmt in self.main_program.stmts:
             assert stmt is not None, "None statement shouldn't make it here"
-            self.check_statement(stmt)
+            self.check_statement_or_recover(stmt)
             self.line_number += 1
 
+    def check_statement_or_recover(self, stmt: NodeStmt):
+        """
+        checks the statement, if it has an error and all errors are reported
+        the stack is restored to how it was before the statement so the next one can be checked
+        """
+        stack_len = len(self.stack)
+        try:
+            self.check_statement(stmt)
+        except CompilerError as error:
+            self.recover(error)
+            del self.stack[stack_len:]
+
     def check_statement(self, stmt: NodeStmt):
         if isinstance(stmt.stmt_var, NodeStmtExit):
             self.check_exit(stmt.stmt_var)
@@ -57,98 +86,145 @@ class TypeChecker(ErrorHandler):
         else:
             raise ValueError(f"Unreachable {stmt.stmt_var}")
     
-    def check_term(self, term: NodeTerm):
+    def check_term(self, term: NodeTerm, work: list[CheckWork]):
+        """
+        checks the term if it has no operands, otherwise puts the rest of its check onto the work stack
+        under its operands, so they're checked first and leave their types on top of the stack
+        """
+        work.append(lambda: self.annotate(term, self.stack[-1].kind))
         if term.index is not None:
-            term2 = NodeTerm(term.var)
-            self.check_term(term2)
-            if (res := self.pop_stack()).sub_type is None:
-                self.compiler_error("Type", f"expected indexable type, got `{res.type}`", res.loc)
-            else:
-                res.type = res.sub_type
-                res.sub_type = None
-            
-            self.check_expression(term.index)
-            if (idx := self.pop_stack()).type != INT_DEF:
-                self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{idx.type}`", idx.loc)
-            self.push_stack(res)
+            def check_indexable():
+                if (res := self.stack[-1]).sub_kind is None:
+                    self.compiler_error("Type", f"expected indexable type, got `{res.type}`", res.loc)
+                res.kind = res.sub_kind
+                res.sub_kind = None
+            work.append(self.pop_int)
+            work.append(term.index)
+            work.append(check_indexable)
+            work.append(NodeTerm(term.var))
         elif isinstance(term.var, NodeTermInt):
             assert term.var.int_lit.value is not None, "term.var.int_lit.value shouldn't be None, probably a parsing error"
-            self.push_stack(StackItem(INT_DEF, (term.var.int_lit.line, term.var.int_lit.col)))
+            self.push_stack(StackItem(INT_KIND, (term.var.int_lit.line, term.var.int_lit.col)))
         elif isinstance(term.var, NodeTermIdent):
-            vars: tuple[StackItem, ...] = tuple(filter(lambda x: x.name == term.var.ident.value, self.variables)) # type: ignore
-            
-            if not vars:
+            if term.var.slot == -1:
                 self.compiler_error("Value", f"variable was not declared: {term.var.ident.value}", term.var.ident)
             
-            self.push_stack(StackItem(vars[-1].type, (term.var.ident.line, term.var.ident.col), vars[-1].sub_type, vars[-1].name))
+            var = self.variables[term.var.slot]
+            self.push_stack(StackItem(var.kind, (term.var.ident.line, term.var.ident.col), var.sub_kind, var.name))
         elif isinstance(term.var, NodeTermBool):
             assert term.var.bool.value is not None, "shouldn't be None here"
-            self.push_stack(StackItem(BOOL_DEF, (term.var.bool.line, term.var.bool.col)))
+            self.push_stack(StackItem(BOOL_KIND, (term.var.bool.line, term.var.bool.col)))
         elif isinstance(term.var, NodeTermParen):
-            self.check_expression(term.var.expr)
-            if term.var.negative and self.stack[-1].type != INT_DEF:
-                self.compiler_error("Type", f"`{self.stack[-1].type}` cannot be negative", self.stack[-1].loc)
+            paren = term.var
+            def check_negative():
+                if paren.negative and self.stack[-1].kind != INT_KIND:
+                    self.compiler_error("Type", f"`{self.stack[-1].type}` cannot be negative", self.stack[-1].loc)
+            work.append(check_negative)
+            work.append(paren.expr)
         elif isinstance(term.var, NodeTermChar):
-            self.push_stack(StackItem(CHAR_DEF, (term.var.char.line, term.var.char.col)))
+            self.push_stack(StackItem(CHAR_KIND, (term.var.char.line, term.var.char.col)))
         elif isinstance(term.var, NodeTermStr):
-            self.push_stack(StackItem(STR_DEF, sub_type=CHAR_DEF, loc=(term.var.string.line, term.var.string.col)))
+            self.push_stack(StackItem(STR_KIND, sub_kind=CHAR_KIND, loc=(term.var.string.line, term.var.string.col)))
         elif isinstance(term.var, NodeTermNot):
-            self.check_term(term.var.term) # type: ignore
-            if self.stack[-1].type != BOOL_DEF:
-                self.compiler_error("Type", f"expected type `{BOOL_DEF}`, got `{self.stack[-1].type}`", self.stack[-1].loc)
+            def check_not():
+                if self.stack[-1].kind != BOOL_KIND:
+                    self.compiler_error("Type", f"expected type `{BOOL_DEF}`, got `{self.stack[-1].type}`", self.stack[-1].loc)
+            work.append(check_not)
+            work.append(term.var.term)
         elif isinstance(term.var, NodeTermCast):
-            if term.var.type.type == STR_DEF:
+            cast = term.var
+            cast_kind = KIND[cast.type.type]
+            if cast_kind == STR_KIND:
                 #TODO: implement typecasting for strings
                 raise NotImplementedError("typecasting to a string is not implemented yet")
-            self.check_expression(term.var.expr)
-            if self.stack[-1].type == STR_DEF and term.var.type.type == CHAR_DEF:
-                self.compiler_error("Type", f"cannot cast `{STR_DEF}` to `{CHAR_DEF}`", term.var.type)
-            self.stack[-1].type = term.var.type.type
+            def check_cast():
+                if self.stack[-1].kind == STR_KIND and cast_kind == CHAR_KIND:
+                    self.compiler_error("Type", f"cannot cast `{STR_DEF}` to `{CHAR_DEF}`", cast.type)
+                self.stack[-1].kind = cast_kind
+            work.append(check_cast)
+            work.append(cast.expr)
         elif isinstance(term.var, NodeTermBNot):
-            self.check_term(term.var.term) # type: ignore
-            if self.stack[-1].type != INT_DEF:
-                self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{self.stack[-1].type}`", self.stack[-1].loc)
+            def check_bnot():
+                if self.stack[-1].kind != INT_KIND:
+                    self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{self.stack[-1].type}`", self.stack[-1].loc)
+            work.append(check_bnot)
+            work.append(term.var.term)
+        elif isinstance(term.var, NodeTermSlice):
+            def check_sliced():
+                if (res := self.stack[-1]).kind != STR_KIND:
+                    self.compiler_error("Type", f"expected type `{STR_DEF}`, got `{res.type}`", res.loc)
+            work.extend((self.pop_int, term.var.end, self.pop_int, term.var.start, check_sliced, term.var.term))
         else:
             raise ValueError("Unreachable")
 
+    def pop_int(self):
+        """
+        pops the top item off the stack, it has to be an int since it's an index or a bound of a slice
+        """
+        if (idx := self.pop_stack()).kind != INT_KIND:
+            self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{idx.type}`", idx.loc)
+
+    def annotate(self, node: NodeTerm | NodeBinExpr, value_kind: int):
+        """
+        saves the type of the value into the node, so the Generator knows its type and size without guessing
+        """
+        value_type = TOKEN_TYPES[value_kind]
+        node.value_type = value_type
+        # a variable whose declaration failed can still be inferred, it's never generated since there were errors
+        node.value_size = TYPE_SIZES.get(value_type, 0)
+
     def check_binary_expression(self, bin_expr: NodeBinExpr):
-        self.check_expression(bin_expr.lhs)
-        self.check_expression(bin_expr.rhs)
+        """
+        checks the operator against the types of both sides, which are on top of the stack
+        """
         a = self.pop_stack()
         b = self.pop_stack()
-        if bin_expr.op.type in COMPARISONS:
-            if a.type not in (INT_DEF, CHAR_DEF):
+        op_kind = KIND[bin_expr.op.type]
+        if op_kind in COMPARISON_KINDS:
+            if a.kind != INT_KIND and a.kind != CHAR_KIND:
                 self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{a.type}`", a.loc)
-            if b.type not in (INT_DEF, CHAR_DEF):
+            if b.kind != INT_KIND and b.kind != CHAR_KIND:
                 self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{b.type}`", b.loc)
-            self.push_stack(StackItem(BOOL_DEF, a.loc))
-        elif bin_expr.op.type in (OR, AND):
-            if a.type != BOOL_DEF:
+            self.push_stack(StackItem(BOOL_KIND, a.loc))
+        elif op_kind in LOGICAL_KINDS:
+            if a.kind != BOOL_KIND:
                 self.compiler_error("Type", f"expected type `{BOOL_DEF}`, got `{a.type}`", a.loc)
-            if b.type != BOOL_DEF:
+            if b.kind != BOOL_KIND:
                 self.compiler_error("Type", f"expected type `{BOOL_DEF}`, got `{b.type}`", b.loc)
             self.push_stack(a)
-        elif bin_expr.op.type in (SHIFT_LEFT, SHIFT_RIGHT, BOR, BAND, XOR, PLUS, MINUS, STAR, SLASH):
-            if a.type != INT_DEF:
+        elif op_kind in INT_OP_KINDS:
+            if a.kind != INT_KIND:
                 self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{a.type}`", a.loc)
-            if b.type != INT_DEF:
+            if b.kind != INT_KIND:
                 self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{b.type}`", b.loc)
             self.push_stack(a)
         else:
             raise ValueError("Unreachable")
+        self.annotate(bin_expr, self.stack[-1].kind)
 
     def check_expression(self, expr: NodeExpr):
-        if isinstance(expr.var, NodeTerm):
-            self.check_term(expr.var)
-        elif isinstance(expr.var, NodeBinExpr):
-            self.check_binary_expression(expr.var)
-        else:
-            raise ValueError("Unreachable")
+        """
+        checks the expression and pushes its type onto the stack,
+        the operands and the checks that are left are done in the same order as a recursive walk would
+        """
+        work: list[CheckWork] = [expr]
+        while work:
+            item = work.pop()
+            if isinstance(item, NodeExpr):
+                work.append(item.var)
+            elif isinstance(item, NodeTerm):
+                self.check_term(item, work)
+            elif isinstance(item, NodeBinExpr):
+                work.append(partial(self.check_binary_expression, item))
+                work.append(item.rhs)
+                work.append(item.lhs)
+            else:
+                item()
 
     def check_exit(self, exit_stmt: NodeStmtExit):
         self.check_expression(exit_stmt.expr)
 
-        if (item := self.stack.pop()).type != INT_DEF:
+        if (item := self.stack.pop()).kind != INT_KIND:
             self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{item.type}`", item.loc)
     
     def check_decl(self, decl_stmt: NodeStmtDeclare):
@@ -156,26 +232,35 @@ class TypeChecker(ErrorHandler):
         checks if the type fits the keyword used to declare the variable,
         if the type is supposed to be inferred then it just takes whatever type is on top of the stack
         """
-        sub_type = None
-        self.check_expression(decl_stmt.expr)
-
-        if decl_stmt.type_.type == INFER_DEF:
-            decl_stmt.type_.type = self.stack[-1].type
-        elif self.stack[-1].type != decl_stmt.type_.type:
-            self.compiler_error("Type", f"expected type `{decl_stmt.type_.type}`, got `{self.stack[-1].type}`", decl_stmt.type_)
-        if decl_stmt.type_.type == STR_DEF:
-            sub_type = CHAR_DEF
         assert decl_stmt.ident.value is not None, "a variable has to have a name"
-        self.variables.append(StackItem(decl_stmt.type_.type, decl_stmt.ident, sub_type=sub_type, name=decl_stmt.ident.value, is_const=decl_stmt.is_const))
+        assert decl_stmt.slot == len(self.variables), "the variable slots are out of sync with the Binder"
+        decl_kind = KIND[decl_stmt.type_.type]
+        try:
+            self.check_expression(decl_stmt.expr)
+        except CompilerError:
+            # the variable still gets its slot so the ones after it stay in sync with the Binder
+            self.variables.append(StackItem(decl_kind, decl_stmt.ident, name=decl_stmt.ident.value, is_const=decl_stmt.is_const))
+            raise
+
+        item = self.pop_stack()
+        if decl_kind == INFER_KIND:
+            decl_kind = item.kind
+            decl_stmt.type_.type = item.type
+        sub_kind = CHAR_KIND if decl_kind == STR_KIND else None
+        #NOTE: declared before the type check so a mismatch doesn't cascade into undeclared variable errors
+        self.variables.append(StackItem(decl_kind, decl_stmt.ident, sub_kind=sub_kind, name=decl_stmt.ident.value, is_const=decl_stmt.is_const))
+        if item.kind != decl_kind:
+            self.compiler_error("Type", f"expected type `{decl_stmt.type_.type}`, got `{item.type}`", decl_stmt.type_)
     
     def check_reassign(self, reassign_stmt: NodeStmtReassign):
         assert isinstance(reassign_stmt.var.ident.var, NodeTermIdent), "has to be this, error in parsing"
-        found_vars = tuple(filter(lambda x: x.name == reassign_stmt.var.ident.var.ident.value, self.variables)) # type: ignore
+        ident = reassign_stmt.var.ident.var
 
-        if not found_vars:
-            self.compiler_error("Value", f"undeclared identifier: {reassign_stmt.var.ident.var.ident.value}", reassign_stmt.var.ident.var.ident)
-        elif found_vars[-1].is_const:
-            self.compiler_error("Value", f"modification of const identifier: {reassign_stmt.var.ident.var.ident.value}", reassign_stmt.var.ident.var.ident)
+        if ident.slot == -1:
+            self.compiler_error("Value", f"undeclared identifier: {ident.ident.value}", ident.ident)
+        var = self.variables[ident.slot]
+        if var.is_const:
+            self.compiler_error("Value", f"modification of const identifier: {ident.ident.value}", ident.ident)
 
         if isinstance(reassign_stmt.var, NodeStmtReassignEq):
             self.check_expression(reassign_stmt.var.rvalue)
@@ -183,23 +268,39 @@ class TypeChecker(ErrorHandler):
             # if item.type == STR_DEF:
             #     self.compiler_error("Type", f"reassigning of type `{item.type}` is not allowed", reassign_stmt.var.ident.var.ident)
             if reassign_stmt.var.ident.index is not None:
-                if found_vars[-1].sub_type is None:
-                    self.compiler_error("Type", f"expected indexable type, got `{found_vars[-1].type}`", found_vars[-1].loc)
-            elif item.type != found_vars[-1].type:
-                self.compiler_error("Type", f"expected type `{found_vars[-1].type}`, got `{item.type}`", reassign_stmt.var.ident.var.ident)
+                if var.sub_kind is None:
+                    self.compiler_error("Type", f"expected indexable type, got `{var.type}`", var.loc)
+                self.check_expression(reassign_stmt.var.ident.index)
+                if (idx := self.pop_stack()).kind != INT_KIND:
+                    self.compiler_error("Type", f"expected type `{INT_DEF}`, got `{idx.type}`", idx.loc)
+                self.annotate(reassign_stmt.var.ident, var.sub_kind) # type: ignore (checked above)
+            else:
+                if item.kind != var.kind:
+                    self.compiler_error("Type", f"expected type `{var.type}`, got `{item.type}`", reassign_stmt.var.ident.var.ident)
+                self.annotate(reassign_stmt.var.ident, var.kind)
         elif isinstance(reassign_stmt.var, (NodeStmtReassignInc, NodeStmtReassignDec)):
-            if found_vars[-1].type != INT_DEF:
-                self.compiler_error("Type", f"cannot increment or decrement a variable of `{found_vars[-1].type}` type", found_vars[-1].loc)
+            if var.kind != INT_KIND:
+                self.compiler_error("Type", f"cannot increment or decrement a variable of `{var.type}` type", var.loc)
+            self.annotate(reassign_stmt.var.ident, var.kind)
         else:
             raise ValueError("out of reach")
     
     def check_scope(self, scope_stmt: NodeScope):
-        for stmt in scope_stmt.stmts:
-            self.check_statement(stmt)
+        live_count = len(self.variables)
+        try:
+            for stmt in scope_stmt.stmts:
+                stack_len = len(self.stack)
+                try: # recovers inline, a call to check_statement_or_recover would cost a frame per nesting level
+                    self.check_statement(stmt)
+                except CompilerError as error:
+                    self.recover(error)
+                    del self.stack[stack_len:]
+        finally:
+            del self.variables[live_count:] # the variables of the scope end with it
     
     def check_if_statement(self, if_stmt: NodeStmtIf):
         self.check_expression(if_stmt.expr)
-        if (item := self.pop_stack()).type not in (BOOL_DEF, INT_DEF):
+        if (item := self.pop_stack()).kind not in CONDITION_KINDS:
             self.compiler_error("Type", f"expected type `{BOOL_DEF}` or `{INT_DEF}`, got `{item.type}`", item.loc)
         
         self.check_scope(if_stmt.scope)
@@ -210,7 +311,7 @@ class TypeChecker(ErrorHandler):
     def check_if_predicate(self, ifpred: NodeIfPred):
         if isinstance(ifpred.var, NodeIfPredElif):
             self.check_expression(ifpred.var.expr)
-            if (item := self.pop_stack()).type not in (BOOL_DEF, INT_DEF):
+            if (item := self.pop_stack()).kind not in CONDITION_KINDS:
                 self.compiler_error("Type", f"expected type `{BOOL_DEF}` or `{INT_DEF}`, got `{item.type}`", item.loc)
             self.check_scope(ifpred.var.scope)
             if ifpred.var.pred is not None:
@@ -222,29 +323,33 @@ class TypeChecker(ErrorHandler):
     
     def check_while(self, while_stmt: NodeStmtWhile):
         self.check_expression(while_stmt.expr)
-        if (item := self.pop_stack()).type not in (BOOL_DEF, INT_DEF):
+        if (item := self.pop_stack()).kind not in CONDITION_KINDS:
             self.compiler_error("Type", f"expected type `{BOOL_DEF}` or `{INT_DEF}`, got `{item.type}`", item.loc)
         self.check_scope(while_stmt.scope)
     
     def check_do_while(self, do_while_stmt: NodeStmtDoWhile):
         self.check_scope(do_while_stmt.scope)
         self.check_expression(do_while_stmt.expr)
-        if (item := self.pop_stack()).type not in (BOOL_DEF, INT_DEF):
+        if (item := self.pop_stack()).kind not in CONDITION_KINDS:
             self.compiler_error("Type", f"expected type `{BOOL_DEF}` or `{INT_DEF}`, got `{item.type}`", item.loc)
     
     def check_for(self, for_stmt: NodeStmtFor):
-        self.check_decl(for_stmt.ident_def)
+        live_count = len(self.variables)
+        try:
+            self.check_decl(for_stmt.ident_def)
 
-        self.check_expression(for_stmt.condition)
-        if (item := self.pop_stack()).type != BOOL_DEF:
-            self.compiler_error("Type", f"expected type `{BOOL_DEF}`, got `{item.type}`", item.loc)
-        
-        self.check_scope(for_stmt.scope)
+            self.check_expression(for_stmt.condition)
+            if (item := self.pop_stack()).kind != BOOL_KIND:
+                self.compiler_error("Type", f"expected type `{BOOL_DEF}`, got `{item.type}`", item.loc)
+            
+            self.check_scope(for_stmt.scope)
 
-        self.check_reassign(for_stmt.ident_assign)
+            self.check_reassign(for_stmt.ident_assign)
+        finally:
+            del self.variables[live_count:] # the loop variable ends with the loop
     
     def check_print(self, print_stmt: NodeStmtPrint):
         self.check_expression(print_stmt.content)
-        if (item := self.pop_stack()).type not in (CHAR_DEF, STR_DEF):
+        if (item := self.pop_stack()).kind != CHAR_KIND and item.kind != STR_KIND:
             self.compiler_error("Type", f"expected type `{CHAR_DEF}` or `{STR_DEF}`, got `{item.type}`", item.loc)
         print_stmt.cont_type = item.type
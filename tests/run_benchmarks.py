@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, "./src")
+
+from lexer import Tokenizer
+from parser import Parser
+from binder import Binder
+from typechecker import TypeChecker
+from generator import Generator
+from compiler import Compiler, CompilationResult
+from comptypes import FlatTree, NodeProgram, Token
+from cache import ParseCache
+
+MEGABYTE = 1024 * 1024
+OPTIMIZE_PROGRAMS = (
+    "./tests/arithmetics/arithmetics.hdz", "./tests/bitwise_ops/bitwise_ops.hdz", "./tests/dead_code/dead_code.hdz",
+    "./tests/jump_tables/jump_tables.hdz", "./examples/rule110/rule110.hdz"
+)
+RULE110_PATH = "./examples/rule110/rule110.hdz"
+# the width of the board of the rule110 that runs for its inner loop
+WIDE_BOARD = 4000
+
+def make_source(size: int) -> str:
+    """
+    glues together the example and test programs until the source is at least size bytes long
+    """
+    sources: list[str] = []
+    for folder in ("examples", "tests"):
+        for root, _, files in os.walk(f"./{folder}"):
+            if "_errors" in root:
+                continue
+            for file in filter(lambda x: x.endswith(".hdz"), files):
+                with open(f"{root}/{file}", "r") as f:
+                    sources.append(f.read() + "\n")
+    chunk = "".join(sources)
+    return chunk * (size // len(chunk) + 1)
+
+
+def make_program(size: int) -> str:
+    """
+    like make_source but every program is in its own scope so the result compiles,
+    programs that don't compile inside of a scope are left out
+    """
+    sources: list[str] = []
+    for folder in ("examples", "tests"):
+        for root, _, files in os.walk(f"./{folder}"):
+            if "_errors" in root:
+                continue
+            for file in filter(lambda x: x.endswith(".hdz"), files):
+                with open(f"{root}/{file}", "r") as f:
+                    scoped = "{\n" + f.read() + "\n}\n"
+                if Compiler().compile(scoped).ok:
+                    sources.append(scoped)
+    chunk = "".join(sources)
+    return chunk * (size // len(chunk) + 1)
+
+
+def bench_lexer(sizes_mb: tuple[int, ...]):
+    """
+    compares the char by char tokenizer with the master pattern scanner
+    """
+    for size_mb in sizes_mb:
+        src = make_source(size_mb * MEGABYTE)
+        results = []
+        for mode in ("tokenize", "scan"):
+            lexer = Tokenizer(src)
+            start = time.perf_counter()
+            tokens = getattr(lexer, mode)()
+            elapsed = time.perf_counter() - start
+            results.append(tokens)
+            print(f"[{size_mb} MB] {mode:<8} {len(tokens):>9} tokens in {elapsed:8.3f}s -> {len(tokens) / elapsed:12,.0f} tokens/s")
+        assert results[0] == results[1], "scan() and tokenize() produced different token streams"
+
+
+def bench_token_memory(size_mb: int):
+    """
+    compares the memory taken by the packed token table with a list of Token objects holding the same tokens
+    """
+    src = make_source(size_mb * MEGABYTE)
+
+    tracemalloc.start()
+    table = Tokenizer(src).scan()
+    table_size = tracemalloc.get_traced_memory()[0]
+    tokens = list(table)
+    list_size = tracemalloc.get_traced_memory()[0] - table_size
+    tracemalloc.stop()
+
+    print(f"[{size_mb} MB] {len(tokens)} tokens")
+    print(f"    list[Token]: {list_size / MEGABYTE:8.2f} MB ({list_size / len(tokens):6.1f} B/token)")
+    print(f"    TokenTable:  {table_size / MEGABYTE:8.2f} MB ({table_size / len(tokens):6.1f} B/token)")
+
+
+def bench_batch(rounds: int):
+    """
+    compiles every test and example program rounds times in a single process,
+    every round has to give the same assembly / diagnostics as the first one
+    """
+    sources: list[str] = []
+    for folder in ("examples", "tests"):
+        for root, _, files in os.walk(f"./{folder}"):
+            for file in filter(lambda x: x.endswith(".hdz"), files):
+                with open(f"{root}/{file}", "r") as f:
+                    sources.append(f.read())
+
+    compiler = Compiler()
+    first = [compiler.compile(src) for src in sources]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for src, expected in zip(sources, first):
+            result = compiler.compile(src)
+            assert result.asm == expected.asm and result.diagnostics == expected.diagnostics, "compilations leaked state"
+    elapsed = time.perf_counter() - start
+    
+    compiled = rounds * len(sources)
+    failed = rounds * sum(not result.ok for result in first)
+    print(f"{compiled} compilations ({failed} with errors) in {elapsed:.3f}s -> {compiled / elapsed:,.0f} files/s")
+
+
+def bench_parser(sizes: tuple[int, ...]):
+    """
+    parses machine generated expressions, one long chain of operands and one deeply nested in parentheses,
+    the time per operand should stay flat as they grow
+    """
+    for size in sizes:
+        chain = "naj x = " + " + ".join(str(i % 7) for i in range(size)) + "\n"
+        nested = "naj x = " + "(" * size + "1" + ")" * size + "\n"
+        for name, src in (("chain", chain), ("nested", nested)):
+            tokens = Tokenizer(src).scan()
+            start = time.perf_counter()
+            Parser(tokens, src).parse_program()
+            elapsed = time.perf_counter() - start
+            print(f"[{size:>7} operands] {name:<6} parsed in {elapsed:8.3f}s -> {elapsed / size * 1e6:6.2f} us/operand")
+
+
+def walk_dataclass_tree(program: NodeProgram) -> int:
+    """
+    visits every node (and token) of the dataclass tree, returns how many there were
+    """
+    count = 0
+    stack: list = list(program.stmts)
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, Token):
+            continue
+        for name in node.__slots__:
+            child = getattr(node, name)
+            if isinstance(child, list):
+                stack.extend(child)
+            elif child is not None and not isinstance(child, (str, bytes, int)):
+                stack.append(child)
+    return count
+
+
+def walk_flat_tree(tree: FlatTree) -> int:
+    """
+    visits every node (and token) of the flat tree, returns how many there were
+    """
+    count = 0
+    first_child, next_sibling, token_idxs = tree.first_child, tree.next_sibling, tree.token_idxs
+    stack: list[int] = list(tree.roots)
+    while stack:
+        node = stack.pop()
+        count += 1 + (token_idxs[node] != -1)
+        child = first_child[node]
+        while child != -1:
+            stack.append(child)
+            child = next_sibling[child]
+    return count
+
+
+def bench_tree(size_mb: int):
+    """
+    compares the dataclass parse tree with the flat tree:
+    the memory the finished tree takes, the peak memory of the whole compilation and how fast the tree can be walked
+    """
+    src = make_source(size_mb * MEGABYTE)
+    tokens = Tokenizer(src).scan()
+
+    for name, parse in (("dataclass", lambda: Parser(tokens, src).parse_program()), ("flat", lambda: Parser(tokens, src).parse_flat())):
+        tracemalloc.start()
+        tree = parse()
+        tree_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        walk = walk_flat_tree if isinstance(tree, FlatTree) else walk_dataclass_tree
+        start = time.perf_counter()
+        visited = walk(tree) # type: ignore (the walk fits the tree)
+        elapsed = time.perf_counter() - start
+        print(f"[{size_mb} MB] {name:<9} tree: {tree_size / MEGABYTE:8.2f} MB, walked {visited} nodes in {elapsed:.3f}s")
+        del tree
+
+    src = make_program(MEGABYTE // 4)
+
+    def compile_dataclass_tree():
+        program = Parser(Tokenizer(src).scan(), src).parse_program()
+        Binder(program, src).bind_program()
+        TypeChecker(program, src).check_program()
+        return Generator(program, src).gen_program()
+
+    compiles = (
+        ("dataclass", compile_dataclass_tree),
+        ("direct", lambda: Compiler(optimize=False).compile(src).asm), # each statement is generated as soon as it's parsed
+        ("direct -O", lambda: Compiler().compile(src).asm)
+    )
+    for name, compile_ in compiles:
+        start = time.perf_counter()
+        compile_()
+        elapsed = time.perf_counter() - start # timed without tracemalloc, it slows every allocation down
+        tracemalloc.start()
+        asm = compile_()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"[{len(src) // 1024} KB] {name:<9} lex + parse + check + generate: peak {peak / MEGABYTE:8.2f} MB in {elapsed:.3f}s")
+        del asm
+
+
+def bench_cache(size_mb: int):
+    """
+    compares lexing and parsing with loading the parse tree from the parse cache
+    """
+    src = make_source(size_mb * MEGABYTE)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ParseCache(cache_dir)
+        start = time.perf_counter()
+        tree = Parser(Tokenizer(src).scan(), src).parse_flat()
+        parse_elapsed = time.perf_counter() - start
+        cache.store(src, tree)
+
+        start = time.perf_counter()
+        cached_tree = cache.load(src)
+        load_elapsed = time.perf_counter() - start
+        assert cached_tree == tree, "the cached tree differs from the parsed one"
+        
+        entry_size = os.path.getsize(cache.entry_path(src))
+    print(f"[{size_mb} MB] lex + parse {parse_elapsed:.3f}s, cache load {load_elapsed:.3f}s ({entry_size / MEGABYTE:.2f} MB entry)")
+
+
+def make_variables(count: int, scope_size: int) -> str:
+    """
+    declares count variables, every scope_size of them in their own scope,
+    each variable is read from right after it's declared and the outer ones are shadowed in every scope,
+    the total of every scope is read at its end so none of them is dead code
+    """
+    lines: list[str] = ["cif total = 0"]
+    for i in range(count):
+        if i % scope_size == 0:
+            lines.append("{" if i == 0 else "kec total == -1 {\nvychod(total)\n}\n}\n{")
+            lines.append("cif total = 0")
+        lines.append(f"cif v{i % scope_size} = {i}")
+        lines.append(f"total = total + v{i % scope_size} - v{i % scope_size // 2}")
+    lines.append("kec total == -1 {\nvychod(total)\n}")
+    lines.append("}")
+    lines.append("vychod(total)")
+    return "\n".join(lines) + "\n"
+
+
+def bench_scope(counts: tuple[int, ...], scope_size: int):
+    """
+    shows that binding, typechecking and generating take the same time per variable
+    no matter how many variables are declared
+    """
+    for count in counts:
+        src = make_variables(count, scope_size)
+        tree = Parser(Tokenizer(src).scan(), src).parse_flat()
+        result = CompilationResult()
+        start = time.perf_counter()
+        asm = Compiler().check_and_generate(tree, src, result)
+        elapsed = time.perf_counter() - start
+        assert asm is not None, f"the benchmark program didn't compile: {result.diagnostics}"
+        print(f"[{count} variables, {scope_size} per scope] check + generate {elapsed:.3f}s, {elapsed / count * 1e6:.2f}us per variable")
+
+
+def bench_stream(sizes: tuple[int, ...]):
+    """
+    compares the peak memory of the whole program compilation with the streamed one,
+    the streamed assembly goes to /dev/null so it isn't counted
+    """
+    for size in sizes:
+        src = make_program(size)
+        for name in ("whole", "streamed"):
+            tracemalloc.start()
+            start = time.perf_counter()
+            if name == "whole":
+                result = Compiler().compile(src)
+            else:
+                with open(os.devnull, "w") as out:
+                    result = Compiler().compile_stream(src, out)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert result.ok, f"the benchmark program didn't compile: {result.diagnostics}"
+            del result
+            print(f"[{len(src) // 1024} KB] {name:<8} compilation: peak {peak / MEGABYTE:8.2f} MB in {elapsed:.3f}s")
+
+
+def count_instructions(asm: list[str]) -> int:
+    """
+    counts the instructions of the assembly, labels, comments and directives are left out
+    """
+    count = 0
+    for line in "".join(asm).splitlines():
+        if line.startswith("    ") and not line.strip().startswith(";"):
+            count += 1
+    return count
+
+
+def bench_optimize(paths: tuple[str, ...]):
+    """
+    counts the instructions of the programs compiled with and without the optimizations,
+    with the instructions the peephole rules removed and the statements the dead code elimination removed
+    """
+    for path in paths:
+        counts: list[int] = []
+        for optimize in (False, True):
+            result = Compiler(optimize=optimize).compile_file(path)
+            assert result.asm is not None, f"{path} didn't compile: {result.diagnostics}"
+            counts.append(count_instructions(result.asm))
+        saved = 1 - counts[1] / counts[0]
+        print(f"{path:<36} {counts[0]:5} -> {counts[1]:5} instructions ({saved:.1%} less)")
+        stats = ", ".join(f"{rule} {count}" for rule, count in result.stats.items() if count)
+        if stats:
+            print(f"{"":<36} {stats}")
+        dead_code = ", ".join(f"{rule} {count}" for rule, count in result.dead_code.items() if count)
+        if dead_code:
+            print(f"{"":<36} statements: {dead_code}")
+
+
+def make_loop_program(iterations: int) -> str:
+    """
+    makes a program that spends its time in an expression heavy loop
+    """
+    return (
+        "cif acc = 7\n"
+        f"sicke(cif i = 0, i < {iterations}, i++) {{\n"
+        "    cif a = i * 3 + (acc >> 3)\n"
+        "    acc = (acc ^ a + (i & 255) * 5) - ((a | i) & (acc << 1)) + 11\n"
+        "}\n"
+        "vychod(acc & 127)\n"
+    )
+
+
+def make_hash_program(iterations: int) -> str:
+    """
+    makes a program that spends its time multiplying, dividing and taking the modulo by literals
+    """
+    return (
+        "cif h = 17\n"
+        f"sicke(cif i = 0, i < {iterations}, i++) {{\n"
+        "    h = (h * 31 + i) % 1000003 + h / 7 - (i * 40) / -16\n"
+        "}\n"
+        "vychod(h & 127)\n"
+    )
+
+
+def make_invariant_program(iterations: int) -> str:
+    """
+    makes a program whose loop computes the same values on every iteration
+    """
+    return (
+        "cif n = 1000\n"
+        "cif acc = 0\n"
+        f"sicke(cif i = 0, i < n * {iterations // 1000}, i++) {{\n"
+        "    acc = acc + ((n * 3 - 1) ^ i) + (n << 2)\n"
+        "}\n"
+        "vychod(acc & 127)\n"
+    )
+
+
+def make_print_program(iterations: int) -> str:
+    """
+    makes a program that prints a char and a string on every iteration
+    """
+    return (
+        "lancok s = \"ab\"\n"
+        f"sicke(cif i = 0, i < {iterations}, i++) {{\n"
+        "    hutor(znak(cif('a') + (i & 15)))\n"
+        "    hutor(s)\n"
+        "}\n"
+    )
+
+
+def make_literal_program(iterations: int) -> str:
+    """
+    makes a program that declares a long string literal on every iteration and reads a char out of it
+    """
+    return (
+        "cif sum = 0\n"
+        f"sicke(cif i = 0, i < {iterations}, i++) {{\n"
+        "    lancok s = \"the quick brown fox jumps over the lazy dog\"\n"
+        "    sum = sum + cif(s[i & 31])\n"
+        "}\n"
+        "vychod(sum & 255)\n"
+    )
+
+
+def make_slice_program(iterations: int) -> str:
+    """
+    makes a program that takes a slice of a string on every iteration and reads its last char
+    """
+    return (
+        "lancok text = \"the quick brown fox jumps over the lazy dog\"\n"
+        "cif sum = 0\n"
+        f"sicke(cif i = 0, i < {iterations}, i++) {{\n"
+        "    lancok word = text[i & 31:(i & 31) + 8]\n"
+        "    sum = sum + cif(word[7])\n"
+        "}\n"
+        "vychod(sum & 255)\n"
+    )
+
+
+def make_wide_rule110(rule110: str, width: int, generations: int) -> str:
+    """
+    makes rule110 run on a board of the given width, so most of its time goes into the `ikec` chain picking the next cell
+    """
+    return (
+        rule110.replace("furt cif len = 43", f"furt cif len = {width}")
+        .replace("_ < len - 2", f"_ < {generations}")
+        .replace(f"\"{' ' * 41}*\\n\"", f"\"{' ' * (width - 2)}*\\n\"")
+        .replace(f"\"{' ' * 40}**\\n\"", f"\"{' ' * (width - 3)}**\\n\"")
+    )
+
+
+def bench_runtime(generations: int, iterations: int, runs: int):
+    """
+    times the compiled programs, rule110 is run for more generations than it normally does,
+    the ones ending with -b are compiled with the bounds checks,
+    needs fasm to assemble the programs
+    """
+    with open(RULE110_PATH, "r") as f:
+        rule110 = f.read().replace("_ < len - 2", f"_ < {generations}")
+    programs = {
+        f"rule110 x{generations}": rule110,
+        f"rule110 w{WIDE_BOARD} x{generations // 10}": make_wide_rule110(rule110, WIDE_BOARD, generations // 10),
+        f"loop x{iterations}": make_loop_program(iterations),
+        f"hash x{iterations}": make_hash_program(iterations),
+        f"invariant x{iterations}": make_invariant_program(iterations),
+        f"print x{iterations // 10}": make_print_program(iterations // 10),
+        f"literal x{iterations}": make_literal_program(iterations),
+        f"slice x{iterations}": make_slice_program(iterations),
+        f"rule110 x{generations} -b": rule110,
+        f"slice x{iterations} -b": make_slice_program(iterations),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, src in programs.items():
+            result = Compiler(bounds_checks=name.endswith("-b")).compile(src)
+            assert result.asm is not None, f"{name} didn't compile: {result.diagnostics}"
+            with open(f"{tmp_dir}/bench.asm", "w") as f:
+                f.writelines(result.asm)
+            if subprocess.run(["fasm", f"{tmp_dir}/bench.asm"], capture_output=True).returncode != 0:
+                print(f"{name} couldn't be assembled")
+                continue
+
+            best = float("inf")
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run([f"{tmp_dir}/bench"], stdout=subprocess.DEVNULL)
+                best = min(best, time.perf_counter() - start)
+            print(f"{name:<20} {count_instructions(result.asm):5} instructions, best run out of {runs}: {best:.3f}s")
+
+
+def main():
+    if len(sys.argv) == 1:
+        bench_lexer((1, 10))
+        bench_token_memory(4)
+        bench_batch(100)
+        bench_parser((10_000, 100_000))
+        bench_tree(4)
+        bench_cache(4)
+        bench_scope((10_000, 20_000, 40_000), 10_000)
+        bench_scope((10_000, 20_000, 40_000), 100)
+        bench_stream((MEGABYTE // 8, MEGABYTE // 2))
+        bench_optimize(OPTIMIZE_PROGRAMS)
+        bench_runtime(20_000, 10_000_000, 5)
+    elif "lex" in sys.argv:
+        bench_lexer((1, 10))
+    elif "tok" in sys.argv:
+        bench_token_memory(4)
+    elif "batch" in sys.argv:
+        bench_batch(100)
+    elif "parse" in sys.argv:
+        bench_parser((10_000, 100_000))
+    elif "tree" in sys.argv:
+        bench_tree(4)
+    elif "cache" in sys.argv:
+        bench_cache(4)
+    elif "scope" in sys.argv:
+        bench_scope((10_000, 20_000, 40_000), 10_000)
+        bench_scope((10_000, 20_000, 40_000), 100)
+    elif "stream" in sys.argv:
+        bench_stream((MEGABYTE // 8, MEGABYTE // 2))
+    elif "opt" in sys.argv:
+        bench_optimize(OPTIMIZE_PROGRAMS)
+    elif "run" in sys.argv:
+        bench_runtime(20_000, 10_000_000, 5)
+    else:
+        print("Incorrect usage!")
+        print("Usage: $ ./run_benchmarks.py [lex | tok | batch | parse | tree | cache | scope | stream | opt | run]")
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -37,7 +37,7 @@ def remove(folders: tuple[str, ...], subfolder: str = ""):
         if folder == "_errors":
             continue
 
-        rem = filter(lambda x: not x.endswith((".hdz", ".expected")), os.listdir(f"./tests/{subfolder}/{folder}"))
+        rem = filter(lambda x: not x.endswith((".hdz", ".expected", ".flags")), os.listdir(f"./tests/{subfolder}/{folder}"))
         
         for file in rem:
             try:
@@ -45,8 +45,16 @@ def remove(folders: tuple[str, ...], subfolder: str = ""):
             except OSError as e:
                 print(e)
 
+def test_flags(test_name: str, subfolder: str="") -> list[str]:
+    try: # extra compiler flags of the test, like -b for the bounds checks
+        with open(f"tests/{subfolder}/{test_name}/{test_name}.flags", "r") as f:
+            return f.read().split()
+    except FileNotFoundError:
+        return []
+
 def recompile_and_run(test_name: str, subfolder: str="") -> str:
-    compilation = sbp.run(["./src/hdzc", f"tests/{subfolder}/{test_name}/{test_name}.hdz", "-c"], capture_output=True, text=True)
+    compilation = sbp.run(["./src/hdzc", f"tests/{subfolder}/{test_name}/{test_name}.hdz", "-c", *test_flags(test_name, subfolder)],
+                          capture_output=True, text=True)
     
     while not os.path.exists(f"./tests/{subfolder}/{test_name}/{test_name}"): # waits for the compilation to be done so it can run the file
         if compilation.returncode != 0: